@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Measures time and memory allocated while parsing L: responses of increasing size, comparing LResponse (one
+slice per submessage) with the former copy-and-delete implementation. Requires Python 3.4+ (tracemalloc).
+
+Run with: PYTHONPATH=".:./src" python benchmarks/allocations.py
+"""
+import base64
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from legacy import LegacyLResponse
+from pymax.response import LResponse
+
+# heater thermostat submessage
+SUBMESSAGE = base64.b64decode(b'CxIrZfcSGWQ8AOsF')
+
+
+def payload(devices):
+    return bytearray(base64.b64encode(SUBMESSAGE * devices))
+
+
+def measure(response_class, data, repeat):
+    tracemalloc.start()
+    response = response_class(data)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del response
+
+    start = time.time()
+    for _ in range(repeat):
+        response_class(data)
+    return (time.time() - start) / repeat, peak, retained
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=20)
+    parser.add_argument('devices', nargs='*', type=int, default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    for devices in args.devices:
+        data = payload(devices)
+        for label, response_class in (('legacy', LegacyLResponse), ('current', LResponse)):
+            duration, peak, retained = measure(response_class, data, args.repeat)
+            print("%6s devices  %-10s %9.3f ms, peak %8.1f KiB, retained %8.1f KiB" % (
+                devices, label, duration * 1000, peak / 1024.0, retained / 1024.0
+            ))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Compares the L: response decoding throughput with the original implementation, which formatted a description,
+decoded all flags and created timedeltas for every submessage.
+
+Run with: PYTHONPATH=".:./src" python benchmarks/l_decode.py
+"""
+import base64
+import timeit
+from argparse import ArgumentParser
+
+from legacy import LegacyLResponse
+from pymax.response import LResponse
+
+HEATER_THERMOSTAT = bytearray(base64.b64decode(b'CxIrZfcSGWQ8AOsF'))
+WALL_THERMOSTAT = bytearray([12, 0x12, 0x17, 0x07, 9, 0x12, 0x10, 0x18, 0x29, 0, 0, 0, 0xc4])
+SHUTTER_CONTACT = bytearray([6, 0x12, 0x2b, 0x66, 0xf7, 0x12, 0x12])
+
+
+def payload(devices):
+    """L: payload with a mix of heater thermostats, wall thermostats and shutter contacts."""
+    submessages = (HEATER_THERMOSTAT, HEATER_THERMOSTAT, WALL_THERMOSTAT, SHUTTER_CONTACT)
+    data = bytearray()
+    for idx in range(devices):
+        data += submessages[idx % len(submessages)]
+    return bytearray(base64.b64encode(data))
+
+
+def best_of(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20)
+    parser.add_argument('devices', nargs='*', type=int, default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    for devices in args.devices:
+        data = payload(devices)
+        legacy = best_of(lambda: LegacyLResponse(data), args.number)
+        current = best_of(lambda: LResponse(data), args.number)
+        print("%6s devices  legacy: %8.0f submessages/s, current: %8.0f submessages/s, speedup: %.1fx" % (
+            devices, devices / legacy, devices / current, legacy / current
+        ))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Compares the response parsers (precompiled structs and layouts, lazily decoded fields) with the hand rolled
+parsers they replaced.
+
+Run with: PYTHONPATH=".:./src" python benchmarks/layout.py
+"""
+import base64
+import timeit
+from argparse import ArgumentParser
+
+from legacy import LegacyDiscoveryIdentifyResponse, LegacyDiscoveryNetworkConfigurationResponse, LegacyMResponse, \
+    LegacyConfigurationResponse, LegacySingleLResponse
+from pymax.response import DiscoveryIdentifyResponse, DiscoveryNetworkConfigurationResponse, MResponse, \
+    ConfigurationResponse, SingleLResponse
+
+DISCOVERY_IDENTIFY = bytearray(b'eQ3MaxApKEQ0523864>I\x00\t\x7f,\x01\x13')
+DISCOVERY_NETWORK_CONFIG = bytearray(b'eQ3MaxApKEQ0523864>N\n\n\n\x99\n\n\n\x01\xff\xff\xff\x00\n\n\n\x01\x00\x00\x00\x00')
+M = bytearray(b'00,01,VgIBAQpXb2huemltbWVyEitlAQISK2VNRVExNDcyOTk3B0hlaXp1bmcBAQ==')
+C = bytearray(b'122b65,0hIrZQIBEABNRVExNDcyOTk3Oyc9CQcYA5IM/wBESHkPRSBFIEUgRSBFIEUgRSBFIEUgRSBFIERIeQlFIEUgRSBFIEUgRSBFIEUg'
+              b'RSBFIEUgREJ4XkTJeRJFIEUgRSBFIEUgRSBFIEUgRSBEQnheRMl5EkUgRSBFIEUgRSBFIEUgRSBFIERCeF5EyXkSRSBFIEUgRSBFIEUgRSBF'
+              b'IEUgREJ4XkTJeRJFIEUgRSBFIEUgRSBFIEUgRSBEQnheRMl5EkUgRSBFIEUgRSBFIEUgRSBFIA==')
+SINGLE_L = bytearray(base64.b64decode(b'CxIrZfcSGWQ8AOsF'))
+
+
+CASES = (
+    ('discovery identify', DISCOVERY_IDENTIFY, LegacyDiscoveryIdentifyResponse, DiscoveryIdentifyResponse),
+    ('discovery network config', DISCOVERY_NETWORK_CONFIG, LegacyDiscoveryNetworkConfigurationResponse,
+     DiscoveryNetworkConfigurationResponse),
+    ('M: (1 room, 1 device)', M, LegacyMResponse, MResponse),
+    ('C: thermostat', C, LegacyConfigurationResponse, ConfigurationResponse),
+    ('L: submessage', SINGLE_L, LegacySingleLResponse, SingleLResponse),
+)
+
+
+def best_of(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    for label, data, legacy_class, current_class in CASES:
+        # time only the parsing, not the length checks of the constructor
+        legacy = best_of(legacy_class(data)._parse, args.number)
+        current = best_of(current_class(data)._parse, args.number)
+        print("%-26s legacy: %7.2f us, current: %7.2f us, speedup: %.2fx" % (
+            label, legacy * 1e6, current * 1e6, legacy / current
+        ))
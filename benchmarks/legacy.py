@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""Copies of the response parsers as they were before the layout, L: decoding and memory changes. The benchmarks
+compare the current parsers with these.
+
+Only the parsing is copied, the legacy classes inherit everything else from the current ones.
+"""
+import base64
+import datetime
+import logging
+import struct
+
+from pymax.objects import RFAddr
+from pymax.response import BaseResponse, DiscoveryIdentifyResponse, DiscoveryNetworkConfigurationResponse, \
+    MResponse, ConfigurationResponse, DeviceCube, DeviceRadiatorThermostat, DeviceRadiatorThermostatPlus, \
+    DeviceWallThermostat, device_type_name
+from pymax.util import unpack_temp_and_time
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyProgramSchedule(object):
+    """ProgramSchedule without __slots__."""
+
+    def __init__(self, temperature, begin, end):
+        self.temperature = temperature
+        if begin.__class__ == datetime.time:
+            self.begin_minutes = (begin.hour * 60) + begin.minute
+        else:
+            self.begin_minutes = begin
+
+        if end.__class__ == datetime.time:
+            self.end_minutes = (end.hour * 60) + end.minute
+        else:
+            self.end_minutes = end
+
+
+class LegacyDiscoveryIdentifyResponse(DiscoveryIdentifyResponse):
+
+    def _parse(self):
+        self.name = self.data[0:8].decode('utf-8')
+        self.serial = self.data[8:18].decode('utf-8')
+        self.request_id = chr(self.data[18])
+        self.request_type = chr(self.data[19])
+        self.rf_address = RFAddr(self.data[21:24])
+        self.fw_version = ''.join("%02x" % x for x in self.data[24:26])
+
+
+class LegacyDiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigurationResponse):
+
+    def _parse(self):
+        self.name = self.data[0:8].decode('utf-8')
+        self.serial = self.data[8:18].decode('utf-8')
+        self.request_id = chr(self.data[18])
+        self.request_type = chr(self.data[19])
+        self.ip_address = '.'.join([str(x) for x in self.data[20:24]])
+        self.gateway = '.'.join([str(x) for x in self.data[24:28]])
+        self.netmask = '.'.join([str(x) for x in self.data[28:32]])
+        self.dns1 = '.'.join([str(x) for x in self.data[32:36]])
+        self.dns2 = '.'.join([str(x) for x in self.data[36:40]])
+
+
+class LegacyMResponse(MResponse):
+
+    def _parse(self):
+        base64_data = self.data.decode('utf-8')
+        data = bytearray(base64.b64decode(base64_data))
+
+        self.dump_bytes(data, "MResponse")
+
+        self.num_rooms = data[2]
+        logger.debug("Number of rooms from MResponse: %s", self.num_rooms)
+        self.rooms = []
+        pos = 3
+        for i in range(0, self.num_rooms):
+            logger.debug("Parsing room %s of %s (from pos %s)", i + 1, self.num_rooms, pos)
+
+            room_id, name_length = struct.unpack('bb', data[pos:pos+2])
+            room_name = data[pos + 2:pos + 2 + name_length].decode('utf-8')
+            group_rf_address = RFAddr(data[pos+name_length + 2 : pos+name_length + 2 + 3])
+            logger.debug("Room ID: %s, Room Name: %s, Group RF address: %s", room_id, room_name, group_rf_address)
+            self.rooms.append((room_id, room_name, group_rf_address))
+            pos += 1 + 1 + name_length + 3
+
+        self.devices = []
+
+        self.num_devices = data[pos]
+        pos += 1
+
+        for device_idx in range(0, self.num_devices):
+            device_type = data[pos]
+            device_rf_address = RFAddr(data[pos+1 : pos+1 + 3])
+            device_serial = data[pos+4:pos+14].decode('utf-8')
+            device_name_length = data[pos+14]
+            device_name = data[pos+15:pos+15+device_name_length].decode('utf-8')
+            room_id = data[pos+15+device_name_length]
+
+            logger.debug("Device: %s, Device RF address: %s, Device serial: %s, Device: %s, Room: %s", device_idx, device_rf_address, device_serial, device_name, room_id)
+            self.devices.append((device_idx, device_type, device_rf_address, device_serial, device_name, room_id))
+
+            pos += 1 + 3 + 10 + device_name_length + 2
+
+
+class LegacyConfigurationResponse(ConfigurationResponse):
+    """The old parser assigned the derived properties to the class on every parse, the copy assigns them to this
+    class so the current ConfigurationResponse is left alone."""
+
+    def _parse(self):
+        b64 = self.data[7:]
+        data = bytearray(base64.b64decode(b64))
+
+        data_length = data[0]
+        logger.debug("Data length for device config: %s", data_length)
+
+        self.device_addr = RFAddr(data[1:4])
+        self.device_type, self.room_id, self.firmware_version, self.test_result = struct.unpack('bbbb', data[4:8])
+        self.serial_number = data[8:17].decode('utf-8')
+
+        logger.debug("Device config for %s: type: %s, room: %s, firmware: %s, test: %s, serial number: %s",
+            self.device_addr, self.device_type, self.room_id, self.firmware_version, self.test_result, self.serial_number
+        )
+
+        if self.device_type == DeviceCube:
+            self._parse_cube_config(data[18:])
+        elif self.device_type == DeviceRadiatorThermostat or self.device_type == DeviceRadiatorThermostatPlus:
+            self._parse_thermostat_config(data[18:])
+        elif self.device_type == DeviceWallThermostat:
+            self._parse_wall_thermostat_config(data[18:])
+        else:
+            logger.warning("Cannot parse device configuration for type %s (%s)", self.device_type, device_type_name(self.device_type))
+
+    def _parse_cube_config(self, config):
+        self.portal_enabled = bool(config[11])
+        end_of_url = config.index(b'\0', 67)
+        self.portal_url = config[67:end_of_url].decode('utf-8')
+
+    def _parse_thermostat_config(self, config):
+        cls = LegacyConfigurationResponse
+
+        self.comfort_temperature_raw, \
+        self.eco_temperature_raw,\
+        self.max_set_point_temperature_raw,\
+        self.min_set_point_temperature_raw,\
+        self.temperature_offset_raw, \
+        self.window_open_temperature_raw,\
+        self.window_open_duration_raw, \
+        self.boost_raw,\
+        self.decalcification_raw,\
+        self.max_valve_raw,\
+        self.valve_offset_raw = struct.unpack('BBBBBBBBBBB', config[:11])
+
+        cls.comfort_temperature = property(lambda x: x.comfort_temperature_raw / 2.0)
+        cls.eco_temperature = property(lambda x: x.eco_temperature_raw / 2.0)
+        cls.max_set_point_temperature = property(lambda x: x.max_set_point_temperature_raw / 2.0)
+        cls.min_set_point_temperature = property(lambda x: x.min_set_point_temperature_raw / 2.0)
+        cls.temperature_offset = property(lambda x: (x.temperature_offset_raw / 2.0) - 3.5)
+        cls.window_open_temperature = property(lambda x: x.window_open_temperature_raw / 2.0)
+        cls.window_open_duration = property(lambda x: x.window_open_duration_raw * 5.0)
+        cls.boost_duration = property(lambda x: (x.boost_raw >> 5) * 5 if x.boost_raw >> 5 < 7 else 60)
+        cls.boost_valve_setting = property(lambda x: int(x.boost_raw - (x.boost_raw >> 5 << 5)) * 5)
+
+        cls.decalcification_day = property(lambda x: x.decalcification_raw >> 5)
+        cls.decalcification_hour = property(lambda x: int(x.decalcification_raw - (x.decalcification_raw >> 5 << 5)))
+
+        cls.max_valve_setting = property(lambda x: x.max_valve_raw * 100 / 255)
+
+        logger.debug("Comfort temperature:       %s°C (raw: %s)", self.comfort_temperature, self.comfort_temperature_raw)
+        logger.debug("Eco temperature:           %s°C (raw: %s)", self.eco_temperature, self.eco_temperature_raw)
+        logger.debug("Max set point temperature: %s°C (raw: %s)", self.max_set_point_temperature, self.max_set_point_temperature_raw)
+        logger.debug("Min set point temperature: %s°C (raw: %s)", self.min_set_point_temperature, self.min_set_point_temperature_raw)
+        logger.debug("Temperature offset:        %s°C (raw: %s)", self.temperature_offset, self.temperature_offset_raw)
+        logger.debug("Window open temperature:   %s°C (raw: %s)", self.window_open_temperature, self.window_open_temperature_raw)
+        logger.debug("Window open duration:      %s min (raw: %s)", self.window_open_duration, self.window_open_duration_raw)
+        logger.debug("Boost:                     %s minutes, %s %%", self.boost_duration, self.boost_valve_setting)
+        logger.debug("Decalcification:           day %s, hour %s", self.decalcification_day, self.decalcification_hour)
+        logger.debug("Max valve setting:         %s%% (raw: %s)", self.max_valve_setting, self.max_valve_raw)
+        self.week_program = self._parse_legacy_week_program(config[11:])
+
+    def _parse_legacy_week_program(self, buffer):
+        program = []
+
+        for day in range(0, 7):
+            day_schedules = []
+            offset = day * 26
+
+            day_config = buffer[offset:offset+26]
+
+            start = datetime.time()
+
+            for schedule_offset in range(0, 26, 2):
+                schedule_bytes = day_config[schedule_offset:schedule_offset+2]
+                temp, time = unpack_temp_and_time(schedule_bytes)
+
+                schedule = LegacyProgramSchedule(temp, start, time)
+                day_schedules.append(schedule)
+
+                start = schedule.end_minutes
+
+                if time >= 1440:
+                    break
+
+            program.append(day_schedules)
+
+        return program
+
+    def _parse_wall_thermostat_config(self, buffer):
+        cls = LegacyConfigurationResponse
+
+        self.comfort_temperature_raw, \
+        self.eco_temperature_raw,\
+        self.max_set_point_temperature_raw,\
+        self.min_set_point_temperature_raw = struct.unpack('BBBB', buffer[:4])
+
+        cls.comfort_temperature = property(lambda x: x.comfort_temperature_raw / 2.0)
+        cls.eco_temperature = property(lambda x: x.eco_temperature_raw / 2.0)
+        cls.max_set_point_temperature = property(lambda x: x.max_set_point_temperature_raw / 2.0)
+        cls.min_set_point_temperature = property(lambda x: x.min_set_point_temperature_raw / 2.0)
+        self.week_program = self._parse_legacy_week_program(buffer[5:])
+
+
+class LegacySingleLResponse(BaseResponse):
+
+    def _parse(self):
+        submessage_len, rf1, rf2, rf3, unknown, flags1, flags2 = struct.unpack('B3BBBB', self.data[:7])
+        self.rf_addr = RFAddr((rf1, rf2, rf3))
+
+        self.weekly_program = not (flags2 & 0x01 or flags2 & 0x02)
+        self.manual_program = bool(flags2 & 0x01 and not flags2 & 0x02)
+        self.vacation_program = bool(flags2 & 0x02 and not flags2 & 0x01)
+        self.boost_program = bool(flags2 & 0x01 and flags2 & 0x02)
+        self.dst_active = flags2 & 0x08
+
+        self.gateway_known = bool(flags2 & 0x05)
+        self.panel_locked = bool(flags2 & 0x06)
+        self.link_ok = bool(flags2 & 0x07)
+        self.battery_low = bool(not (flags2 & 0x08))
+
+        self.status_initialized = bool(flags1 & 0x02)
+        self.is_answer = bool(not (flags1 & 0x03))
+        self.is_error = bool(flags1 & 0x04)
+        self.is_valid = bool(flags1 & 0x05)
+
+        self.description = "%s: RF addr: %s, program: (weekly: %s, manual: %s, vacation: %s, boost_program: %s)" % (
+            self.__class__.__name__,
+            self.rf_addr, self.weekly_program, self.manual_program, self.vacation_program, self.boost_program
+        )
+        self.description += ", gateway_known: %s, panel_locked: %s, link_ok: %s, battery_low: %s " % (
+            self.gateway_known, self.panel_locked, self.link_ok, self.battery_low
+        )
+        self.description += ", status_initialized: %s, is_answer: %s, is_error: %s, is_valid: %s " % (
+            self.status_initialized, self.is_answer, self.is_error, self.is_valid
+        )
+
+        if submessage_len == 12:
+            self._parse_wall_mounted_thermostat(self.data)
+        elif submessage_len == 11:
+            self._parse_heater_thermostat(self.data)
+
+    def _parse_heater_thermostat(self, data):
+        self.valve_position, self.temperature, du1, self.actual_temperature, time_until = struct.unpack('5B', data[7:12])
+        self.time_until = datetime.timedelta(minutes=time_until * 30)
+        self.temperature /= 2.0
+        self.actual_temperature += (du1 & 1) << 8
+        self.actual_temperature /= 10.0
+        self.description += ", time_until: %s, valve_position: %s, temperature: %s, actual_temperature: %s" % (
+            self.time_until, self.valve_position, self.temperature, self.actual_temperature
+        )
+
+    def _parse_wall_mounted_thermostat(self, data):
+        self.valve_position, self.temperature, du1, du2, time_until, self.actual_temperature = struct.unpack('6B', data[7:13])
+        self.time_until = datetime.timedelta(minutes=time_until * 30)
+        x = self.temperature
+        x &= 128
+        x = x << 1
+        self.temperature &= 127
+        self.temperature /= 2.0
+        self.actual_temperature += x
+        self.actual_temperature /= 10.0
+        self.description += ", time_until: %s, valve_position: %s, temperature: %s, actual_temperature: %s" % (
+            self.time_until, self.valve_position, self.temperature, self.actual_temperature
+        )
+
+    def __str__(self):
+        return self.description
+
+
+class LegacyLResponse(BaseResponse):
+
+    def _parse(self):
+        data = bytearray(base64.b64decode(self.data))
+        self.responses = []
+        self.num_responses = 0
+
+        while len(data) > 5:
+            self.num_responses += 1
+            submessage_len = struct.unpack('B', data[:1])[0]
+            self.responses.append(LegacySingleLResponse(data[:submessage_len+1]))
+            del data[:submessage_len+1]
+
+    def __str__(self):
+        return "LResponse: size %s" % (self.num_responses)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Measures the memory held per device: the Device entry, its L: state and its decoded week program, and the
+L: state history of a poller keeping the last polls, with the current and the legacy response classes (see
+legacy.py). Requires Python 3.4+ (tracemalloc).
+
+Run with: PYTHONPATH=".:./src" python benchmarks/memory.py
+"""
+import base64
+import struct
+import tracemalloc
+from argparse import ArgumentParser
+
+from legacy import LegacyConfigurationResponse, LegacyLResponse
+from pymax.objects import DeviceList, RFAddr
+from pymax.response import LResponse, ConfigurationResponse
+
+# heater thermostat submessage and configuration, the RF address is replaced per device
+SUBMESSAGE = bytearray(base64.b64decode(b'CxIrZfcSGWQ8AOsF'))
+CONFIGURATION = bytearray(base64.b64decode(
+    b'0hIrZQIBEABNRVExNDcyOTk3Oyc9CQcYA5IM/wBESHkPRSBFIEUgRSBFIEUgRSBFIEUgRSBFIERIeQlFIEUgRSBFIEUgRSBFIEUg'
+    b'RSBFIEUgREJ4XkTJeRJFIEUgRSBFIEUgRSBFIEUgRSBEQnheRMl5EkUgRSBFIEUgRSBFIEUgRSBFIERCeF5EyXkSRSBFIEUgRSBF'
+    b'IEUgRSBFIEUgREJ4XkTJeRJFIEUgRSBFIEUgRSBFIEUgRSBEQnheRMl5EkUgRSBFIEUgRSBFIEUgRSBFIA=='))
+
+
+def rf_address(idx):
+    return bytearray(struct.pack('>I', idx + 1)[1:])
+
+
+def l_response(devices):
+    data = bytearray()
+    for idx in range(devices):
+        data += SUBMESSAGE[:1] + rf_address(idx) + SUBMESSAGE[4:]
+    return bytearray(base64.b64encode(data))
+
+
+def c_response(idx):
+    data = CONFIGURATION[:1] + rf_address(idx) + CONFIGURATION[4:]
+    return bytearray(b'%06x,' % (idx + 1)) + bytearray(base64.b64encode(data))
+
+
+def measure(devices, polls, configuration_class=ConfigurationResponse, l_response_class=LResponse):
+    l_data = l_response(devices)
+    c_data = [c_response(idx) for idx in range(devices)]
+
+    tracemalloc.start()
+    device_list = DeviceList()
+    for idx, data in enumerate(c_data):
+        configuration = configuration_class(data)
+        configuration.week_program
+        device_list.update(rf_address=RFAddr(idx + 1), serial='MEQ%07d' % idx, configuration=configuration)
+    for response in l_response_class(l_data).responses:
+        device_list.update(rf_address=response.rf_addr, settings=response)
+    devices_size = tracemalloc.get_traced_memory()[0]
+
+    history = [l_response_class(l_data) for _ in range(polls)]
+    history_size = tracemalloc.get_traced_memory()[0] - devices_size
+    tracemalloc.stop()
+
+    return devices_size / float(devices), history_size / float(devices * polls)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-p', '--polls', type=int, default=10, help="Number of L: responses kept as history")
+    parser.add_argument('devices', nargs='*', type=int, default=[100, 1000])
+    args = parser.parse_args()
+
+    for devices in args.devices:
+        for name, classes in [
+            ('legacy', (LegacyConfigurationResponse, LegacyLResponse)),
+            ('current', (ConfigurationResponse, LResponse)),
+        ]:
+            per_device, per_poll = measure(devices, args.polls, *classes)
+            print("%6s devices, %-7s: %8.0f bytes per device, %6.0f bytes per device and poll" % (
+                devices, name, per_device, per_poll))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Measures parse throughput, latency and allocations of the response classes for synthetic cubes of increasing
+size, to show where parsing stops scaling linearly. Requires Python 3.4+ (tracemalloc).
+
+The payloads come from fakecube.Payloads: a mix of radiator thermostats, wall thermostats and shutter contacts,
+four devices per room and at most 255 rooms. An M: response holds at most 255 devices, so it is skipped for larger
+cubes.
+
+Run with: PYTHONPATH=".:./src" python benchmarks/parsers.py
+"""
+import logging
+import timeit
+import tracemalloc
+from argparse import ArgumentParser
+
+from fakecube import Payloads, FakeCubeState, discovery_response
+from pymax.cube import Discovery
+from pymax.protocol import ResponseParser
+from pymax.response import DiscoveryIdentifyResponse, DiscoveryNetworkConfigurationResponse, HelloResponse, \
+    MResponse, ConfigurationResponse, LResponse, FResponse, SetResponse
+
+# responses of a fixed size, independent of the number of devices
+HELLO = bytearray(FakeCubeState().hello()[2:].encode('ascii'))
+F = bytearray(b'ntp.homematic.com,ntp.homematic.com')
+SET = bytearray(b'00,0,31')
+
+
+def discovery_responses():
+    state = FakeCubeState()
+    return (
+        discovery_response(state, Discovery.create_payload()),
+        discovery_response(state, Discovery.create_payload(discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)),
+    )
+
+
+def best_of(func, number, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def allocated(func):
+    """Peak memory allocated while running `func`."""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def benchmarks(devices):
+    """Yields (label, number of messages, function parsing them) for a cube with `devices` devices."""
+    # room ids are a single byte
+    payloads = Payloads(devices, rooms=min(255, max(1, devices // 4)))
+
+    if devices <= 255:
+        metadata = payloads.metadata()
+        yield 'MResponse (%s parts)' % len(metadata), 1, lambda: MResponse(metadata)
+
+    configurations = payloads.configurations()
+    yield 'ConfigurationResponse', len(configurations), lambda: [ConfigurationResponse(c) for c in configurations]
+    yield 'ConfigurationResponse.week_program', len(configurations), lambda: [
+        getattr(ConfigurationResponse(c), 'week_program', None) for c in configurations
+    ]
+
+    device_list = payloads.device_list()
+    yield 'LResponse', 1, lambda: LResponse(device_list)
+
+    if devices <= 255:
+        lines = payloads.lines()
+        yield 'ResponseParser (M:, C:, L:)', len(configurations) + 2, lambda: ResponseParser().feed(lines)
+
+
+def fixed_size_benchmarks():
+    identify, network_config = discovery_responses()
+    yield 'DiscoveryIdentifyResponse', 1, lambda: DiscoveryIdentifyResponse(identify)
+    yield 'DiscoveryNetworkConfigurationResponse', 1, lambda: DiscoveryNetworkConfigurationResponse(network_config)
+    yield 'HelloResponse', 1, lambda: HelloResponse(HELLO)
+    yield 'FResponse', 1, lambda: FResponse(F)
+    yield 'SetResponse', 1, lambda: SetResponse(SET)
+
+
+def report(label, devices, messages, func, number):
+    duration = best_of(func, number)
+    peak = allocated(func)
+    if devices is None:
+        print("%-38s %10.0f messages/s %10.1f us/message %9.1f KiB peak" % (
+            label, 1 / duration, duration * 1e6, peak / 1024.0
+        ))
+        return
+    print("%-38s %6s devices %10.0f devices/s %10.1f us/message %9.1f KiB peak %7.0f B/device" % (
+        label, devices, devices / duration, duration * 1e6 / messages, peak / 1024.0, peak / float(devices)
+    ))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=10, help="Parses per measurement at 10 devices")
+    parser.add_argument('devices', nargs='*', type=int, default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    # shutter contacts have no configuration to parse and log a warning each
+    logging.basicConfig(level=logging.ERROR)
+
+    for label, messages, func in fixed_size_benchmarks():
+        report(label, None, messages, func, args.number * 100)
+    print("")
+
+    for devices in args.devices:
+        # the same total work for every size
+        number = max(1, args.number * 10 // devices)
+        for label, messages, func in benchmarks(devices):
+            report(label, devices, messages, func, number)
+        print("")
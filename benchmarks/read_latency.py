@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Compares the per-command latency of the timeout terminated reader with the framed reader.
+
+Run with: PYTHONPATH=".:./src" python benchmarks/read_latency.py
+"""
+import time
+from argparse import ArgumentParser
+
+from fakecube import FakeCube
+from pymax.cube import Cube
+from pymax.messages import LMessage, SetTemperatureAndModeMessage
+
+
+class TimeoutReadCube(Cube):
+    """Reads every response until the socket times out, like Cube did before the framed reader."""
+
+    def connect(self):
+        self._socket = self._create_socket()
+        self.read()
+
+    def send_message(self, msg):
+        self.socket.send(msg.to_bytes())
+        self.read()
+
+
+def measure(cube_class, address, iterations):
+    timings = {}
+
+    start = time.time()
+    cube = cube_class(*address)
+    cube.connect()
+    timings['connect'] = time.time() - start
+
+    for name, msg in (
+        ('get_device_list', LMessage()),
+        ('set_mode', SetTemperatureAndModeMessage('100001', 1, SetTemperatureAndModeMessage.ModeAuto)),
+    ):
+        start = time.time()
+        for _ in range(iterations):
+            cube.send_message(msg)
+        timings[name] = (time.time() - start) / iterations
+
+    cube.disconnect()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=3)
+    parser.add_argument('-l', '--latency', type=float, default=0, help="Seconds the fake cube waits before responding")
+    args = parser.parse_args()
+
+    with FakeCube(port=0, latency=args.latency) as fake_cube:
+        for label, cube_class in (('timeout read', TimeoutReadCube), ('framed read', Cube)):
+            timings = measure(cube_class, fake_cube.address, args.iterations)
+            print("%-13s connect: %8.2f ms, get_device_list: %8.2f ms, set_mode: %8.2f ms" % (
+                label, timings['connect'] * 1000, timings['get_device_list'] * 1000, timings['set_mode'] * 1000
+            ))
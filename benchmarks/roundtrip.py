@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Measures the round trips of Cube against an in-process fake cube: connect, parsing the connect burst,
+get_device_list() and set commands, each with percentiles. The results can be written to a JSON file and compared
+with the results of an earlier run.
+
+Run with: PYTHONPATH=".:./src" python benchmarks/roundtrip.py -o roundtrip.json [--baseline previous.json]
+"""
+import datetime
+import json
+import platform
+import time
+from argparse import ArgumentParser
+
+from fakecube import FakeCube
+from pymax.cube import Cube
+from pymax.messages import SetTemperatureAndModeMessage
+
+
+class TimedCube(Cube):
+    """Cube that records when the TCP connection was established, to tell the connect from the burst."""
+
+    connected_at = None
+
+    def _create_socket(self):
+        s = super(TimedCube, self)._create_socket()
+        self.connected_at = time.time()
+        return s
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of the sorted `values`."""
+    idx = int(round(percent / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(len(values) - 1, idx))]
+
+
+def summary(durations):
+    """Statistics of `durations` in milliseconds."""
+    values = sorted(d * 1000 for d in durations)
+    return {
+        'count': len(values),
+        'min': values[0],
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def measure(address, iterations, sets):
+    connect, burst, device_list, set_command = [], [], [], []
+
+    for _ in range(iterations):
+        cube = TimedCube(*address)
+        start = time.time()
+        cube.connect()
+        end = time.time()
+        connect.append(end - start)
+        burst.append(end - cube.connected_at)
+
+        for _ in range(sets // iterations or 1):
+            start = time.time()
+            cube.get_device_list()
+            device_list.append(time.time() - start)
+
+            start = time.time()
+            cube.set_mode_manual(1, '100001', 21.5)
+            set_command.append(time.time() - start)
+
+        cube.disconnect()
+
+    cube = Cube(*address)
+    cube.connect()
+    messages = [SetTemperatureAndModeMessage('100001', 1, SetTemperatureAndModeMessage.ModeManual, temperature=21.5)
+                for _ in range(sets)]
+    start = time.time()
+    cube.send_messages(messages)
+    batch_duration = time.time() - start
+    cube.disconnect()
+
+    return {
+        'connect': summary(connect),
+        'connect_burst': summary(burst),
+        'get_device_list': summary(device_list),
+        'set_command': summary(set_command),
+        'set_throughput': {
+            'sequential': len(set_command) / sum(set_command),
+            'batch': sets / batch_duration,
+        },
+    }
+
+
+def compare(results, baseline):
+    for name, stats in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key in ('p50', 'p90', 'sequential', 'batch'):
+            if key in stats and previous.get(key):
+                print("%-16s %-10s %10.3f -> %10.3f (%+.1f%%)" % (
+                    name, key, previous[key], stats[key], (stats[key] - previous[key]) * 100.0 / previous[key]
+                ))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=20, help="Number of connects")
+    parser.add_argument('-s', '--sets', type=int, default=200, help="Number of set commands")
+    parser.add_argument('-r', '--rooms', type=int, default=4)
+    parser.add_argument('-d', '--devices', type=int, default=4, help="Radiator thermostats per room")
+    parser.add_argument('-l', '--latency', type=float, default=0, help="Seconds the fake cube waits before responding")
+    parser.add_argument('-o', '--output', help="Write the results to this JSON file")
+    parser.add_argument('-b', '--baseline', help="Compare with the results in this JSON file")
+    args = parser.parse_args()
+
+    with FakeCube(port=0, latency=args.latency, rooms=args.rooms, devices=args.devices) as fake_cube:
+        results = measure(fake_cube.address, args.iterations, args.sets)
+
+    for name in ('connect', 'connect_burst', 'get_device_list', 'set_command'):
+        print("%-16s p50: %8.3f ms, p90: %8.3f ms, p99: %8.3f ms, max: %8.3f ms" % (
+            name, results[name]['p50'], results[name]['p90'], results[name]['p99'], results[name]['max']
+        ))
+    print("set commands     sequential: %8.0f/s, batch: %8.0f/s" % (
+        results['set_throughput']['sequential'], results['set_throughput']['batch']
+    ))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f)['results'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'date': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'parameters': {
+                    'iterations': args.iterations,
+                    'sets': args.sets,
+                    'rooms': args.rooms,
+                    'devices': args.devices,
+                    'latency': args.latency,
+                },
+                'results': results,
+            }, f, indent=2, sort_keys=True)
@@ -0,0 +1,541 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Local stand-in for a MAX! cube, for benchmarks and manual testing without cube hardware.
+
+FakeCube listens on TCP like a cube: it sends the H:, M:, C: and L: connect burst to every client and answers l:,
+f:, s: and q: requests. The device state lives in memory and is shared by all connections, so set commands show
+up in the following L: and C: responses. DiscoveryResponder answers identify and network configuration probes
+on UDP.
+
+Run with: PYTHONPATH=".:./src" python src/fakecube.py --rooms 2 --devices 3 --discovery
+"""
+import base64
+import datetime
+import logging
+import select
+import socket
+import struct
+import threading
+import time
+from argparse import ArgumentParser
+
+from pymax.response import DeviceCube, DeviceRadiatorThermostat, DeviceWallThermostat, DeviceShutterContact
+from pymax.util import pack_temp_and_time
+
+logger = logging.getLogger(__name__)
+
+SET_TEMPERATURE_AND_MODE = 0x40
+SET_PROGRAM = 0x10
+SET_TEMPERATURES = 0x11
+SET_VALVE_CONFIG = 0x12
+
+# comfort, eco, max and min set point temperature, temperature offset, window open temperature and duration,
+# boost, decalcification, max valve setting and valve offset, see ConfigurationResponse._parse_thermostat_config
+DEFAULT_THERMOSTAT_CONFIG = (42, 34, 61, 9, 7, 24, 3, 146, 12, 255, 0)
+
+# 17°C until 6:00, 21°C until 22:00, 17°C until midnight
+DEFAULT_DAY_PROGRAM = ((17.0, 360), (21.0, 1320), (17.0, 1440))
+
+DUTY_CYCLE_EXHAUSTED = 100
+
+PORTAL_URL = 'http://www.max-portal.elv.de:80'
+
+# device types of generated devices, in turn
+MIXED_DEVICE_TYPES = (DeviceRadiatorThermostat, DeviceRadiatorThermostat, DeviceWallThermostat, DeviceShutterContact)
+
+
+def day_program(data):
+    """Returns the 26 bytes of a day in the week program for the set points in `data`. Like the cube, the day is
+    filled up with "17°C until midnight"."""
+    data = bytearray(data[:26])
+    while len(data) < 26:
+        data += pack_temp_and_time(17.0, 1440)
+    return data
+
+
+def encode_day_program(schedules):
+    """Encodes (temperature, end minutes) schedules as a day in the week program."""
+    data = bytearray()
+    for temperature, end_minutes in schedules:
+        data += pack_temp_and_time(temperature, end_minutes)
+    return day_program(data)
+
+
+class FakeDevice(object):
+    """In-memory state of a device connected to the fake cube."""
+
+    def __init__(self, device_type, rf_address, serial, name, room_id):
+        self.device_type = device_type
+        self.rf_address = rf_address
+        self.serial = serial
+        self.name = name
+        self.room_id = room_id
+
+        self.mode = 0
+        self.temperature = 21.0
+        self.actual_temperature = 20.5
+        self.valve_position = 0
+        self.window_open = False
+
+        self.config = bytearray(DEFAULT_THERMOSTAT_CONFIG)
+        if device_type == DeviceWallThermostat:
+            self.config = self.config[:4]
+        self.week_program = [encode_day_program(DEFAULT_DAY_PROGRAM) for _ in range(7)]
+
+    @property
+    def rf_bytes(self):
+        return bytearray(struct.pack('>I', self.rf_address)[1:])
+
+    @property
+    def is_thermostat(self):
+        return DeviceRadiatorThermostat <= self.device_type <= DeviceWallThermostat
+
+    def set_temperature_and_mode(self, temperature, mode):
+        self.mode = mode
+        if temperature or mode:
+            self.temperature = temperature
+
+        if self.device_type == DeviceWallThermostat:
+            return
+        if mode == 3:
+            # boost opens the valve
+            self.valve_position = 100
+        else:
+            self.valve_position = max(0, min(100, int((self.temperature - self.actual_temperature) * 25)))
+
+    def submessage(self):
+        """The L: submessage of this device."""
+        flags1 = 0x12
+        flags2 = 0x18 | self.mode
+        header = self.rf_bytes + bytearray([0, flags1, flags2])
+
+        temperature = int(self.temperature * 2)
+        actual_temperature = int(round(self.actual_temperature * 10))
+        if self.device_type == DeviceWallThermostat:
+            # the 9th bit of the actual temperature is the highest bit of the temperature
+            temperature |= (actual_temperature >> 1) & 0x80
+            body = bytearray([self.valve_position, temperature, 0, 0, 0, actual_temperature & 0xff])
+        elif self.is_thermostat:
+            body = bytearray([self.valve_position, temperature, (actual_temperature >> 8) & 0x01,
+                              actual_temperature & 0xff, 0])
+        else:
+            if self.device_type == DeviceShutterContact:
+                header[-1] = 0x18 | (0x02 if self.window_open else 0x00)
+            body = bytearray()
+
+        return bytearray([len(header) + len(body)]) + header + body
+
+    def configuration(self, portal_url=PORTAL_URL):
+        """The decoded payload of the C: response of this device."""
+        serial = bytearray(self.serial.encode('utf-8')[:10].ljust(10, b'\0'))
+        data = self.rf_bytes + bytearray([self.device_type, self.room_id, 0x10, 0]) + serial
+
+        if self.device_type == DeviceCube:
+            portal = bytearray(67)
+            portal[11] = 1
+            data += portal + bytearray(portal_url.encode('utf-8'))
+            # NUL terminated portal url, the configuration of a cube is 236 bytes
+            data += bytearray(max(1, 236 - len(data)))
+        elif self.is_thermostat:
+            data += self.config
+            for day in self.week_program:
+                data += day
+            if self.device_type == DeviceWallThermostat:
+                data += bytearray(3)
+
+        return bytearray([len(data)]) + data
+
+
+def create_rooms(rooms):
+    """Returns (room id, name, group RF address) tuples for `rooms` rooms."""
+    return [(room_id, 'Room %s' % room_id, 0x200000 + room_id) for room_id in range(1, rooms + 1)]
+
+
+def create_devices(count, rooms=1, device_types=MIXED_DEVICE_TYPES):
+    """Returns `count` FakeDevices of `device_types` in turn. The devices are split into `rooms` blocks of the same
+    size for the rooms 1 to `rooms`."""
+    return [
+        FakeDevice(device_types[idx % len(device_types)], 0x100001 + idx, 'MEQ%07d' % (idx + 1), 'Device %s' % (idx + 1),
+                   idx * rooms // count + 1 if rooms else 0)
+        for idx in range(count)
+    ]
+
+
+def encode_metadata(rooms, devices, part_size=1900):
+    """Returns the payloads of the M: response parts for `rooms` (see create_rooms()) and `devices`."""
+    if len(rooms) > 255 or len(devices) > 255:
+        raise ValueError("The M: response holds at most 255 rooms and 255 devices")
+
+    data = bytearray([0x56, 0x02, len(rooms)])
+    for room_id, name, group_address in rooms:
+        name = bytearray(name.encode('utf-8'))
+        data += bytearray([room_id, len(name)]) + name + bytearray(struct.pack('>I', group_address)[1:])
+
+    data += bytearray([len(devices)])
+    for device in devices:
+        name = bytearray(device.name.encode('utf-8'))
+        data += bytearray([device.device_type]) + device.rf_bytes + \
+            bytearray(device.serial.encode('utf-8')[:10].ljust(10, b'\0')) + \
+            bytearray([len(name)]) + name + bytearray([device.room_id])
+    data += bytearray([0x01])
+
+    encoded = base64.b64encode(bytes(data)).decode('ascii')
+    parts = [encoded[pos:pos + part_size] for pos in range(0, len(encoded), part_size)]
+    return ['%02d,%02d,%s' % (idx, len(parts), part) for idx, part in enumerate(parts)]
+
+
+def encode_configuration(device, portal_url=PORTAL_URL):
+    """Returns the payload of the C: response of `device`."""
+    return '%06x,%s' % (device.rf_address, base64.b64encode(bytes(device.configuration(portal_url))).decode('ascii'))
+
+
+def encode_device_list(devices):
+    """Returns the payload of the L: response for `devices`."""
+    data = bytearray()
+    for device in devices:
+        data += device.submessage()
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+class Payloads(object):
+    """Synthetic response payloads for `devices` devices of `device_types` in `rooms` rooms, as the protocol parser
+    passes them to the response classes. Unlike the fake cube, the C: and L: payloads are not limited to the 255
+    devices an M: response can hold; room ids are a single byte though, so there are at most 255 rooms.
+    """
+
+    def __init__(self, devices, rooms=1, device_types=MIXED_DEVICE_TYPES, m_part_size=1900):
+        self.rooms = create_rooms(rooms)
+        self.devices = create_devices(devices, rooms, device_types)
+        self.cube = FakeDevice(DeviceCube, 0x10b199, 'KEQ0523864', '', 0)
+        self.m_part_size = m_part_size
+
+    def metadata(self):
+        """The M: response parts."""
+        return [bytearray(part.encode('ascii')) for part in encode_metadata(self.rooms, self.devices, self.m_part_size)]
+
+    def configurations(self):
+        """The C: responses of the cube and all devices."""
+        return [bytearray(encode_configuration(device).encode('ascii')) for device in [self.cube] + self.devices]
+
+    def device_list(self):
+        """The L: response."""
+        return bytearray(encode_device_list(self.devices).encode('ascii'))
+
+    def lines(self):
+        """The M:, C: and L: responses as sent by the cube, terminated by CRLF."""
+        lines = [b'M:' + part for part in self.metadata()] + [b'C:' + config for config in self.configurations()]
+        lines.append(b'L:' + self.device_list())
+        return bytearray(b''.join(bytes(line) + b'\r\n' for line in lines))
+
+
+class FakeCubeState(object):
+    """Rooms and devices of the fake cube and the responses built from them.
+
+    Every room gets `devices` radiator thermostats, `wall_thermostats` wall thermostats and `shutter_contacts`
+    shutter contacts. Each set command raises the duty cycle by `duty_cycle_per_command` percent; once it
+    reaches 100%, set commands fail like on a cube that has used up its radio time.
+    """
+
+    def __init__(self, rooms=1, devices=1, wall_thermostats=0, shutter_contacts=0, serial='KEQ0523864',
+                 rf_address=0x10b199, duty_cycle=0, duty_cycle_per_command=0, free_mem_slots=0x32,
+                 m_part_size=1900):
+        self.serial = serial
+        self.rf_address = rf_address
+        self.duty_cycle = duty_cycle
+        self.duty_cycle_per_command = duty_cycle_per_command
+        self.free_mem_slots = free_mem_slots
+        self.m_part_size = m_part_size
+        self.ntp_servers = ['ntp.homematic.com', 'ntp.homematic.com']
+        self.portal_url = PORTAL_URL
+        self.lock = threading.RLock()
+
+        self.cube = FakeDevice(DeviceCube, rf_address, serial, '', 0)
+        self.rooms = create_rooms(rooms)
+        room_devices = [DeviceRadiatorThermostat] * devices + [DeviceWallThermostat] * wall_thermostats + \
+            [DeviceShutterContact] * shutter_contacts
+        self.devices = create_devices(rooms * len(room_devices), rooms, room_devices) if room_devices else []
+        # fails early if the devices do not fit into the M: response
+        encode_metadata(self.rooms, self.devices, m_part_size)
+
+    def hello(self):
+        now = datetime.datetime.now()
+        return 'H:%s,%06x,0113,00000000,54243cdd,%02x,%02x,%02x%02x%02x,%02x%02x,03,0000' % (
+            self.serial, self.rf_address, self.duty_cycle, self.free_mem_slots,
+            now.year - 2000, now.month, now.day, now.hour, now.minute
+        )
+
+    def metadata(self):
+        """The M: response, split into parts."""
+        return ['M:%s' % part for part in encode_metadata(self.rooms, self.devices, self.m_part_size)]
+
+    def configurations(self):
+        return ['C:%s' % encode_configuration(device, self.portal_url) for device in [self.cube] + self.devices]
+
+    def device_list(self):
+        return 'L:%s' % encode_device_list(self.devices)
+
+    def connect_burst(self):
+        with self.lock:
+            return [self.hello()] + self.metadata() + self.configurations() + [self.device_list()]
+
+    def handle(self, line):
+        """Returns the response lines for a request line or None if the client quits."""
+        message_type, _, payload = line.partition(':')
+
+        with self.lock:
+            if message_type == 'q':
+                return None
+            elif message_type == 'l':
+                return [self.device_list()]
+            elif message_type == 'f':
+                if payload:
+                    self.ntp_servers = payload.split(',')
+                return ['F:%s' % ','.join(self.ntp_servers)]
+            elif message_type == 's':
+                return [self.set(bytearray(base64.b64decode(payload)))]
+
+        logger.warning("Ignoring unknown request %r", line)
+        return []
+
+    def set(self, data):
+        command, rf_address, room_id, payload = data[2], data[6:9], data[9], data[10:]
+        rf_address = struct.unpack('>I', b'\0' + bytes(rf_address))[0]
+        devices = [device for device in self.devices if device.rf_address == rf_address]
+        if not devices:
+            # a room's group address addresses all devices in the room
+            devices = [device for device in self.devices for room in self.rooms
+                       if room[2] == rf_address and device.room_id == room[0]]
+
+        if self.duty_cycle >= DUTY_CYCLE_EXHAUSTED or not devices:
+            result = 1
+        else:
+            for device in devices:
+                self._apply(device, command, payload)
+            self.duty_cycle = min(DUTY_CYCLE_EXHAUSTED, self.duty_cycle + self.duty_cycle_per_command)
+            result = 0
+
+        return 'S:%02x,%d,%02x' % (self.duty_cycle, result, self.free_mem_slots)
+
+    def _apply(self, device, command, payload):
+        if command == SET_TEMPERATURE_AND_MODE:
+            device.set_temperature_and_mode((payload[0] & 0x3f) / 2.0, payload[0] >> 6)
+        elif command == SET_PROGRAM:
+            device.week_program[payload[0]] = day_program(payload[1:])
+        elif command == SET_TEMPERATURES:
+            device.config[:4] = payload[:4]
+            if device.device_type != DeviceWallThermostat:
+                device.config[4:7] = payload[4:7]
+        elif command == SET_VALVE_CONFIG and device.device_type != DeviceWallThermostat:
+            device.config[7:11] = payload[:4]
+
+
+class FakeCube(object):
+    """TCP server acting as a cube on `address`:`port` (port 0 picks a free port, see `address`).
+
+    `latency` seconds are waited before every response, to simulate the round trip to a real cube. All other
+    keyword arguments are passed to FakeCubeState.
+    """
+
+    def __init__(self, address='127.0.0.1', port=62910, latency=0, **kwargs):
+        self.latency = latency
+        self.state = FakeCubeState(**kwargs)
+        self.connections = 0
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((address, port))
+        self._server.listen(5)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.getsockname()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake cube %s:%s" % self.address)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._server.close()
+
+    def serve_forever(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._server], [], [], 0.1)
+            if not readable:
+                continue
+            client, client_address = self._server.accept()
+            self.connections += 1
+            logger.info("Client %s:%s connected", *client_address)
+            thread = threading.Thread(target=self.handle, args=(client, ))
+            thread.daemon = True
+            thread.start()
+
+    def _send(self, client, lines):
+        client.sendall(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+
+    def handle(self, client):
+        # pipelined responses must not wait for the ACK of the previous ones
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            self._send(client, self.state.connect_burst())
+            buffer = b''
+            while not self._stop.is_set():
+                readable, _, _ = select.select([client], [], [], 0.1)
+                if not readable:
+                    continue
+                data = client.recv(4096)
+                if not data:
+                    break
+                buffer += data
+
+                # the responses to all requests of a read are sent at once
+                pending = []
+                quit = False
+                while b'\r\n' in buffer and not quit:
+                    line, buffer = buffer.split(b'\r\n', 1)
+                    responses = self.state.handle(line.decode('utf-8'))
+                    if responses is None:
+                        quit = True
+                    elif responses:
+                        if self.latency:
+                            time.sleep(self.latency)
+                        pending.extend(responses)
+                if pending:
+                    self._send(client, pending)
+                if quit:
+                    return
+        except socket.error as ex:
+            logger.info("Connection error: %s", ex)
+        finally:
+            client.close()
+
+
+def discovery_response(state, probe, ip_address='127.0.0.1'):
+    """Returns the response of the cube of `state` to a discovery probe or None if the probe is not for it."""
+    if len(probe) != 19 or probe[:8] != bytearray(b'eQ3Max*\0'):
+        return None
+
+    serial = bytearray(state.serial.encode('utf-8'))
+    if probe[8:18] not in (serial, bytearray(b'*' * 10)):
+        return None
+
+    header = bytearray(b'eQ3MaxAp') + serial + bytearray(b'>') + probe[18:19]
+    if probe[18:19] == bytearray(b'I'):
+        return header + bytearray([0]) + bytearray(struct.pack('>I', state.rf_address)[1:]) + \
+            bytearray([0x01, 0x13])
+    elif probe[18:19] == bytearray(b'N'):
+        ip_address = bytearray(socket.inet_aton(ip_address))
+        return header + ip_address + bytearray(socket.inet_aton('0.0.0.0')) + \
+            bytearray(socket.inet_aton('255.255.255.0')) + bytearray(8)
+    return None
+
+
+class DiscoveryResponder(object):
+    """Answers discovery probes for the cube of `state` on UDP `port`.
+
+    Like a real cube, replies are sent to the sender's address on the discovery port (`reply_port`), or to the
+    port the probe came from if `reply_port` is None. The socket uses SO_REUSEADDR, so a Discovery on the same host
+    can bind the discovery port, too. The broadcasts of the Discovery reach both sockets, but datagrams sent to
+    the port itself only reach the socket bound last (the Discovery's), so the network configuration requests of
+    `Discovery.discover_all()` are not answered on the same host.
+    """
+
+    def __init__(self, state, address='0.0.0.0', port=23272, reply_port=23272, ip_address='127.0.0.1'):
+        self.state = state
+        self.reply_port = reply_port
+        self.ip_address = ip_address
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((address, port))
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._socket.getsockname()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake cube discovery %s:%s" % self.address)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._socket.close()
+
+    def serve_forever(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._socket], [], [], 0.1)
+            if not readable:
+                continue
+            data, (host, port) = self._socket.recvfrom(64)
+            response = self.response(bytearray(data))
+            if response is not None:
+                self._socket.sendto(bytes(response), (host, self.reply_port or port))
+
+    def response(self, probe):
+        """Returns the response to a discovery probe or None if the probe is not for this cube."""
+        return discovery_response(self.state, probe, self.ip_address)
+
+
+if __name__ == "__main__": # pragma: no cover
+    parser = ArgumentParser()
+    parser.add_argument('-a', '--address', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=62910)
+    parser.add_argument('-r', '--rooms', type=int, default=1)
+    parser.add_argument('-d', '--devices', type=int, default=1, help="Radiator thermostats per room")
+    parser.add_argument('-w', '--wall-thermostats', type=int, default=0, help="Wall thermostats per room")
+    parser.add_argument('-s', '--shutter-contacts', type=int, default=0, help="Shutter contacts per room")
+    parser.add_argument('-l', '--latency', type=float, default=0, help="Seconds to wait before each response")
+    parser.add_argument('--duty-cycle', type=int, default=0, help="Initial duty cycle in percent")
+    parser.add_argument('--duty-cycle-per-command', type=int, default=0,
+                        help="Duty cycle used by each set command in percent")
+    parser.add_argument('--discovery', action='store_true', help="Answer discovery probes on UDP port 23272")
+    parser.add_argument('-v', '--verbose', action="count", default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.FATAL - (10 * args.verbose), format='%(asctime)s %(levelname)-7s %(message)s')
+
+    fake_cube = FakeCube(args.address, args.port, latency=args.latency, rooms=args.rooms, devices=args.devices,
+                         wall_thermostats=args.wall_thermostats, shutter_contacts=args.shutter_contacts,
+                         duty_cycle=args.duty_cycle, duty_cycle_per_command=args.duty_cycle_per_command)
+    fake_cube.start()
+    responder = None
+    if args.discovery:
+        responder = DiscoveryResponder(fake_cube.state, ip_address=args.address)
+        responder.start()
+
+    print("Fake cube %s listening on %s:%s" % (fake_cube.state.serial, fake_cube.address[0], fake_cube.address[1]))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if responder:
+            responder.stop()
+        fake_cube.stop()
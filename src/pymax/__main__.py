@@ -6,45 +6,90 @@ from argparse import ArgumentParser
 
 import sys
 
-from pymax.cube import Discovery, Cube
-from pymax.response import device_type_name
+from pymax.cube import Cube, Discovery, DiscoveryCache
+from pymax.pool import CubePool
+from pymax.response import device_type_name, DiscoveryNetworkConfigurationResponse
 
 if __name__ == "__main__": # pragma: no cover
     parser = ArgumentParser()
     parser.add_argument('-v', '--verbose', action="count", default=1)
     parser.add_argument('-s', '--serial', help='Query cube with serial')
-    parser.add_argument('host', nargs='?')
+    parser.add_argument('-t', '--discovery-timeout', type=float, default=0.5,
+                        help='Seconds to wait for cubes to answer the discovery')
+    parser.add_argument('--sweep', action='append', metavar='NETWORK',
+                        help='Search cubes in this network (CIDR notation) by unicast instead of broadcast')
+    parser.add_argument('-d', '--discover', action='store_true',
+                        help='Search for cubes even if there are cached ones, e.g. to find new cubes')
+    parser.add_argument('--cache-ttl', type=int, default=24 * 3600,
+                        help='Seconds discovered cubes are remembered, 0 disables the discovery cache')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='Number of cubes to query in parallel')
+    parser.add_argument('host', nargs='*')
 
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.FATAL - (10 * args.verbose), format='%(asctime)s %(levelname)-7s %(message)s')
 
-    host = args.host
-    if not host:
-        serial = args.serial
-        if not serial:
-            response = Discovery().discover()
-            if response:
-                serial = response.serial
-            else:
-                print("No cubes found.")
-                sys.exit(1)
+    cache = DiscoveryCache(ttl=args.cache_ttl) if args.cache_ttl > 0 else None
+
+    def create_cube(cube):
+        # cubes found by a discovery are discovered again if they cannot be connected to at the cached address
+        if isinstance(cube, DiscoveryNetworkConfigurationResponse):
+            return Cube(cube, serial=cube.serial, discovery_cache=cache)
+        return Cube(cube)
 
+    cubes = args.host
+    if not cubes and args.serial:
         try:
-            net_cfg_response = Discovery().discover(cube_serial=serial, discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+            if cache is not None:
+                net_cfg_response = cache.resolve(args.serial)
+            else:
+                net_cfg_response = Discovery().discover(cube_serial=args.serial, discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
             print("Discovered cube: %s" % net_cfg_response)
-            host = net_cfg_response.ip_address
+            cubes = [net_cfg_response]
         except socket.timeout as st:
-            print("Could not find cube '%s': %s" % (serial, st))
+            print("Could not find cube '%s': %s" % (args.serial, st))
             sys.exit(1)
+    elif not cubes:
+        # the cached cubes are connected to directly, cubes that moved are discovered again on connect
+        discover = args.discover or args.sweep or cache is None
+        cubes = [] if discover else cache.responses()
+        for net_cfg_response in cubes:
+            print("Cached cube: %s" % net_cfg_response)
+
+        if not cubes:
+            if args.sweep:
+                discovered_cubes = Discovery().sweep(args.sweep, timeout=args.discovery_timeout)
+            else:
+                discovered_cubes = Discovery().discover_all(timeout=args.discovery_timeout)
+
+            for discovered in discovered_cubes:
+                if discovered.network_config is None:
+                    print("Cube %s did not send its network configuration" % discovered.serial)
+                    continue
+                print("Discovered cube: %s" % discovered.network_config)
+                cubes.append(discovered.network_config)
+                if cache is not None:
+                    cache.put(discovered.network_config)
+
+        if not cubes:
+            print("No cubes found.")
+            sys.exit(1)
+
+    pool = CubePool(cubes, concurrency=args.jobs, cube_class=create_cube)
+    try:
+        for cube, _, error in pool.connect():
+            print("")
+            if error:
+                print("Could not connect to cube %s:%s: %s" % (cube.addr_port[0], cube.addr_port[1], error))
+                continue
 
-    with Cube(host) as cube:
-        print("")
-        print(cube.info)
+            print(cube.info)
 
-        print("")
-        print("Rooms:")
-        for room in cube.rooms:
-            print("  %s (ID: %s, RF address: %s):" % (room.name, room.room_id, room.rf_address))
-            for device in room.devices:
-                print("  - %s, serial: %s, RF address: %s" % (device.name, device.serial, device.rf_address))
+            print("")
+            print("Rooms:")
+            for room in cube.rooms:
+                print("  %s (ID: %s, RF address: %s):" % (room.name, room.room_id, room.rf_address))
+                for device in room.devices:
+                    print("  - %s, serial: %s, RF address: %s" % (device.name, device.serial, device.rf_address))
+    finally:
+        pool.disconnect()
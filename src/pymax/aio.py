@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""asyncio based counterparts of :class:`pymax.cube.Cube` and :class:`pymax.cube.Discovery` (Python 3.5+)."""
+import asyncio
+import collections
+import logging
+import socket
+import time
+
+from pymax.cube import BaseCube, CubeConnectionException, Discovery, CONNECT_RESPONSES, batch_to_bytes
+from pymax.messages import QuitMessage, FMessage, LMessage, SetTemperatureAndModeMessage, SetProgramMessage, \
+    SetTemperaturesMessage, SetValveConfigMessage
+from pymax.protocol import ResponseParser, find_response
+from pymax.response import SET_RESPONSE, DiscoveryIdentifyResponse
+from pymax.util import Debugger
+
+logger = logging.getLogger(__name__)
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self.datagrams = asyncio.Queue()
+
+    def datagram_received(self, data, addr):
+        self.datagrams.put_nowait((bytearray(data), addr))
+
+    def error_received(self, exc):
+        logger.warning("Discovery socket error: %s", exc)
+
+
+def _discovery_socket():
+    discovery_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # other clients may use the discovery port, too
+    discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    discovery_socket.bind(("0.0.0.0", 23272))
+    discovery_socket.setblocking(False)
+    return discovery_socket
+
+
+class AsyncDiscovery(Debugger):
+    DISCOVERY_TYPE_IDENTIFY = Discovery.DISCOVERY_TYPE_IDENTIFY
+    DISCOVERY_TYPE_NETWORK_CONFIG = Discovery.DISCOVERY_TYPE_NETWORK_CONFIG
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    async def discover(self, cube_serial=None, discovery_type=DISCOVERY_TYPE_IDENTIFY):
+        transport, protocol = await self._create_endpoint()
+
+        try:
+            payload = Discovery.create_payload(cube_serial, discovery_type)
+            self.dump_bytes(payload, "Discovery packet")
+            transport.sendto(payload, ("255.255.255.255", 23272))
+
+            return await asyncio.wait_for(self._receive(protocol, discovery_type), self.timeout)
+        finally:
+            transport.close()
+
+    async def _receive(self, protocol, discovery_type):
+        while True:
+            data, addr = await protocol.datagrams.get()
+            try:
+                return Discovery.parse_response(data, discovery_type)
+            except ValueError:
+                # our own broadcast or an answer to another request
+                logger.debug("Ignoring %s bytes from %s", len(data), addr)
+
+    async def _create_endpoint(self):
+        return await asyncio.get_event_loop().create_datagram_endpoint(_DiscoveryProtocol, sock=_discovery_socket())
+
+
+CubePresence = collections.namedtuple('CubePresence', ('serial', 'rf_address', 'fw_version', 'ip_address', 'last_seen'))
+
+
+class DiscoveryListener(asyncio.DatagramProtocol):
+    """Keeps track of the cubes in the network with a single UDP socket.
+
+    An identify request is broadcast every `interval` seconds; every answer updates the registry (`cubes`, serial ->
+    CubePresence). A cube that did not answer for `expiry` seconds (three intervals by default) is removed as soon
+    as that time has passed.
+
+    `on_appear(cube)`, `on_disappear(cube)` and `on_address_change(cube, old_ip_address)` are called with the
+    CubePresence of the cube; they may be coroutine functions. Their errors are logged.
+    """
+
+    def __init__(self, interval=60, expiry=None, on_appear=None, on_disappear=None, on_address_change=None,
+                 address=("255.255.255.255", 23272)):
+        self.interval = interval
+        self.expiry = expiry if expiry is not None else 3 * interval
+        self.on_appear = on_appear
+        self.on_disappear = on_disappear
+        self.on_address_change = on_address_change
+        self.address = address
+        self.transport = None
+        self._cubes = {}
+        self._probe_task = None
+        self._expiry_handle = None
+        self._tasks = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    @property
+    def cubes(self):
+        return dict(self._cubes)
+
+    async def start(self):
+        if self.transport is not None:
+            raise RuntimeError("Already started")
+
+        await asyncio.get_event_loop().create_datagram_endpoint(lambda: self, sock=self._create_socket())
+        self._probe_task = asyncio.ensure_future(self._probe())
+
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        if self._expiry_handle is not None:
+            self._expiry_handle.cancel()
+            self._expiry_handle = None
+        if self._tasks:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def probe(self):
+        """Sends an identify request now."""
+        self.transport.sendto(Discovery.create_payload(), self.address)
+
+    async def _probe(self):
+        while True:
+            try:
+                self.probe()
+            except OSError as ex:
+                logger.warning("Cannot send discovery request: %s", ex)
+            await asyncio.sleep(self.interval)
+
+    def expire(self):
+        """Removes the cubes that were not seen for `expiry` seconds."""
+        deadline = time.time() - self.expiry
+        for serial, cube in list(self._cubes.items()):
+            if cube.last_seen < deadline:
+                logger.info("Cube %s disappeared", serial)
+                del self._cubes[serial]
+                self._notify(self.on_disappear, cube)
+
+    def _expire(self):
+        self._expiry_handle = None
+        self.expire()
+        self._schedule_expiry()
+
+    def _schedule_expiry(self):
+        # wakes up when the cube seen longest ago expires; later answers only make that too early, then the
+        # next check is scheduled
+        if self._expiry_handle is not None or self.transport is None or not self._cubes:
+            return
+        deadline = min(cube.last_seen for cube in self._cubes.values()) + self.expiry
+        self._expiry_handle = asyncio.get_event_loop().call_later(max(0, deadline - time.time()), self._expire)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._schedule_expiry()
+
+    def datagram_received(self, data, addr):
+        try:
+            response = DiscoveryIdentifyResponse(bytearray(data))
+        except ValueError:
+            # our own broadcast or an answer to another request
+            logger.debug("Ignoring %s bytes from %s", len(data), addr)
+            return
+
+        previous = self._cubes.get(response.serial)
+        cube = CubePresence(response.serial, response.rf_address, response.fw_version, addr[0], time.time())
+        self._cubes[response.serial] = cube
+
+        if previous is None:
+            logger.info("Cube %s appeared at %s", cube.serial, cube.ip_address)
+            self._notify(self.on_appear, cube)
+        elif previous.ip_address != cube.ip_address:
+            logger.info("Cube %s moved from %s to %s", cube.serial, previous.ip_address, cube.ip_address)
+            self._notify(self.on_address_change, cube, previous.ip_address)
+        self._schedule_expiry()
+
+    def error_received(self, exc):
+        logger.warning("Discovery socket error: %s", exc)
+
+    def _notify(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            result = callback(*args)
+            if asyncio.iscoroutine(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+        except Exception:
+            logger.exception("Error in discovery listener callback")
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error in discovery listener callback", exc_info=task.exception())
+
+    def _create_socket(self):
+        return _discovery_socket()
+
+
+class AsyncCube(BaseCube):
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncCube, self).__init__(*args, **kwargs)
+        self.timeout = kwargs.get('timeout', 1)
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def _resolve_address(self, refresh=False):
+        """Sets the address to the one of the cube `serial`, from the discovery cache if there is one."""
+        response = None
+        if self.discovery_cache is not None and not refresh:
+            response = self.discovery_cache.get(self.serial)
+        if response is None:
+            response = await AsyncDiscovery().discover(cube_serial=self.serial,
+                                                       discovery_type=AsyncDiscovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+            if self.discovery_cache is not None:
+                self.discovery_cache.put(response)
+        self.addr_port = response.ip_address, self.addr_port[1]
+
+    async def _open_connection(self):
+        logger.info("Connecting to cube %s:%s", *self.addr_port)
+        return await asyncio.wait_for(asyncio.open_connection(*self.addr_port), self.timeout)
+
+    async def connect(self):
+        if self._writer:
+            raise CubeConnectionException("Already connected")
+
+        if self.addr_port[0] is None and self.serial:
+            await self._resolve_address()
+
+        try:
+            self._reader, self._writer = await self._open_connection()
+        except (OSError, asyncio.TimeoutError) as ex:
+            if not self.serial:
+                raise
+            # the cube may have got another address since it was discovered
+            logger.info("Cannot connect to cube %s at %s:%s (%s), discovering it again", self.serial,
+                        self.addr_port[0], self.addr_port[1], ex)
+            addr_port = self.addr_port
+            try:
+                await self._resolve_address(refresh=True)
+            except (OSError, asyncio.TimeoutError):
+                # don't try the stale address again on the next start
+                if self.discovery_cache is not None:
+                    self.discovery_cache.invalidate(self.serial)
+                raise
+            if self.addr_port == addr_port:
+                raise ex
+            self._reader, self._writer = await self._open_connection()
+        self._parser = ResponseParser(self.response_cache)
+        self._lock = asyncio.Lock()
+        await self.read(until=CONNECT_RESPONSES)
+
+    async def disconnect(self):
+        if self._writer:
+            try:
+                await self.send_message(QuitMessage())
+            finally:
+                await self._close()
+
+    async def _close(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is None:
+            return
+        writer.close()
+        if hasattr(writer, 'wait_closed'):
+            try:
+                await writer.wait_closed()
+            except (OSError, ConnectionError) as ex:
+                logger.debug("Error closing connection: %s", ex)
+
+    async def read(self, until):
+        """Reads until a complete frame of each of the response types in `until` arrived.
+
+        Returns the responses read.
+        """
+        if self._reader is None:
+            raise CubeConnectionException("Not connected")
+
+        pending = set(until)
+        responses = []
+
+        while pending:
+            try:
+                data = await asyncio.wait_for(self._reader.read(4096), self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timeout while waiting for %s response(s)", ', '.join(sorted(pending)))
+                break
+
+            logger.debug("Read %s bytes", len(data))
+            if not data:
+                await self._close()
+                raise CubeConnectionException("Connection closed by cube while waiting for %s response(s)" %
+                                              ', '.join(sorted(pending)))
+
+            for response in self._parser.feed(data):
+                self._received(response)
+                self.handle_message(response)
+                pending.discard(response.message_type)
+                responses.append(response)
+
+        return responses
+
+    async def send_message(self, msg):
+        if self._writer is None:
+            raise CubeConnectionException("Not connected")
+
+        message_bytes = msg.to_bytes()
+        logger.info("Sending '%s' message (%s bytes)", msg.__class__.__name__, len(message_bytes))
+
+        # one request at a time, otherwise the responses of concurrent callers get mixed up
+        async with self._lock:
+            self._writer.write(message_bytes)
+            await self._writer.drain()
+            return await self.read(until=msg.response_types)
+
+    async def send_messages(self, messages):
+        """Sends many SetMessages with a single write and returns the SetResponse for each of them, in order."""
+        if self._writer is None:
+            raise CubeConnectionException("Not connected")
+
+        messages = list(messages)
+        message_bytes = batch_to_bytes(messages)
+        logger.info("Sending %s messages (%s bytes)", len(messages), len(message_bytes))
+
+        async with self._lock:
+            self._writer.write(message_bytes)
+            await self._writer.drain()
+
+            responses = []
+            while len(responses) < len(messages):
+                received = [r for r in await self.read(until=(SET_RESPONSE, )) if r.message_type == SET_RESPONSE]
+                if not received:
+                    logger.warning("Received %s of %s responses", len(responses), len(messages))
+                    break
+                responses.extend(received)
+
+        if len(responses) > len(messages):
+            # the first responses belong to an earlier request that was not answered in time
+            logger.warning("Received %s responses for %s messages, ignoring the first %s", len(responses),
+                           len(messages), len(responses) - len(messages))
+            responses = responses[len(responses) - len(messages):]
+
+        return responses + [None] * (len(messages) - len(responses))
+
+    async def _send_set_message(self, msg):
+        # received_messages may already hold the response of a concurrent request, so pick our own
+        return find_response(await self.send_message(msg), SET_RESPONSE)
+
+    async def get_ntp_servers(self):
+        if self._ntp_servers is None:
+            await self.send_message(FMessage())
+        return self._ntp_servers
+
+    async def set_ntp_servers(self, ntp_servers):
+        await self.send_message(FMessage(ntp_servers))
+
+    async def get_device_list(self):
+        await self.send_message(LMessage())
+        return self.devices
+
+    async def set_mode_auto(self, room, rf_addr):
+        return await self.set_mode(room, rf_addr, SetTemperatureAndModeMessage.ModeAuto)
+
+    async def set_mode_boost(self, room, rf_addr):
+        return await self.set_mode(room, rf_addr, SetTemperatureAndModeMessage.ModeBoost)
+
+    async def set_mode_manual(self, room, rf_addr, temperature):
+        return await self.set_mode(room, rf_addr, SetTemperatureAndModeMessage.ModeManual, temperature=temperature)
+
+    async def set_mode_vacation(self, room, rf_addr, temperature, end):
+        return await self.set_mode(room, rf_addr, SetTemperatureAndModeMessage.ModeVacation, temperature=temperature, end=end)
+
+    async def set_mode(self, room, rf_addr, mode, *args, **kwargs):
+        return await self._send_set_message(SetTemperatureAndModeMessage(rf_addr, room, mode, **kwargs))
+
+    async def set_program(self, room, rf_addr, weekday, program):
+        return await self._send_set_message(SetProgramMessage(rf_addr, room, weekday, program))
+
+    async def set_temperatures(self, room, rf_addr, comfort, eco, min, max, temperature_offset, window_open, window_open_duration):
+        return await self._send_set_message(SetTemperaturesMessage(rf_addr, room, comfort, eco, min, max, temperature_offset, window_open, window_open_duration))
+
+    async def set_valve_config(self, room, rf_addr, boost_duration, boost_valve_position, decalc_day, decalc_hour, max_valve_setting):
+        return await self._send_set_message(SetValveConfigMessage(rf_addr, room, boost_duration, boost_valve_position, decalc_day, decalc_hour, max_valve_setting))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from pymax.messages import SetTemperatureAndModeMessage, SetTemperaturesMessage
+from pymax.protocol import find_response
+from pymax.response import SET_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+CoalescableMessages = SetTemperatureAndModeMessage, SetTemperaturesMessage
+
+
+class CoalescedCommand(object):
+    """Handle for a message given to a CoalescingSender.
+
+    `response` is the SetResponse of the message that was actually sent for this device, which is a later one if
+    `superseded` is True. `error` holds the exception if sending failed.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self.superseded = False
+        self.response = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.response
+
+    def _complete(self, response, error=None, superseded=False):
+        self.response = response
+        self.error = error
+        self.superseded = superseded
+        self._done.set()
+
+
+class _Pending(object):
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.commands = []
+
+
+class CoalescingSender(object):
+    """Collapses repeated writes to the same device.
+
+    SetTemperatureAndModeMessages and SetTemperaturesMessages are held for `window` seconds after the first one
+    for a device (RF address, room and message type) arrived. Only the last message of the window is sent, and all
+    commands collected in the window receive its SetResponse. Other messages are sent right away.
+    """
+
+    def __init__(self, cube, window=0.5):
+        self.cube = cube
+        self.window = window
+        self.sent = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    @staticmethod
+    def key(msg):
+        return msg.__class__, str(msg.rf_addr).lower(), msg.room_number
+
+    def submit(self, msg):
+        command = CoalescedCommand(msg)
+
+        if not isinstance(msg, CoalescableMessages):
+            self._send(msg, [command])
+            return command
+
+        key = self.key(msg)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                timer = threading.Timer(self.window, self._flush_key, args=(key, ))
+                timer.daemon = True
+                pending = self._pending[key] = _Pending(timer)
+                timer.start()
+            else:
+                self.coalesced += 1
+            pending.commands.append(command)
+
+        return command
+
+    def flush(self):
+        """Sends all held messages now."""
+        with self._lock:
+            keys = list(self._pending.keys())
+
+        for key in keys:
+            self._flush_key(key)
+
+    def _flush_key(self, key):
+        with self._lock:
+            pending = self._pending.pop(key, None)
+
+        if pending is None:
+            # already flushed
+            return
+
+        pending.timer.cancel()
+        self._send(pending.commands[-1].message, pending.commands)
+
+    def _send(self, msg, commands):
+        response, error = None, None
+        try:
+            with self._send_lock:
+                self.sent += 1
+                response = find_response(self.cube.send_message(msg), SET_RESPONSE)
+        except Exception as ex:
+            logger.warning("Sending %s failed: %s", msg, ex)
+            error = ex
+
+        last = commands[-1]
+        for command in commands:
+            command._complete(response, error, superseded=command is not last)
@@ -1,22 +1,45 @@
 # -*- coding: utf-8 -*-
+import binascii
+import errno
+import json
+import os
+import select
 import socket
+import threading
+import time
 
 import logging
 
 import collections
 
-from pymax.messages import QuitMessage, FMessage, LMessage, SetTemperatureAndModeMessage, SetProgramMessage, \
-    SetTemperaturesMessage, SetValveConfigMessage
+from pymax.messages import QuitMessage, FMessage, LMessage, SetMessage, SetTemperatureAndModeMessage, \
+    SetProgramMessage, SetTemperaturesMessage, SetValveConfigMessage
 from pymax.objects import DeviceList, Device, RFAddr
+from pymax.protocol import ResponseParser, parse_response
 from pymax.response import DiscoveryIdentifyResponse, DiscoveryNetworkConfigurationResponse, HelloResponse, MResponse, \
-    HELLO_RESPONSE, M_RESPONSE, MultiPartResponses, CONFIGURATION_RESPONSE, ConfigurationResponse, L_RESPONSE, LResponse, \
-    F_RESPONSE, FResponse, SET_RESPONSE, SetResponse
-from pymax.util import Debugger
+    HELLO_RESPONSE, M_RESPONSE, ConfigurationResponse, L_RESPONSE, LResponse, FResponse, SET_RESPONSE
+from pymax.util import Debugger, network_hosts
 
 logger = logging.getLogger(__name__)
 
+# the cube sends H:, M:, C: (one per device) and L: after a client connected, L: being the last one
+CONNECT_RESPONSES = HELLO_RESPONSE, L_RESPONSE
+
 Room = collections.namedtuple('Room', ('room_id', 'name', 'rf_address', 'devices'))
 
+DiscoveredCube = collections.namedtuple('DiscoveredCube', ('serial', 'identify', 'network_config'))
+
+
+def batch_to_bytes(messages):
+    if not all(isinstance(msg, SetMessage) for msg in messages):
+        raise ValueError("Only SetMessages can be sent in a batch")
+
+    message_bytes = bytearray([])
+    for msg in messages:
+        message_bytes += msg.to_bytes()
+    return message_bytes
+
+
 class Discovery(Debugger):
     DISCOVERY_TYPE_IDENTIFY = 'I'
     DISCOVERY_TYPE_NETWORK_CONFIG = 'N'
@@ -27,34 +50,221 @@ class Discovery(Debugger):
 
         try:
             send_socket = self._create_send_socket()
-            payload = bytearray("eQ3Max", "utf-8") + \
-                        bytearray("*\0", "utf-8") + \
-                        bytearray(cube_serial or '*' * 10, 'utf-8') + \
-                        bytearray(discovery_type, 'utf-8')
+            payload = self.create_payload(cube_serial, discovery_type)
 
             self.dump_bytes(payload, "Discovery packet")
 
+            # listen before sending, the answer may be faster than binding the socket
+            recv_socket = self._create_receive_socket()
             send_socket.sendto(payload, ("255.255.255.255", 23272))
+
+            while True:
+                response = bytearray(recv_socket.recv(50))
+                try:
+                    return self.parse_response(response, discovery_type)
+                except ValueError:
+                    # our own broadcast
+                    logger.debug("Ignoring %s bytes", len(response))
+        finally:
+            if send_socket:
+                send_socket.close()
+            if recv_socket:
+                recv_socket.close()
+
+    def discover_all(self, timeout=0.5, max_cubes=None, network_config=True):
+        """Broadcasts an identify request and collects the answers of all cubes for `timeout` seconds or until
+        `max_cubes` cubes answered. Then the network configuration of all found cubes is requested at once, unless
+        `network_config` is false; this waits at most another `timeout` seconds.
+
+        Returns a DiscoveredCube for each cube in the order they answered. `network_config` of a DiscoveredCube is
+        None if the cube did not send its network configuration in time.
+        """
+        send_socket = None
+        recv_socket = None
+
+        try:
+            send_socket = self._create_send_socket()
             recv_socket = self._create_receive_socket()
 
-            response = bytearray(recv_socket.recv(50))
+            payload = self.create_payload()
+            self.dump_bytes(payload, "Discovery packet")
+            send_socket.sendto(payload, ("255.255.255.255", 23272))
+
+            cubes = collections.OrderedDict()
+            for response, addr in self._receive_all(recv_socket, time.time() + timeout, DiscoveryIdentifyResponse):
+                if response.serial in cubes:
+                    continue
+                cubes[response.serial] = response, addr[0]
+                if max_cubes and len(cubes) >= max_cubes:
+                    break
+
+            network_configs = {}
+            if network_config:
+                network_configs = self._request_network_configs(send_socket, recv_socket, cubes, 23272, timeout)
 
-            if discovery_type == Discovery.DISCOVERY_TYPE_IDENTIFY:
-                return DiscoveryIdentifyResponse(response)
-            elif discovery_type == Discovery.DISCOVERY_TYPE_NETWORK_CONFIG:
-                return DiscoveryNetworkConfigurationResponse(response)
+            return [DiscoveredCube(serial, identify, network_configs.get(serial))
+                    for serial, (identify, _) in cubes.items()]
         finally:
             if send_socket:
                 send_socket.close()
             if recv_socket:
                 recv_socket.close()
 
+    def sweep(self, networks, timeout=1, max_cubes=None, network_config=True, rate=None, port=23272):
+        """Sends an identify request to every host of `networks` (a list of networks in CIDR notation, e.g.
+        '10.1.0.0/16') instead of broadcasting it, so cubes behind routers are found too.
+
+        The requests are sent from a single non-blocking socket as fast as it accepts them, or at most `rate`
+        requests per second, while the answers are collected. After the last request, answers are awaited for
+        another `timeout` seconds unless `max_cubes` cubes answered before. The network configuration of the
+        found cubes is requested like in `discover_all()`.
+
+        Returns a DiscoveredCube for each cube in the order they answered.
+        """
+        cubes = collections.OrderedDict()
+        sweep_socket = self._create_sweep_socket()
+
+        try:
+            sweep_socket.setblocking(False)
+            payload = self.create_payload()
+            hosts = (host for network in networks for host in network_hosts(network))
+            host = next(hosts, None)
+            sent = 0
+            start = time.time()
+            deadline = None
+
+            while not (max_cubes and len(cubes) >= max_cubes):
+                now = time.time()
+                if host is None and deadline is None:
+                    logger.debug("Sent %s requests in %.2f seconds", sent, now - start)
+                    deadline = now + timeout
+                if deadline is not None and now >= deadline:
+                    break
+
+                wait = deadline - now if deadline is not None else 1
+                writable = [sweep_socket] if host is not None else []
+                if rate and host is not None:
+                    # the time until the next request may be sent
+                    delay = sent / float(rate) - (now - start)
+                    if delay > 0:
+                        writable = []
+                        wait = delay
+
+                readable, writable, _ = select.select([sweep_socket], writable, [], wait)
+
+                if readable:
+                    for response, addr in self._receive_available(sweep_socket, DiscoveryIdentifyResponse):
+                        if response.serial not in cubes:
+                            cubes[response.serial] = response, addr[0]
+
+                while writable and host is not None and not (rate and sent / float(rate) > time.time() - start):
+                    try:
+                        sweep_socket.sendto(payload, (host, port))
+                    except socket.error as ex:
+                        if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                            # send buffer full, wait until the socket is writable again
+                            break
+                        logger.debug("Cannot send discovery request to %s: %s", host, ex)
+                    sent += 1
+                    host = next(hosts, None)
+
+            network_configs = {}
+            if network_config:
+                sweep_socket.settimeout(timeout)
+                network_configs = self._request_network_configs(sweep_socket, sweep_socket, cubes, port, timeout)
+
+            return [DiscoveredCube(serial, identify, network_configs.get(serial))
+                    for serial, (identify, _) in cubes.items()]
+        finally:
+            sweep_socket.close()
+
+    def _request_network_configs(self, send_socket, recv_socket, cubes, port, timeout):
+        """Requests the network configuration of `cubes` (serial -> (identify response, IP address)) from each
+        cube directly and returns the answers received within `timeout` seconds by serial."""
+        network_configs = {}
+        if not cubes:
+            return network_configs
+
+        for serial, (_, ip_address) in cubes.items():
+            send_socket.sendto(self.create_payload(serial, self.DISCOVERY_TYPE_NETWORK_CONFIG), (ip_address, port))
+
+        for response, addr in self._receive_all(recv_socket, time.time() + timeout, DiscoveryNetworkConfigurationResponse):
+            if response.serial in cubes:
+                network_configs[response.serial] = response
+            if len(network_configs) == len(cubes):
+                break
+        return network_configs
+
+    def _receive_available(self, recv_socket, response_class):
+        """Yields a (response, address) tuple for every `response_class` datagram available on the non-blocking
+        `recv_socket`."""
+        while True:
+            try:
+                data, addr = recv_socket.recvfrom(50)
+            except socket.error as ex:
+                if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                # e.g. an ICMP error for an earlier request
+                logger.debug("Error receiving discovery answers: %s", ex)
+                continue
+
+            try:
+                response = response_class(bytearray(data))
+            except ValueError:
+                logger.debug("Ignoring %s bytes from %s", len(data), addr)
+                continue
+            yield response, addr
+
+    def _receive_all(self, recv_socket, deadline, response_class):
+        """Yields a (response, address) tuple for every `response_class` datagram received until `deadline`."""
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+
+            recv_socket.settimeout(remaining)
+            try:
+                data, addr = recv_socket.recvfrom(50)
+            except socket.timeout:
+                return
+
+            try:
+                response = response_class(bytearray(data))
+            except ValueError:
+                # our own broadcast or an answer to another request
+                logger.debug("Ignoring %s bytes from %s", len(data), addr)
+                continue
+            yield response, addr
+
+    @staticmethod
+    def create_payload(cube_serial=None, discovery_type=DISCOVERY_TYPE_IDENTIFY):
+        return bytearray("eQ3Max", "utf-8") + \
+                bytearray("*\0", "utf-8") + \
+                bytearray(cube_serial or '*' * 10, 'utf-8') + \
+                bytearray(discovery_type, 'utf-8')
+
+    @staticmethod
+    def parse_response(response, discovery_type=DISCOVERY_TYPE_IDENTIFY):
+        if discovery_type == Discovery.DISCOVERY_TYPE_IDENTIFY:
+            return DiscoveryIdentifyResponse(response)
+        elif discovery_type == Discovery.DISCOVERY_TYPE_NETWORK_CONFIG:
+            return DiscoveryNetworkConfigurationResponse(response)
+
     def _create_receive_socket(self):
         recv_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # other clients may use the discovery port, too
+        recv_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         recv_socket.settimeout(10)
         recv_socket.bind(("0.0.0.0", 23272))
         return recv_socket
 
+    def _create_sweep_socket(self):
+        sweep_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sweep_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # cubes answer on the discovery port
+        sweep_socket.bind(("0.0.0.0", 23272))
+        return sweep_socket
+
     def _create_send_socket(self):
         send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         send_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, True)
@@ -62,11 +272,104 @@ class Discovery(Debugger):
         return send_socket
 
 
+class DiscoveryCache(object):
+    """Stores the network configuration of discovered cubes by serial in a JSON file, so a cube can be connected
+    to without a discovery. Entries older than `ttl` seconds are ignored.
+
+    The file is `pymax/discovery.json` in $XDG_CACHE_HOME (~/.cache) unless `path` is given. It is read on every
+    lookup and replaced atomically on every change, so it can be shared by several processes. A missing or
+    unreadable file is treated as an empty cache.
+    """
+
+    def __init__(self, path=None, ttl=24 * 3600, discovery=None):
+        self.path = path or self.default_path()
+        self.ttl = ttl
+        self.discovery = discovery or Discovery()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_path():
+        cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_dir, 'pymax', 'discovery.json')
+
+    def get(self, serial):
+        """Returns the cached DiscoveryNetworkConfigurationResponse of the cube `serial` or None if it is not
+        cached or expired."""
+        with self._lock:
+            entry = self._load().get(serial)
+        return self._response(entry) if entry else None
+
+    def responses(self):
+        """Returns the cached DiscoveryNetworkConfigurationResponse of all cubes that are not expired."""
+        with self._lock:
+            entries = self._load()
+        return [response for response in (self._response(entries[serial]) for serial in sorted(entries)) if response]
+
+    def put(self, response):
+        with self._lock:
+            entries = self._load()
+            entries[response.serial] = {
+                'response': binascii.hexlify(bytes(response.raw_response)).decode('ascii'),
+                'timestamp': time.time(),
+            }
+            self._save(entries)
+
+    def invalidate(self, serial):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(serial, None) is not None:
+                self._save(entries)
+
+    def resolve(self, serial, refresh=False):
+        """Returns the network configuration of the cube `serial`, from the cache or, if it is not cached, expired
+        or `refresh` is true, by discovering the cube. A discovered cube is added to the cache."""
+        response = None if refresh else self.get(serial)
+        if response is None:
+            logger.debug("Cube %s not in the discovery cache, discovering it", serial)
+            response = self.discovery.discover(cube_serial=serial, discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+            self.put(response)
+        return response
+
+    def _response(self, entry):
+        try:
+            if self.ttl is not None and time.time() - entry['timestamp'] > self.ttl:
+                return None
+            return DiscoveryNetworkConfigurationResponse(bytearray(binascii.unhexlify(entry['response'])))
+        except (KeyError, TypeError, ValueError, binascii.Error) as ex:
+            logger.debug("Ignoring invalid discovery cache entry %s: %s", entry, ex)
+            return None
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (IOError, OSError):
+            return {}
+        except ValueError as ex:
+            logger.warning("Ignoring corrupt discovery cache %s: %s", self.path, ex)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self, entries):
+        tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+        try:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            # os.rename does not replace an existing file on windows, os.replace is python 3.3+
+            getattr(os, 'replace', os.rename)(tmp_path, self.path)
+        except (IOError, OSError) as ex:
+            logger.warning("Cannot write discovery cache %s: %s", self.path, ex)
+
+
 class CubeConnectionException(Exception):
     pass
 
 
-class Cube(object):
+class BaseCube(object):
+    """Transport independent part of a cube client: keeps track of the received responses and the devices."""
 
     def __init__(self, *args, **kwargs):
         addr = None
@@ -84,18 +387,119 @@ class Cube(object):
             addr, port = args
 
         self.addr_port = addr, port
-        self._socket = None
+        # a cube with a serial can be found by a discovery if its address is not known or has changed
+        self.serial = kwargs.get('serial')
+        if 'discovery_cache' in kwargs:
+            self.discovery_cache = kwargs['discovery_cache']
+        else:
+            self.discovery_cache = DiscoveryCache() if self.serial else None
+        self.response_cache = kwargs.get('response_cache')
+        self._parser = ResponseParser(self.response_cache)
         self._devices = DeviceList()
         self._cube_info = None
         self._ntp_servers = None
+        self._rooms = []
+        self._rooms_source = None
+        self._m_data = None
         self.received_messages = {}
 
+    def _resolve_address(self, refresh=False):
+        """Sets the address to the one of the cube `serial`, from the discovery cache if there is one."""
+        if self.discovery_cache is not None:
+            response = self.discovery_cache.resolve(self.serial, refresh=refresh)
+        else:
+            response = Discovery().discover(cube_serial=self.serial, discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+        self.addr_port = response.ip_address, self.addr_port[1]
+
+    def parse_message(self, message_type, buffer):
+        if self.response_cache is not None:
+            response = self.response_cache.parse(message_type, buffer)
+        else:
+            response = parse_response(message_type, buffer)
+        if response:
+            self._received(response)
+        return response
+
+    def _received(self, response):
+        logger.info("Received message %s: %s", type(response).__name__, response)
+        self.received_messages[response.message_type] = response
+
+    def handle_message(self, msg):
+        logger.info("Handle message: %s", msg)
+        if isinstance(msg, HelloResponse):
+            self._cube_info = msg
+        elif isinstance(msg, FResponse):
+            self._ntp_servers = msg.ntp_servers
+        elif isinstance(msg, MResponse):
+            data = msg.data
+            if data == self._m_data:
+                # the same metadata again, the devices and rooms are up to date
+                return
+            self._m_data = data
+            self._rooms_source = None
+            for idx, device_type, rf_address, serial, name, room_id in msg.devices:
+                self.devices.update(rf_address=rf_address, serial=serial, name=name, room_id=room_id, device_type=device_type)
+        elif isinstance(msg, ConfigurationResponse):
+            device = self.devices.get(rf_address=msg.device_addr)
+            configuration = device.get('configuration') if device is not None else None
+            if configuration is not None and configuration.raw_response == msg.raw_response:
+                return
+            self.devices.update(rf_address=msg.device_addr, configuration=msg)
+        elif isinstance(msg, LResponse):
+            for singleResponse in msg.responses:
+                self.devices.update(rf_address=singleResponse.rf_addr, settings=singleResponse)
+
+    def get_message(self, message_type):
+        return self.received_messages.get(message_type, None)
+
+    @property
+    def info(self):
+        return self._cube_info
+
+    @property
+    def rooms(self):
+        """The rooms of the last M: response. The list is built once per M: response; the devices of the rooms
+        are the entries of `devices`, so they reflect the current configuration and settings."""
+        msg = self.get_message(M_RESPONSE)
+        if not msg:
+            return []
+
+        if self._rooms_source is not msg:
+            self._rooms = self._build_rooms(msg)
+            self._rooms_source = msg
+        return self._rooms
+
+    def _build_rooms(self, msg):
+        room_devices = collections.defaultdict(list)
+        for idx, device_type, rf_address, serial, name, room_id in msg.devices:
+            device = self.devices.get(rf_address=rf_address, serial=serial)
+            if device is None:
+                device = Device(rf_address=rf_address, serial=serial, name=name)
+            room_devices[room_id].append(device)
+
+        return [Room(*room_data, devices=room_devices[room_data[0]]) for room_data in msg.rooms]
+
+    @property
+    def devices(self):
+        return self._devices
+
+
+class Cube(BaseCube):
+
+    def __init__(self, *args, **kwargs):
+        super(Cube, self).__init__(*args, **kwargs)
+        self._socket = None
+
     @property
     def socket(self):
         if self._socket is None:
             raise CubeConnectionException("Not connected")
         return self._socket
 
+    @property
+    def connected(self):
+        return self._socket is not None
+
     def __enter__(self):
         self.connect()
         return self
@@ -107,9 +511,32 @@ class Cube(object):
         if self._socket:
             raise CubeConnectionException("Already connected")
 
+        if self.addr_port[0] is None and self.serial:
+            self._resolve_address()
+
         logger.info("Connecting to cube %s:%s", *self.addr_port)
-        self._socket = self._create_socket()
-        self.read()
+        try:
+            self._socket = self._create_socket()
+        except socket.error as ex:
+            if not self.serial:
+                raise
+            # the cube may have got another address since it was discovered
+            logger.info("Cannot connect to cube %s at %s:%s (%s), discovering it again", self.serial,
+                        self.addr_port[0], self.addr_port[1], ex)
+            addr_port = self.addr_port
+            try:
+                self._resolve_address(refresh=True)
+            except socket.error:
+                # don't try the stale address again on the next start
+                if self.discovery_cache is not None:
+                    self.discovery_cache.invalidate(self.serial)
+                raise
+            if self.addr_port == addr_port:
+                raise ex
+            logger.info("Connecting to cube %s:%s", *self.addr_port)
+            self._socket = self._create_socket()
+        self._parser = ResponseParser(self.response_cache)
+        self.read(until=CONNECT_RESPONSES)
 
     def _create_socket(self):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -120,113 +547,95 @@ class Cube(object):
     def disconnect(self):
         if self._socket:
             self.send_message(QuitMessage())
-            self._socket.close()
+        self._close()
+
+    def _close(self):
+        if self._socket:
+            try:
+                self._socket.close()
+            except socket.error as ex:
+                logger.debug("Error closing socket: %s", ex)
         self._socket = None
 
-    def read(self):
+    def read(self, until=None):
+        """Reads responses from the cube and processes them.
+
+        If `until` is None, the socket is read until it times out. Otherwise `until` is a sequence of response
+        types and reading stops as soon as a complete frame of each of these types has been received.
+
+        Returns the responses read.
+        """
         buffer_size = 4096
-        buffer = bytearray([])
+        pending = set(until) if until is not None else None
+        responses = []
         more = True
 
-        while more:
+        while more and (pending is None or pending):
             try:
                 logger.debug("socket.recv(%s)", buffer_size)
                 tmp = self.socket.recv(buffer_size)
                 logger.debug("Read %s bytes", len(tmp))
                 more = len(tmp) > 0
-                buffer += tmp
             except socket.timeout:
+                if pending:
+                    logger.warning("Timeout while waiting for %s response(s)", ', '.join(sorted(pending)))
                 break
 
-        messages = buffer.splitlines()
-        logger.debug("Processing %s messages", len(messages))
-
-        while len(messages):
-            current = messages[0]
-            message_type = chr(current[0])
+            if not more and pending:
+                self._close()
+                raise CubeConnectionException("Connection closed by cube while waiting for %s response(s)" %
+                                              ', '.join(sorted(pending)))
 
-            if message_type in MultiPartResponses:
-                multi_responses = [
-                    current[2:]
-                ]
+            for response in self._parser.feed(tmp):
+                self._received(response)
+                self.handle_message(response)
+                if pending:
+                    pending.discard(response.message_type)
+                responses.append(response)
 
-                while len(messages) > 1 and chr(messages[1][0]) == message_type:
-                    multi_responses.append(messages.pop(1)[2:])
-
-                logger.debug("'%s' message with %s parts", message_type, len(multi_responses))
-                response = self.parse_message(message_type, multi_responses)
-            else:
-                logger.debug("'%s' single-part message", message_type)
-                response = self.parse_message(message_type, current[2:])
-
-            self.handle_message(response)
-
-            messages.pop(0)
-            logger.debug("Remaining: %s messages" % len(messages))
-
-    def parse_message(self, message_type, buffer):
-        message_classes = {
-            HELLO_RESPONSE: HelloResponse,
-            M_RESPONSE: MResponse,
-            CONFIGURATION_RESPONSE: ConfigurationResponse,
-            L_RESPONSE: LResponse,
-            F_RESPONSE: FResponse,
-            SET_RESPONSE: SetResponse,
-        }
-
-        clazz = message_classes.get(message_type, None)
-
-        if clazz:
-            response = clazz(buffer)
-            logger.info("Received message %s: %s", type(response).__name__, response)
-            self.received_messages[message_type] = response
-            return response
-        else:
-            logger.warning("Cannot process message type %s", message_type)
-            return None
-
-    def handle_message(self, msg):
-        logger.info("Handle message: %s", msg)
-        if isinstance(msg, HelloResponse):
-            self._cube_info = msg
-        elif isinstance(msg, FResponse):
-            self._ntp_servers = msg.ntp_servers
-        elif isinstance(msg, MResponse):
-            for idx, device_type, rf_address, serial, name, room_id in msg.devices:
-                self.devices.update(rf_address=rf_address, serial=serial, name=name, room_id=room_id, device_type=device_type)
-        elif isinstance(msg, ConfigurationResponse):
-            self.devices.update(rf_address=msg.device_addr, configuration=msg)
-        elif isinstance(msg, LResponse):
-            for singleResponse in msg.responses:
-                self.devices.update(rf_address=singleResponse.rf_addr, settings=singleResponse)
+        return responses
 
     def send_message(self, msg):
         message_bytes = msg.to_bytes()
         logger.info("Sending '%s' message (%s bytes)", msg.__class__.__name__, len(message_bytes))
         self.socket.send(message_bytes)
-        self.read()
-
-    def get_message(self, message_type):
-        return self.received_messages.get(message_type, None)
-
-    @property
-    def info(self):
-        return self._cube_info
-
-    @property
-    def rooms(self):
-        msg = self.get_message(M_RESPONSE)
-        if msg:
-            return [
-                Room(*room_data, devices=[
-                    Device(rf_address=device_data[2], serial=device_data[3], name=device_data[4]) for device_data in filter(lambda x: x[5] == room_data[0], msg.devices)
-                ]) for room_data in msg.rooms
-            ]
-        return []
+        return self.read(until=msg.response_types)
+
+    def send_messages(self, messages):
+        """Sends many SetMessages with a single write.
+
+        Returns the SetResponse for each message, in the order of `messages`. If the cube does not answer all of
+        them in time, the missing responses are None.
+        """
+        messages = list(messages)
+        responses = []
+        self._send_batch(messages, responses)
+        return responses + [None] * (len(messages) - len(responses))
+
+    def _send_batch(self, messages, responses):
+        """Sends `messages` and appends their SetResponses to `responses`, so the caller knows which messages were
+        answered if the connection breaks while reading."""
+        message_bytes = batch_to_bytes(messages)
+
+        logger.info("Sending %s messages (%s bytes)", len(messages), len(message_bytes))
+        self.socket.sendall(message_bytes)
+
+        received = []
+        while len(received) < len(messages):
+            new = [r for r in self.read(until=(SET_RESPONSE, )) if r.message_type == SET_RESPONSE]
+            if not new:
+                logger.warning("Received %s of %s responses", len(received), len(messages))
+                break
+            received.extend(new)
+            responses.extend(new)
 
-    @property
-    def devices(self):
-        return self._devices
+        surplus = len(received) - len(messages)
+        if surplus > 0:
+            # the first responses belong to an earlier request that was not answered in time
+            logger.warning("Received %s responses for %s messages, ignoring the first %s", len(received),
+                           len(messages), surplus)
+            start = len(responses) - len(received)
+            del responses[start:start + surplus]
 
     def get_ntp_servers(self):
         if self._ntp_servers is None:
@@ -267,4 +676,117 @@ class Cube(object):
 
     def set_valve_config(self, room, rf_addr, boost_duration, boost_valve_position, decalc_day, decalc_hour, max_valve_setting):
         self.send_message(SetValveConfigMessage(rf_addr, room, boost_duration, boost_valve_position, decalc_day, decalc_hour, max_valve_setting))
-        return self.get_message(SET_RESPONSE)
\ No newline at end of file
+        return self.get_message(SET_RESPONSE)
+
+class PersistentCube(Cube):
+    """Cube with a long-lived connection.
+
+    The connection is checked every `keepalive_interval` seconds while idle by requesting the device list. If it
+    was dropped, it is re-established in the background; a request that fails because of a dropped connection is
+    sent again after reconnecting. The device list survives reconnects.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PersistentCube, self).__init__(*args, **kwargs)
+        self.keepalive_interval = kwargs.get('keepalive_interval', 30)
+        self.reconnect_delay = kwargs.get('reconnect_delay', 5)
+        self.reconnects = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._stop.set()
+        self._keepalive_thread = None
+        self._last_activity = 0
+
+    def connect(self):
+        with self._lock:
+            super(PersistentCube, self).connect()
+            self._last_activity = time.time()
+
+        self._stop.clear()
+        if self._keepalive_thread is None:
+            self._keepalive_thread = threading.Thread(target=self._keepalive, name="pymax keepalive %s:%s" % self.addr_port)
+            self._keepalive_thread.daemon = True
+            self._keepalive_thread.start()
+
+    def _create_socket(self):
+        s = super(PersistentCube, self)._create_socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return s
+
+    def disconnect(self):
+        self._stop.set()
+        if self._keepalive_thread is not None and self._keepalive_thread is not threading.current_thread():
+            self._keepalive_thread.join()
+        self._keepalive_thread = None
+
+        with self._lock:
+            try:
+                super(PersistentCube, self).disconnect()
+            except (socket.error, CubeConnectionException) as ex:
+                logger.debug("Connection already lost on disconnect: %s", ex)
+                self._close()
+
+    def send_message(self, msg):
+        if isinstance(msg, QuitMessage):
+            with self._lock:
+                return super(PersistentCube, self).send_message(msg)
+        return self._with_reconnect(super(PersistentCube, self).send_message, msg)
+
+    def send_messages(self, messages):
+        messages = list(messages)
+        responses = []
+
+        def send_unanswered():
+            # after a reconnect, only the messages the cube did not answer yet are sent again
+            unanswered = messages[len(responses):]
+            if unanswered:
+                self._send_batch(unanswered, responses)
+
+        self._with_reconnect(send_unanswered)
+        return responses + [None] * (len(messages) - len(responses))
+
+    def _with_reconnect(self, func, *args):
+        with self._lock:
+            if self._stop.is_set():
+                return func(*args)
+
+            try:
+                if not self.connected:
+                    self._reconnect()
+                result = func(*args)
+            except (socket.error, CubeConnectionException) as ex:
+                logger.warning("Connection to cube %s:%s lost (%s), reconnecting", self.addr_port[0], self.addr_port[1], ex)
+                self._reconnect()
+                result = func(*args)
+
+            self._last_activity = time.time()
+            return result
+
+    def _reconnect(self):
+        self._close()
+        super(PersistentCube, self).connect()
+        self._last_activity = time.time()
+        self.reconnects += 1
+        logger.info("Reconnected to cube %s:%s", *self.addr_port)
+
+    def _keepalive(self):
+        delay = self.keepalive_interval
+
+        while not self._stop.wait(delay):
+            delay = self.keepalive_interval
+            try:
+                with self._lock:
+                    if self._stop.is_set():
+                        break
+
+                    idle = time.time() - self._last_activity
+                    if not self.connected:
+                        self._reconnect()
+                    elif idle >= self.keepalive_interval:
+                        self.send_message(LMessage())
+                    else:
+                        delay = self.keepalive_interval - idle
+            except (socket.error, CubeConnectionException) as ex:
+                logger.warning("Cannot reach cube %s:%s: %s", self.addr_port[0], self.addr_port[1], ex)
+                self._close()
+                delay = self.reconnect_delay
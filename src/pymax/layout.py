@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Declarative description of the fixed size parts of the binary cube messages.
+
+A :class:`Layout` is a sequence of :class:`Field` objects. The struct formats of all fields are compiled into a
+single :class:`struct.Struct` once, so decoding a message is one ``unpack_from`` call plus the converters of the
+fields::
+
+    HEADER = Layout(
+        Field('length', 'B'),
+        Field('rf_address', '3B', RFAddr),
+        Field(None, 'x'),
+        Field('flags', 'B'),
+    )
+    HEADER.decode_into(response, data)
+"""
+import struct
+
+
+class Field(object):
+    """A named part of a layout.
+
+    `fmt` is a struct format without byte order (e.g. ``'B'``, ``'3B'``, ``'10s'``). Formats which unpack to more
+    than one value (``'3B'``) hand a tuple to `convert`. Fields with `name` None are skipped when decoding, use them
+    for padding and unknown bytes.
+    """
+
+    def __init__(self, name, fmt, convert=None):
+        self.name = name
+        self.fmt = fmt
+        self.convert = convert
+
+        s = struct.Struct('>' + fmt)
+        self.size = s.size
+        self.count = len(s.unpack(bytes(bytearray(s.size))))
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.name, self.fmt)
+
+
+class Layout(object):
+    """A compiled sequence of fields (big endian, no alignment).
+
+    ``unpack_from(buffer, offset=0)`` returns the converted values of the named fields found at `offset` in `buffer`.
+
+    ``decode_into(obj, buffer, offset=0)`` sets them as attributes of `obj` and returns the offset after the layout.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self._struct = struct.Struct('>' + ''.join(f.fmt for f in fields))
+        self.size = self._struct.size
+        self.names = tuple(f.name for f in fields if f.name is not None)
+
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Duplicate field names in %r" % (self.names, ))
+
+        # (position, count, convert) of the values of the named fields
+        self._values = []
+        pos = 0
+        for f in fields:
+            if f.name is not None and f.count > 0:
+                self._values.append((pos, f.count, f.convert))
+            pos += f.count
+
+        if all(f.count == 0 or (f.name is not None and f.count == 1 and f.convert is None) for f in fields):
+            # nothing to convert or skip, the unpacked values can be returned as they are
+            self.unpack_from = self._struct.unpack_from
+
+    def unpack_from(self, buffer, offset=0):
+        values = self._struct.unpack_from(buffer, offset)
+        result = []
+        for pos, count, convert in self._values:
+            value = values[pos] if count == 1 else values[pos:pos + count]
+            result.append(value if convert is None else convert(value))
+        return tuple(result)
+
+    def decode_into(self, obj, buffer, offset=0):
+        for name, value in zip(self.names, self.unpack_from(buffer, offset)):
+            setattr(obj, name, value)
+        return offset + self.size
+
+    def decode(self, buffer, offset=0):
+        """Returns a dict of the named fields found at `offset` in `buffer`."""
+        return dict(zip(self.names, self.unpack_from(buffer, offset)))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ', '.join(repr(f) for f in self.fields))
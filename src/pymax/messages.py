@@ -4,6 +4,7 @@ import struct
 import binascii
 
 from pymax.objects import ProgramSchedule, RFAddr
+from pymax.response import F_RESPONSE, L_RESPONSE, SET_RESPONSE
 from pymax.util import date_to_dateuntil, py_day_to_cube_day, pack_temp_and_time, Debugger, unpack_temp_and_time
 
 QUIT_MESSAGE = 'q'
@@ -14,6 +15,8 @@ L_MESSAGE = 'l'
 class BaseMessage(object):
 
     base64payload = False
+    # response types the cube sends back for this message; None if unknown
+    response_types = None
 
     def __init__(self, msg):
         self.msg = msg
@@ -36,12 +39,15 @@ class BaseMessage(object):
 
 
 class QuitMessage(BaseMessage):
+    response_types = ()
 
     def __init__(self):
         super(QuitMessage, self).__init__(QUIT_MESSAGE)
 
 
 class FMessage(BaseMessage):
+    response_types = F_RESPONSE,
+
     def __init__(self, ntp_servers=None):
         super(FMessage, self).__init__(F_MESSAGE)
         self.ntp_servers = ntp_servers
@@ -54,6 +60,8 @@ class FMessage(BaseMessage):
         return isinstance(other, FMessage) and self.ntp_servers == other.ntp_servers
 
 class LMessage(BaseMessage):
+    response_types = L_RESPONSE,
+
     def __init__(self):
         super(LMessage, self).__init__(L_MESSAGE)
 
@@ -66,6 +74,7 @@ class LMessage(BaseMessage):
 
 class SetMessage(BaseMessage):
     base64payload = True
+    response_types = SET_RESPONSE,
 
     TemperatureAndMode = 0x440000000
     Program = 0x410000000
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 import collections
 import datetime
+import re
 
-import binascii
+import weakref
+
+_HEX_RF_ADDRESS = re.compile(r'^[0-9a-fA-F]{6}$')
 
 
 class ProgramSchedule(object):
+    __slots__ = ('temperature', 'begin_minutes', 'end_minutes')
 
     def __init__(self, temperature, begin, end):
         self.temperature = temperature
@@ -23,6 +27,10 @@ class ProgramSchedule(object):
         return isinstance(other, ProgramSchedule) and self.temperature == other.temperature and \
             self.begin_minutes == other.begin_minutes and self.end_minutes == other.end_minutes
 
+    def __reduce__(self):
+        # python 2 cannot pickle classes with __slots__ by default
+        return self.__class__, (self.temperature, self.begin_minutes, self.end_minutes)
+
     def __repr__(self):
         return "%s(temperature=%s, start=%s, end=%s)" % (
             self.__class__.__name__, self.temperature, self.begin_minutes, self.end_minutes
@@ -30,62 +38,293 @@ class ProgramSchedule(object):
 
 
 class RFAddr(object):
+    """Immutable 24 bit RF address.
+
+    Instances are interned: creating an RFAddr for an address that is already in use returns the existing
+    instance. RFAddrs compare equal to their hex string (case insensitive) and their bytearray. They hash like
+    their lower case hex string (`str(addr)`), so they can be looked up in dicts by it.
+    """
+
+    __slots__ = ('_value', '_str', '_bytes_value', '__weakref__')
+
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, byte_tuple_string):
+        value = cls._parse(byte_tuple_string)
+
+        instance = cls._instances.get(value)
+        if instance is None:
+            instance = super(RFAddr, cls).__new__(cls)
+            object.__setattr__(instance, '_value', value)
+            object.__setattr__(instance, '_str', "%06x" % value)
+            object.__setattr__(instance, '_bytes_value', bytes(bytearray([value >> 16, (value >> 8) & 0xff, value & 0xff])))
+            cls._instances[value] = instance
+        return instance
 
-    def __init__(self, byte_tuple_string):
-        if byte_tuple_string is None or not byte_tuple_string:
+    @classmethod
+    def from_int(cls, value):
+        """Returns the RFAddr for `value`, which must be an int between 0 and 0xffffff. Faster than the
+        constructor, for decoders."""
+        instance = cls._instances.get(value)
+        if instance is None:
+            instance = cls(value)
+        return instance
+
+    @staticmethod
+    def _parse(byte_tuple_string):
+        if isinstance(byte_tuple_string, RFAddr):
+            return byte_tuple_string._value
+
+        if byte_tuple_string is None or isinstance(byte_tuple_string, bool):
+            raise ValueError
+
+        if isinstance(byte_tuple_string, int):
+            if not 0 <= byte_tuple_string <= 0xffffff:
+                raise ValueError("RF address must be between 0 and 0xffffff")
+            return byte_tuple_string
+
+        if not byte_tuple_string:
             raise ValueError
 
-        if isinstance(byte_tuple_string, bytearray):
+        if isinstance(byte_tuple_string, (bytearray, memoryview)) or \
+                (isinstance(byte_tuple_string, bytes) and not isinstance(byte_tuple_string, str)):
             if len(byte_tuple_string) != 3:
                 raise ValueError("Need exactly 3 bytes when passing a bytearray")
-            self._bytes = byte_tuple_string
-        elif isinstance(byte_tuple_string, tuple):
+            b = byte_tuple_string
+            if not isinstance(b[0], int):
+                # memoryview on python 2
+                b = bytearray(b)
+            return (b[0] << 16) | (b[1] << 8) | b[2]
+
+        if isinstance(byte_tuple_string, tuple):
             if len(byte_tuple_string) != 3:
                 raise ValueError("Need exactly 3 elements when passing a tuple")
-            self._bytes = bytearray(list(byte_tuple_string))
-        else:
-            if len(byte_tuple_string) != 6:
-                raise ValueError("Need a string of length 6 passing a string")
-            self._bytes = bytearray(binascii.unhexlify(byte_tuple_string))
+            a, b, c = byte_tuple_string
+            return (a << 16) | (b << 8) | c
+
+        if len(byte_tuple_string) != 6:
+            raise ValueError("Need a string of length 6 passing a string")
+        if not _HEX_RF_ADDRESS.match(byte_tuple_string):
+            raise ValueError("Not a hex RF address: %r" % (byte_tuple_string, ))
+        return int(byte_tuple_string, 16)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __reduce__(self):
+        return RFAddr, (self._value, )
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def _bytes(self):
+        return self._bytes_value
+
+    def __hash__(self):
+        return hash(self._str)
 
     def __eq__(self, other):
-        if isinstance(other, str) and len(other) == 6:
-            return self._bytes == bytearray([int(other[s:s + 2], 16) for s in range(0, 6, 2)])
-        elif isinstance(other, RFAddr):
-            return self._bytes == other._bytes
+        if isinstance(other, RFAddr):
+            return self._value == other._value
+        elif isinstance(other, str) and len(other) == 6:
+            return self._str == other.lower()
         elif isinstance(other, bytearray):
-            return self._bytes == other
+            return self._bytes_value == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __int__(self):
+        return self._value
 
     def __repr__(self):
         return self.__str__()
 
     def __getitem__(self, item):
-        return self._bytes[item.start:item.stop:item.step]
+        return bytearray(self._bytes_value)[item]
 
     def __str__(self):
-        return "{0:02x}{1:02x}{2:02x}".format(*self._bytes)
+        return self._str
+
+
+def _rf_address_key(value):
+    if isinstance(value, RFAddr):
+        return value
+    try:
+        return RFAddr(value)
+    except (ValueError, TypeError):
+        return value
 
 
 class DeviceList(list):
+    """List of devices with hash indexes on the fields devices are looked up by.
+
+    The indexes are kept up to date by all list operations and by `update()`. Devices changed directly (e.g.
+    `device['name'] = ...`) have to be updated through `update()` to be found by their new values. Devices with the
+    same value of an indexed field are found in the order of the list.
+    """
+
+    indexed_fields = {
+        'rf_address': _rf_address_key,
+        'serial': None,
+        'name': None,
+        'room_id': None,
+    }
 
     def __init__(self, iterable=None):
         super(DeviceList, self).__init__(iterable or [])
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._index = dict((field, {}) for field in self.indexed_fields)
+        for device in self:
+            self._add_to_index(device)
+
+    def _index_key(self, field, value):
+        key_func = self.indexed_fields[field]
+        return key_func(value) if key_func else value
+
+    def _add_to_index(self, device, fields=None):
+        for field in self.indexed_fields if fields is None else fields:
+            try:
+                self._index[field].setdefault(self._index_key(field, device.get(field, None)), []).append(device)
+            except TypeError:
+                # unhashable value, get() falls back to a full scan for it
+                pass
+
+    def _remove_from_index(self, device, fields=None):
+        for field in self.indexed_fields if fields is None else fields:
+            try:
+                key = self._index_key(field, device.get(field, None))
+                candidates = self._index[field].get(key, [])
+            except TypeError:
+                continue
+            for i, candidate in enumerate(candidates):
+                if candidate is device:
+                    del candidates[i]
+                    break
+            if not candidates:
+                self._index[field].pop(key, None)
+
+    def _candidates(self, kwargs):
+        """Returns the devices that can match `kwargs` or None if none of the kwargs is indexed."""
+        candidates = None
+        for field in self.indexed_fields:
+            if field not in kwargs:
+                continue
+            try:
+                devices = self._index[field].get(self._index_key(field, kwargs[field]), [])
+            except TypeError:
+                continue
+            if candidates is None or len(devices) < len(candidates):
+                candidates = devices
+        return candidates if candidates is None else self._in_list_order(candidates)
+
+    def _in_list_order(self, devices):
+        # the index lists follow the order of adding and updating, not the order of the list
+        if len(devices) < 2:
+            return devices
+        ids = set(id(device) for device in devices)
+        return [device for device in self if id(device) in ids]
+
+    def append(self, device):
+        super(DeviceList, self).append(device)
+        self._add_to_index(device)
+
+    def extend(self, iterable):
+        devices = list(iterable)
+        super(DeviceList, self).extend(devices)
+        for device in devices:
+            self._add_to_index(device)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def insert(self, index, device):
+        super(DeviceList, self).insert(index, device)
+        self._add_to_index(device)
+
+    def remove(self, device):
+        # the device that is removed may only be equal to `device`
+        del self[self.index(device)]
+
+    def pop(self, *args):
+        device = super(DeviceList, self).pop(*args)
+        self._remove_from_index(device)
+        return device
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super(DeviceList, self).__setitem__(index, value)
+            self._rebuild_index()
+            return
+
+        old = self[index]
+        super(DeviceList, self).__setitem__(index, value)
+        self._remove_from_index(old)
+        self._add_to_index(value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            super(DeviceList, self).__delitem__(index)
+            self._rebuild_index()
+            return
+
+        old = self[index]
+        super(DeviceList, self).__delitem__(index)
+        self._remove_from_index(old)
+
+    def __copy__(self):
+        return self.__class__(self)
+
+    def __reduce__(self):
+        # the indexes are rebuilt from the devices, also by deepcopy and pickle
+        return self.__class__, (list(self), )
+
+    def __setslice__(self, i, j, sequence): # pragma: no cover
+        # python 2 only
+        super(DeviceList, self).__setslice__(i, j, sequence)
+        self._rebuild_index()
+
+    def __delslice__(self, i, j): # pragma: no cover
+        # python 2 only
+        super(DeviceList, self).__delslice__(i, j)
+        self._rebuild_index()
+
+    def sort(self, *args, **kwargs):
+        super(DeviceList, self).sort(*args, **kwargs)
+        self._rebuild_index()
+
+    def reverse(self):
+        super(DeviceList, self).reverse()
+        self._rebuild_index()
+
+    def clear(self):
+        del self[:]
 
     def for_room(self, room_id):
-        return filter(lambda d: getattr(d, 'room_id', None) == room_id, self)
+        return list(self._in_list_order(self._index['room_id'].get(room_id, [])))
 
     def __contains__(self, item):
         if isinstance(item, str):
-            return len(list(filter(lambda d: d.name == item, self))) > 0
+            return item in self._index['name']
         elif isinstance(item, RFAddr) or isinstance(item, bytearray):
-            return len(list(filter(lambda d: d.rf_address == item, self))) > 0
+            return _rf_address_key(item) in self._index['rf_address']
         return False
 
     def get(self, **kwargs):
         if not kwargs:
             return None
 
-        for item in self:
+        candidates = self._candidates(kwargs)
+        for item in self if candidates is None else candidates:
             if all((item.get(k, None) == v for k, v in kwargs.items())):
                 return item
 
@@ -93,8 +332,11 @@ class DeviceList(list):
         instance = self.get(**dict(((k, v) for k, v in kwargs.items() if k in ('rf_address', 'serial', 'name'))))
 
         if instance:
+            changed = [k for k in self.indexed_fields if k in kwargs and instance.get(k, None) != kwargs[k]]
+            self._remove_from_index(instance, changed)
             for k, v in kwargs.items():
                 instance[k] = v
+            self._add_to_index(instance, changed)
         else:
             return self.append(Device(**kwargs))
 
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from pymax.messages import LMessage
+from pymax.protocol import find_response
+from pymax.response import L_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+# the SingleLResponse fields compared between polls
+SETTINGS_FIELDS = ('flags1', 'flags2', 'valve_position', 'temperature', 'actual_temperature', 'time_until')
+
+# changes of these fields mean someone is using the heating (mode, valve, setpoint), the measured temperature alone
+# drifts slowly
+ACTIVITY_FIELDS = ('flags2', 'valve_position', 'temperature')
+
+
+def settings_state(settings):
+    return tuple(getattr(settings, field, None) for field in SETTINGS_FIELDS)
+
+
+class Poller(object):
+    """Requests the device list (l:) from a cube in the background and calls the subscribers for the devices whose
+    settings changed since the previous poll.
+
+    Subscribers are called as `callback(device, changed)` with the Device from `cube.devices` (its `settings` are
+    the new SingleLResponse) and the names of the changed SETTINGS_FIELDS. On the first poll, every device is
+    reported with all its fields.
+
+    The interval adapts to the activity: after a poll in which a mode, valve position or setpoint changed, the
+    next poll follows after `min_interval` seconds; every poll without such changes multiplies the interval by
+    `backoff`, up to `max_interval` seconds. `wake()` polls right away, e.g. after sending a command.
+
+    The cube is used from the poller thread, so it should be a PersistentCube if other threads use it, too.
+    """
+
+    def __init__(self, cube, min_interval=5, max_interval=120, backoff=2):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Need 0 < min_interval <= max_interval")
+
+        self.cube = cube
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.polls = 0
+        self._woken = False
+        self._states = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = True
+        self._thread = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def poll(self):
+        """Requests the device list once, calls the subscribers and adapts the interval.
+
+        Returns a list of (device, changed) tuples.
+        """
+        response = find_response(self.cube.send_message(LMessage()), L_RESPONSE)
+        self.polls += 1
+        if response is None:
+            logger.warning("No device list received")
+            self._adapt(False)
+            return []
+
+        changes = []
+        active = False
+        for settings in response.responses:
+            state = settings_state(settings)
+            previous = self._states.get(settings.rf_addr)
+            if previous == state:
+                continue
+            self._states[settings.rf_addr] = state
+
+            if previous is None:
+                changed = tuple(field for field, value in zip(SETTINGS_FIELDS, state) if value is not None)
+            else:
+                changed = tuple(field for field, old, new in zip(SETTINGS_FIELDS, previous, state) if old != new)
+                active = active or any(field in ACTIVITY_FIELDS for field in changed)
+
+            device = self.cube.devices.get(rf_address=settings.rf_addr)
+            if device is not None:
+                changes.append((device, changed))
+
+        self._adapt(active)
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for device, changed in changes:
+            for callback in subscribers:
+                try:
+                    callback(device, changed)
+                except Exception:
+                    logger.exception("Error in poller subscriber")
+        return changes
+
+    def _adapt(self, active):
+        # the poll after a wake() is followed by another one at min_interval, to catch the effect of the command
+        woken, self._woken = self._woken, False
+        if active or woken:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        logger.debug("Next poll in %s seconds", self.interval)
+
+    def wake(self):
+        """Polls right away and then at `min_interval` again."""
+        self.interval = self.min_interval
+        self._woken = True
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name="pymax poller")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+        self._wakeup.set()
+
+        if thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.error("Polling the device list failed: %s", ex)
+                self._adapt(False)
+
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped:
+                return
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import collections
+import logging
+import threading
+
+try:
+    import queue
+except ImportError: # pragma: no cover
+    import Queue as queue
+
+from pymax.cube import Cube
+
+logger = logging.getLogger(__name__)
+
+CubeResult = collections.namedtuple('CubeResult', ('cube', 'result', 'error'))
+
+
+class CubePool(object):
+    """Runs operations on many cubes in parallel.
+
+    `cubes` is a list of addresses, (address, port) tuples or DiscoveryNetworkConfigurationResponse objects.
+    At most `concurrency` cubes are talked to at the same time. The connections are kept open until
+    `disconnect()` is called.
+    """
+
+    def __init__(self, cubes, concurrency=8, cube_class=Cube):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.concurrency = concurrency
+        self.cubes = [cube_class(*c) if isinstance(c, tuple) else cube_class(c) for c in cubes]
+        self._locks = [threading.Lock() for _ in self.cubes]
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def __len__(self):
+        return len(self.cubes)
+
+    def connect(self):
+        return self.map(lambda cube: cube.connect() if not cube.connected else None)
+
+    def disconnect(self):
+        return self.map(lambda cube: cube.disconnect())
+
+    def refresh(self):
+        """Requests the current state of all devices (l:) from every cube."""
+        return self.map(lambda cube: cube.get_device_list())
+
+    def call(self, method_name, *args, **kwargs):
+        """Calls the Cube method `method_name` with the same arguments on every cube."""
+        return self.map(lambda cube: getattr(cube, method_name)(*args, **kwargs))
+
+    def map(self, func):
+        """Calls `func(cube)` for every cube and returns a CubeResult for each of them, in the order of `cubes`.
+
+        Exceptions raised by `func` are not propagated but returned as the `error` of the CubeResult.
+        """
+        results = [None] * len(self.cubes)
+        tasks = queue.Queue()
+        for idx in range(len(self.cubes)):
+            tasks.put(idx)
+
+        def worker():
+            while True:
+                try:
+                    idx = tasks.get_nowait()
+                except queue.Empty:
+                    return
+
+                cube = self.cubes[idx]
+                with self._locks[idx]:
+                    try:
+                        results[idx] = CubeResult(cube, func(cube), None)
+                    except Exception as ex:
+                        logger.warning("Operation on cube %s:%s failed: %s", cube.addr_port[0], cube.addr_port[1], ex)
+                        results[idx] = CubeResult(cube, None, ex)
+
+        workers = [threading.Thread(target=worker) for _ in range(min(self.concurrency, len(self.cubes)))]
+        for t in workers:
+            t.daemon = True
+            t.start()
+        for t in workers:
+            t.join()
+
+        return results
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import collections
+import logging
+import threading
+
+from pymax.response import HELLO_RESPONSE, M_RESPONSE, CONFIGURATION_RESPONSE, L_RESPONSE, F_RESPONSE, SET_RESPONSE, \
+    MultiPartResponses, HelloResponse, MResponse, ConfigurationResponse, LResponse, FResponse, SetResponse
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CLASSES = {
+    HELLO_RESPONSE: HelloResponse,
+    M_RESPONSE: MResponse,
+    CONFIGURATION_RESPONSE: ConfigurationResponse,
+    L_RESPONSE: LResponse,
+    F_RESPONSE: FResponse,
+    SET_RESPONSE: SetResponse,
+}
+
+
+class ProtocolException(Exception):
+    pass
+
+
+def parse_response(message_type, buffer):
+    clazz = RESPONSE_CLASSES.get(message_type, None)
+
+    if clazz:
+        return clazz(buffer)
+
+    logger.warning("Cannot process message type %s", message_type)
+    return None
+
+
+def find_response(responses, message_type):
+    """Returns the last response of `message_type` in `responses` or None."""
+    found = None
+    for response in responses or []:
+        if response.message_type == message_type:
+            found = response
+    return found
+
+
+def _to_bytes(buffer):
+    if isinstance(buffer, memoryview):
+        return buffer.tobytes()
+    return bytes(buffer)
+
+
+class ResponseCache(object):
+    """Bounded LRU cache of parsed responses keyed by their raw bytes.
+
+    The cube sends the same C: and M: responses on every connect. With a cache, identical responses are parsed
+    once and the same response object is returned again. The cached responses are frozen (see
+    `BaseResponse.freeze()`), so they can be shared by several cubes and parsers.
+    """
+
+    def __init__(self, maxsize=256, message_types=(CONFIGURATION_RESPONSE, M_RESPONSE)):
+        self.maxsize = maxsize
+        self.message_types = frozenset(message_types)
+        self.hits = 0
+        self.misses = 0
+        self._responses = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._responses)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    @staticmethod
+    def key(message_type, buffer):
+        if isinstance(buffer, list):
+            # parts of a multi-part response
+            return message_type, tuple(_to_bytes(part) for part in buffer)
+        return message_type, _to_bytes(buffer)
+
+    def parse(self, message_type, buffer):
+        """Returns the cached response for `buffer` or parses it with `parse_response()`."""
+        if message_type not in self.message_types:
+            return parse_response(message_type, buffer)
+
+        key = self.key(message_type, buffer)
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None:
+                self.hits += 1
+                # most recently used
+                del self._responses[key]
+                self._responses[key] = response
+                return response
+            self.misses += 1
+
+        response = parse_response(message_type, buffer)
+        if response is not None:
+            response.freeze()
+            with self._lock:
+                self._responses[key] = response
+                while len(self._responses) > self.maxsize:
+                    self._responses.popitem(last=False)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self.hits = self.misses = 0
+
+
+class ResponseParser(object):
+    """Incremental parser for the line based protocol of the cube.
+
+    The parser does no I/O at all: bytes read from any transport are passed to `feed()` which returns the
+    responses completed by them. Incomplete lines and parts of multi-part responses are kept until the missing
+    data arrives. Lines that cannot be parsed are logged and skipped.
+    """
+
+    max_line_length = 64 * 1024
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._buffer = bytearray([])
+        self._parts = []
+
+    def _parse(self, message_type, payload):
+        if self.cache is not None:
+            return self.cache.parse(message_type, payload)
+        return parse_response(message_type, payload)
+
+    @property
+    def pending_bytes(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        responses = []
+
+        start = 0
+        eol = buffer.find(b'\r\n')
+        while eol >= 0:
+            if eol > start:
+                try:
+                    response = self._process_line(buffer, start, eol)
+                except Exception as ex:
+                    # a single broken line must not stop the parsing of the following ones
+                    logger.warning("Ignoring invalid line %r: %s", bytes(buffer[start:min(eol, start + 40)]), ex)
+                    response = None
+                if response is not None:
+                    responses.append(response)
+            start = eol + 2
+            eol = buffer.find(b'\r\n', start)
+
+        if start:
+            del buffer[:start]
+
+        if len(buffer) > self.max_line_length:
+            self._buffer = bytearray([])
+            raise ProtocolException("Line exceeds %s bytes without line terminator" % self.max_line_length)
+
+        return responses
+
+    def _process_line(self, buffer, start, end):
+        message_type = chr(buffer[start])
+        # the only copy of the line: responses may keep views of their payload, so they must not share the
+        # receive buffer which is resized later
+        payload = buffer[start + 2:end]
+
+        if message_type in MultiPartResponses:
+            return self._process_part(message_type, payload)
+
+        logger.debug("'%s' single-part message", message_type)
+        return self._parse(message_type, payload)
+
+    def _process_part(self, message_type, payload):
+        # multi-part responses start with "<part index>,<number of parts>,"
+        try:
+            idx, count = int(payload[0:2].decode('utf-8')), int(payload[3:5].decode('utf-8'))
+        except ValueError:
+            raise ProtocolException("Invalid '%s' multi-part header: %r" % (message_type, bytes(payload[:6])))
+
+        if idx == 0 and self._parts:
+            logger.warning("Discarding %s incomplete '%s' parts", len(self._parts), message_type)
+            self._parts = []
+
+        self._parts.append(payload)
+        if len(self._parts) < count:
+            return None
+
+        parts, self._parts = self._parts, []
+        logger.debug("'%s' message with %s parts", message_type, len(parts))
+        return self._parse(message_type, parts)
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
-import base64
 
 import struct
 
+from pymax.layout import Field, Layout
 from pymax.objects import ProgramSchedule, RFAddr
-from pymax.util import Debugger, unpack_temp_and_time
+from pymax.util import Debugger, a2b_base64, cached_property
 import datetime
 import logging
 
@@ -35,7 +35,156 @@ def device_type_name(device_type):
     return None
 
 
+def _decode_string(value):
+    return value.decode('utf-8')
+
+
+# discovery responses: name, serial, request id and request type, followed by the RF address (high byte, low word)
+# and firmware version or by the 5 addresses of the network configuration
+DISCOVERY_IDENTIFY = struct.Struct('>8s10sBBxBHBB')
+DISCOVERY_NETWORK_CONFIG = struct.Struct('>8s10sBB20B')
+
+# M: room (id, name length, name, group RF address) and device (type, RF address, serial, name length, name, room)
+M_ROOM_HEADER = struct.Struct('>bb')
+M_ROOM_RF_ADDRESS = struct.Struct('>BH')
+M_DEVICE_HEADER = struct.Struct('>BBH10sB')
+
+CONFIGURATION_LAYOUT = Layout(
+    Field('data_length', 'B'),
+    Field('device_addr', '3B', RFAddr),
+    Field('device_type', 'b'),
+    Field('room_id', 'b'),
+    Field('firmware_version', 'b'),
+    Field('test_result', 'b'),
+    Field('serial_number', '9s', _decode_string),
+)
+
+THERMOSTAT_CONFIG_LAYOUT = Layout(
+    Field('comfort_temperature_raw', 'B'),
+    Field('eco_temperature_raw', 'B'),
+    Field('max_set_point_temperature_raw', 'B'),
+    Field('min_set_point_temperature_raw', 'B'),
+    Field('temperature_offset_raw', 'B'),
+    Field('window_open_temperature_raw', 'B'),
+    Field('window_open_duration_raw', 'B'),
+    Field('boost_raw', 'B'),
+    Field('decalcification_raw', 'B'),
+    Field('max_valve_raw', 'B'),
+    Field('valve_offset_raw', 'B'),
+)
+
+WALL_THERMOSTAT_CONFIG_LAYOUT = Layout(
+    Field('comfort_temperature_raw', 'B'),
+    Field('eco_temperature_raw', 'B'),
+    Field('max_set_point_temperature_raw', 'B'),
+    Field('min_set_point_temperature_raw', 'B'),
+)
+
+# 7 days of 13 set points, see ConfigurationResponse._parse_thermostat_config
+WEEK_PROGRAM_DAY = struct.Struct('>13H')
+WEEK_PROGRAM_DAY_SIZE = WEEK_PROGRAM_DAY.size
+
+# L: submessages are decoded on every poll, so these layouts have no converters: unpack_from is the plain
+# struct method. The RF address is split into its high byte and low word.
+L_HEADER_FIELDS = (
+    Field('submessage_len', 'B'),
+    Field('rf_addr_high', 'B'),
+    Field('rf_addr_low', 'H'),
+    Field(None, 'x'),
+    Field('flags1', 'B'),
+    Field('flags2', 'B'),
+)
+
+L_HEADER_LAYOUT = Layout(*L_HEADER_FIELDS)
+
+L_SUBMESSAGE_LENGTH = struct.Struct('>B')
+
+# complete submessages
+L_HEATER_THERMOSTAT_LAYOUT = Layout(*L_HEADER_FIELDS + (
+    Field('valve_position', 'B'),
+    Field('temperature', 'B'),
+    Field('du1', 'B'),
+    Field('actual_temperature', 'B'),
+    Field('time_until', 'B'),
+))
+
+L_WALL_THERMOSTAT_LAYOUT = Layout(*L_HEADER_FIELDS + (
+    Field('valve_position', 'B'),
+    Field('temperature', 'B'),
+    Field('du1', 'B'),
+    Field('du2', 'B'),
+    Field('time_until', 'B'),
+    Field('actual_temperature', 'B'),
+))
+
+
+def _l_flags1(flags1):
+    # status_initialized, is_answer, is_error, is_valid
+    return bool(flags1 & 0x02), bool(not (flags1 & 0x03)), bool(flags1 & 0x04), bool(flags1 & 0x05)
+
+
+def _l_flags2(flags2):
+    # weekly, manual, vacation and boost program, dst_active, gateway_known, panel_locked, link_ok, battery_low
+    return (
+        not (flags2 & 0x01 or flags2 & 0x02),
+        bool(flags2 & 0x01 and not flags2 & 0x02),
+        bool(flags2 & 0x02 and not flags2 & 0x01),
+        bool(flags2 & 0x01 and flags2 & 0x02),
+        flags2 & 0x08,
+        bool(flags2 & 0x05),
+        bool(flags2 & 0x06),
+        bool(flags2 & 0x07),
+        bool(not (flags2 & 0x08)),
+    )
+
+# the decoded flags of SingleLResponse for every possible flag byte
+L_FLAGS1 = tuple(_l_flags1(flags1) for flags1 in range(256))
+L_FLAGS2 = tuple(_l_flags2(flags2) for flags2 in range(256))
+
+
+def _frozen_value(value):
+    if isinstance(value, list):
+        return tuple(_frozen_value(item) for item in value)
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, BaseResponse):
+        return value.freeze()
+    return value
+
+
+def _copy_response(cls, state):
+    response = cls.__new__(cls)
+    response.__setstate__(state)
+    return response
+
+
+class _ReadOnly(object):
+    """Base of the classes of frozen responses, see BaseResponse.freeze()."""
+    __slots__ = ()
+
+    _frozen = True
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+    def __reduce_ex__(self, protocol):
+        # copies and pickles are writable responses of the original class
+        return _copy_response, (self.__class__.__bases__[1], self.__getstate__())
+
+
+_read_only_classes = {}
+
+
 class BaseResponse(Debugger):
+    # subclasses without __slots__ of their own get a __dict__ as usual
+    __slots__ = ('raw_response', )
+
+    _frozen = False
+
+    message_type = None
     length = None
     min_length = None
     max_length = None
@@ -64,6 +213,38 @@ class BaseResponse(Debugger):
     def _parse(self):
         raise NotImplementedError
 
+    def __getstate__(self):
+        # the slots are not part of the __dict__, collect them for pickle and copy (python 2 needs this explicitly)
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in self.__class__.__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def freeze(self):
+        """Makes the response read-only, so it can be shared (see ResponseCache): setting or deleting attributes
+        raises AttributeError, lists become tuples and bytearrays become bytes. Copies of a frozen response are
+        writable again. Returns the response.
+
+        The response gets a read-only subclass of its class, so responses which are not frozen don't pay for the
+        check when their attributes are set."""
+        if self._frozen:
+            return self
+        cls = self.__class__
+        for name, value in self.__getstate__().items():
+            object.__setattr__(self, name, _frozen_value(value))
+
+        read_only = _read_only_classes.get(cls)
+        if read_only is None:
+            read_only = _read_only_classes[cls] = type(cls.__name__, (_ReadOnly, cls), {'__slots__': ()})
+        self.__class__ = read_only
+        return self
+
     def bytes_to_int(self, barray):
         if barray is None or len(barray) == 0:
             return None
@@ -85,12 +266,14 @@ class DiscoveryIdentifyResponse(BaseResponse):
     length = 26
 
     def _parse(self):
-        self.name = self.data[0:8].decode('utf-8')
-        self.serial = self.data[8:18].decode('utf-8')
-        self.request_id = chr(self.data[18])
-        self.request_type = chr(self.data[19])
-        self.rf_address = RFAddr(self.data[21:24])
-        self.fw_version = ''.join("%02x" % x for x in self.data[24:26])
+        name, serial, request_id, request_type, rf_high, rf_low, fw_major, fw_minor = \
+            DISCOVERY_IDENTIFY.unpack_from(self.data)
+        self.name = name.decode('utf-8')
+        self.serial = serial.decode('utf-8')
+        self.request_id = chr(request_id)
+        self.request_type = chr(request_type)
+        self.rf_address = RFAddr.from_int((rf_high << 16) | rf_low)
+        self.fw_version = "%02x%02x" % (fw_major, fw_minor)
 
     def __str__(self):
         return "%s: RF addr: %s, FW version: %s" % (self.serial, self.rf_address, self.fw_version)
@@ -109,15 +292,13 @@ class DiscoveryNetworkConfigurationResponse(BaseResponse):
     length = 40
 
     def _parse(self):
-        self.name = self.data[0:8].decode('utf-8')
-        self.serial = self.data[8:18].decode('utf-8')
-        self.request_id = chr(self.data[18])
-        self.request_type = chr(self.data[19])
-        self.ip_address = '.'.join([str(x) for x in self.data[20:24]])
-        self.gateway = '.'.join([str(x) for x in self.data[24:28]])
-        self.netmask = '.'.join([str(x) for x in self.data[28:32]])
-        self.dns1 = '.'.join([str(x) for x in self.data[32:36]])
-        self.dns2 = '.'.join([str(x) for x in self.data[36:40]])
+        values = DISCOVERY_NETWORK_CONFIG.unpack_from(self.data)
+        self.name = values[0].decode('utf-8')
+        self.serial = values[1].decode('utf-8')
+        self.request_id = chr(values[2])
+        self.request_type = chr(values[3])
+        self.ip_address, self.gateway, self.netmask, self.dns1, self.dns2 = \
+            ["%d.%d.%d.%d" % values[pos:pos + 4] for pos in range(4, 24, 4)]
 
     def __str__(self):
         return "%s: IP: %s, Netmask: %s, Gateway: %s, DNS1: %s, DNS2: %s" % (self.serial, self.ip_address, self.netmask, self.gateway, self.dns1, self.dns2)
@@ -136,6 +317,7 @@ class DiscoveryNetworkConfigurationResponse(BaseResponse):
 
 
 class HelloResponse(BaseResponse):
+    message_type = HELLO_RESPONSE
     length = 66
 
     def _parse(self):
@@ -145,8 +327,8 @@ class HelloResponse(BaseResponse):
         self.fw_version = parts[2].decode('utf-8')
         # unknown = parts[3]
         self.http_connection_id = parts[4]
-        self.duty_cycle = parts[5]
-        self.free_mem_slots = parts[6]
+        self.duty_cycle = int(parts[5].decode('utf-8'), 16)
+        self.free_mem_slots = int(parts[6].decode('utf-8'), 16)
         date = parts[7]
         time = parts[8]
         self.state_cube_time = parts[9]
@@ -164,6 +346,7 @@ class HelloResponse(BaseResponse):
 
 
 class MResponse(MultiResponse):
+    message_type = M_RESPONSE
 
     @property
     def data(self):
@@ -171,16 +354,15 @@ class MResponse(MultiResponse):
 
         for part in self.raw_response:
             idx = int(part[0:2].decode('utf-8'))
-            chunks.append((idx, part[6:]))
+            chunks.append((idx, part))
 
         full_data = bytearray([])
-        for _, data in sorted(chunks):
-            full_data += data
+        for _, part in sorted(chunks, key=lambda chunk: chunk[0]):
+            full_data += memoryview(part)[6:]
         return full_data
 
     def _parse(self):
-        base64_data = self.data.decode('utf-8')
-        data = bytearray(base64.b64decode(base64_data))
+        data = a2b_base64(self.data)
 
         self.dump_bytes(data, "MResponse")
 
@@ -192,9 +374,10 @@ class MResponse(MultiResponse):
         for i in range(0, self.num_rooms):
             logger.debug("Parsing room %s of %s (from pos %s)", i + 1, self.num_rooms, pos)
 
-            room_id, name_length = struct.unpack('bb', data[pos:pos+2])
+            room_id, name_length = M_ROOM_HEADER.unpack_from(data, pos)
             room_name = data[pos + 2:pos + 2 + name_length].decode('utf-8')
-            group_rf_address = RFAddr(data[pos+name_length + 2 : pos+name_length + 2 + 3])
+            rf_high, rf_low = M_ROOM_RF_ADDRESS.unpack_from(data, pos + 2 + name_length)
+            group_rf_address = RFAddr.from_int((rf_high << 16) | rf_low)
             logger.debug("Room ID: %s, Room Name: %s, Group RF address: %s", room_id, room_name, group_rf_address)
             self.rooms.append((room_id, room_name, group_rf_address))
             # set pos to start of next section
@@ -206,10 +389,9 @@ class MResponse(MultiResponse):
         pos += 1
 
         for device_idx in range(0, self.num_devices):
-            device_type = data[pos]
-            device_rf_address = RFAddr(data[pos+1 : pos+1 + 3])
-            device_serial = data[pos+4:pos+14].decode('utf-8')
-            device_name_length = data[pos+14]
+            device_type, rf_high, rf_low, device_serial, device_name_length = M_DEVICE_HEADER.unpack_from(data, pos)
+            device_rf_address = RFAddr.from_int((rf_high << 16) | rf_low)
+            device_serial = device_serial.decode('utf-8')
             device_name = data[pos+15:pos+15+device_name_length].decode('utf-8')
             room_id = data[pos+15+device_name_length]
 
@@ -223,46 +405,65 @@ class MResponse(MultiResponse):
 
 
 class ConfigurationResponse(BaseResponse):
+    """Configuration of a device. Only the fixed size fields are decoded while parsing, the week program and the
+    portal URL are decoded on first access. The decoded configuration is kept in `config_data`."""
+    message_type = CONFIGURATION_RESPONSE
 
-    def _parse(self):
-        device = self.data[:6].decode('utf-8')
+    comfort_temperature = property(lambda x: x.comfort_temperature_raw / 2.0)
+    eco_temperature = property(lambda x: x.eco_temperature_raw / 2.0)
+    max_set_point_temperature = property(lambda x: x.max_set_point_temperature_raw / 2.0)
+    min_set_point_temperature = property(lambda x: x.min_set_point_temperature_raw / 2.0)
+    temperature_offset = property(lambda x: (x.temperature_offset_raw / 2.0) - 3.5)
+    window_open_temperature = property(lambda x: x.window_open_temperature_raw / 2.0)
+    window_open_duration = property(lambda x: x.window_open_duration_raw * 5.0)
+    boost_duration = property(lambda x: (x.boost_raw >> 5) * 5 if x.boost_raw >> 5 < 7 else 60)
+    boost_valve_setting = property(lambda x: int(x.boost_raw - (x.boost_raw >> 5 << 5)) * 5)
 
-        b64 = self.data[7:]
-        data = bytearray(base64.b64decode(b64))
-        #self.dump_bytes(data, "device config")
+    decalcification_day = property(lambda x: x.decalcification_raw >> 5)
+    decalcification_hour = property(lambda x: int(x.decalcification_raw - (x.decalcification_raw >> 5 << 5)))
 
-        data_length = data[0]
-        logger.debug("Data length for device config: %s", data_length)
+    max_valve_setting = property(lambda x: x.max_valve_raw * 100 / 255)
 
-        self.device_addr = RFAddr(data[1:4])
-        self.device_type, self.room_id, self.firmware_version, self.test_result = struct.unpack('bbbb', data[4:8])
-        self.serial_number = data[8:17].decode('utf-8')
+    def _parse(self):
+        # <rf address>,<base64 data>
+        data = self.config_data = a2b_base64(memoryview(self.data)[7:])
+        self._week_program_offset = self._portal_url_offset = None
+
+        CONFIGURATION_LAYOUT.decode_into(self, data)
+        logger.debug("Data length for device config: %s", self.data_length)
 
         logger.debug("Device config for %s: type: %s, room: %s, firmware: %s, test: %s, serial number: %s",
             self.device_addr, self.device_type, self.room_id, self.firmware_version, self.test_result, self.serial_number
         )
 
         if self.device_type == DeviceCube:
-            self._parse_cube_config(data[18:])
+            self._parse_cube_config(data, 18)
         elif self.device_type == DeviceRadiatorThermostat or self.device_type == DeviceRadiatorThermostatPlus:
-            self._parse_thermostat_config(data[18:])
+            self._parse_thermostat_config(data, 18)
         elif self.device_type == DeviceWallThermostat:
-            self._parse_wall_thermostat_config(data[18:])
+            self._parse_wall_thermostat_config(data, 18)
         else:
             logger.warning("Cannot parse device configuration for type %s (%s)", self.device_type, device_type_name(self.device_type))
 
-    def _parse_cube_config(self, config):
+    def _parse_cube_config(self, data, offset):
         # Position   Length   Information
         # ===================================================
         # 0012       1        Is Portal Enabled
         # 0013-0054  66       Unknown
         # 0055-????  ??       Portal URL
         # ????-00ed  ??       Unknown
-        self.portal_enabled = bool(config[11])
-        end_of_url = config.index(b'\0', 67)
-        self.portal_url = config[67:end_of_url].decode('utf-8')
-
-    def _parse_thermostat_config(self, config):
+        self.portal_enabled = bool(data[offset + 11])
+        self._portal_url_offset = offset + 67
+
+    @cached_property
+    def portal_url(self):
+        if self._portal_url_offset is None:
+            raise AttributeError("%s has no portal url" % device_type_name(self.device_type))
+        data = self.config_data
+        end_of_url = data.index(b'\0', self._portal_url_offset)
+        return data[self._portal_url_offset:end_of_url].decode('utf-8')
+
+    def _parse_thermostat_config(self, data, offset):
         # Pos  Len  Information
         # ================================================================
         # 12   1    Comfort Temperature       in degrees celsius * 2
@@ -295,33 +496,14 @@ class ConfigurationResponse(BaseResponse):
         #                                     9 LSB bits is until time
         #                                       (in minutes * 5)
 
-        self.comfort_temperature_raw, \
-        self.eco_temperature_raw,\
-        self.max_set_point_temperature_raw,\
-        self.min_set_point_temperature_raw,\
-        self.temperature_offset_raw, \
-        self.window_open_temperature_raw,\
-        self.window_open_duration_raw, \
-        self.boost_raw,\
-        self.decalcification_raw,\
-        self.max_valve_raw,\
-        self.valve_offset_raw = struct.unpack('BBBBBBBBBBB', config[:11])
-
-        ConfigurationResponse.comfort_temperature = property(lambda x: x.comfort_temperature_raw / 2.0)
-        ConfigurationResponse.eco_temperature = property(lambda x: x.eco_temperature_raw / 2.0)
-        ConfigurationResponse.max_set_point_temperature = property(lambda x: x.max_set_point_temperature_raw / 2.0)
-        ConfigurationResponse.min_set_point_temperature = property(lambda x: x.min_set_point_temperature_raw / 2.0)
-        ConfigurationResponse.temperature_offset = property(lambda x: (x.temperature_offset_raw / 2.0) - 3.5)
-        ConfigurationResponse.window_open_temperature = property(lambda x: x.window_open_temperature_raw / 2.0)
-        ConfigurationResponse.window_open_duration = property(lambda x: x.window_open_duration_raw * 5.0)
-        ConfigurationResponse.boost_duration = property(lambda x: (x.boost_raw >> 5) * 5 if x.boost_raw >> 5 < 7 else 60)
-        ConfigurationResponse.boost_valve_setting = property(lambda x: int(x.boost_raw - (x.boost_raw >> 5 << 5)) * 5)
-
-        ConfigurationResponse.decalcification_day = property(lambda x: x.decalcification_raw >> 5)
-        ConfigurationResponse.decalcification_hour = property(lambda x: int(x.decalcification_raw - (x.decalcification_raw >> 5 << 5)))
-
-        ConfigurationResponse.max_valve_setting = property(lambda x: x.max_valve_raw * 100 / 255)
+        offset = THERMOSTAT_CONFIG_LAYOUT.decode_into(self, data, offset)
 
+        if logger.isEnabledFor(logging.DEBUG):
+            self._log_thermostat_config()
+
+        self._week_program_offset = offset
+
+    def _log_thermostat_config(self):
         logger.debug("Comfort temperature:       %s°C (raw: %s)", self.comfort_temperature, self.comfort_temperature_raw)
         logger.debug("Eco temperature:           %s°C (raw: %s)", self.eco_temperature, self.eco_temperature_raw)
         logger.debug("Max set point temperature: %s°C (raw: %s)", self.max_set_point_temperature, self.max_set_point_temperature_raw)
@@ -332,22 +514,29 @@ class ConfigurationResponse(BaseResponse):
         logger.debug("Boost:                     %s minutes, %s %%", self.boost_duration, self.boost_valve_setting)
         logger.debug("Decalcification:           day %s, hour %s", self.decalcification_day, self.decalcification_hour)
         logger.debug("Max valve setting:         %s%% (raw: %s)", self.max_valve_setting, self.max_valve_raw)
-        self.week_program = self._parse_week_program(config[11:])
 
-    def _parse_week_program(self, buffer):
+    @cached_property
+    def week_program(self):
+        """Seven lists of ProgramSchedules, starting with Saturday."""
+        if self._week_program_offset is None:
+            raise AttributeError("%s has no week program" % device_type_name(self.device_type))
+        program = self._parse_week_program(self.config_data, self._week_program_offset)
+        if self._frozen:
+            return _frozen_value(program)
+        return program
+
+    def _parse_week_program(self, data, offset):
         program = []
 
         for day in range(0, 7):
             day_schedules = []
-            offset = day * 26
-
-            day_config = buffer[offset:offset+26]
 
             start = datetime.time()
 
-            for schedule_offset in range(0, 26, 2):
-                schedule_bytes = day_config[schedule_offset:schedule_offset+2]
-                temp, time = unpack_temp_and_time(schedule_bytes)
+            for set_point in WEEK_PROGRAM_DAY.unpack_from(data, offset + day * WEEK_PROGRAM_DAY_SIZE):
+                # see pymax.util.unpack_temp_and_time
+                temp = (set_point >> 9) / 2.0
+                time = (set_point & 0x1ff) * 5
 
                 schedule = ProgramSchedule(temp, start, time)
                 day_schedules.append(schedule)
@@ -361,7 +550,7 @@ class ConfigurationResponse(BaseResponse):
 
         return program
 
-    def _parse_wall_thermostat_config(self, buffer):
+    def _parse_wall_thermostat_config(self, data, offset):
         # Pos  Len  Information
         # ================================================================
         # 12   1    Comfort Temperature       in degrees celsius * 2
@@ -379,16 +568,8 @@ class ConfigurationResponse(BaseResponse):
         #                                     9 LSB bits is until time
         #                                       (in minutes * 5)
         # cc   3    Unknown
-        self.comfort_temperature_raw, \
-        self.eco_temperature_raw,\
-        self.max_set_point_temperature_raw,\
-        self.min_set_point_temperature_raw = struct.unpack('BBBB', buffer[:4])
-
-        ConfigurationResponse.comfort_temperature = property(lambda x: x.comfort_temperature_raw / 2.0)
-        ConfigurationResponse.eco_temperature = property(lambda x: x.eco_temperature_raw / 2.0)
-        ConfigurationResponse.max_set_point_temperature = property(lambda x: x.max_set_point_temperature_raw / 2.0)
-        ConfigurationResponse.min_set_point_temperature = property(lambda x: x.min_set_point_temperature_raw / 2.0)
-        self.week_program = self._parse_week_program(buffer[5:])
+        offset = WALL_THERMOSTAT_CONFIG_LAYOUT.decode_into(self, data, offset)
+        self._week_program_offset = offset
 
 
     def __str__(self):
@@ -401,98 +582,116 @@ class ConfigurationResponse(BaseResponse):
 
 
 class SingleLResponse(BaseResponse):
+    """State of a single device from an L: response.
+
+    There is one of these per device and poll, so instances use __slots__ and only the raw values are decoded.
+    The program and status flags are looked up in tables by the raw `flags1` and `flags2` bytes on access.
+    """
+    __slots__ = ('rf_addr', 'flags1', 'flags2', 'valve_position', 'temperature', 'actual_temperature', '_time_until')
+
+    weekly_program = property(lambda x: L_FLAGS2[x.flags2][0])
+    manual_program = property(lambda x: L_FLAGS2[x.flags2][1])
+    vacation_program = property(lambda x: L_FLAGS2[x.flags2][2])
+    boost_program = property(lambda x: L_FLAGS2[x.flags2][3])
+    dst_active = property(lambda x: L_FLAGS2[x.flags2][4])
+
+    gateway_known = property(lambda x: L_FLAGS2[x.flags2][5])
+    panel_locked = property(lambda x: L_FLAGS2[x.flags2][6])
+    link_ok = property(lambda x: L_FLAGS2[x.flags2][7])
+    battery_low = property(lambda x: L_FLAGS2[x.flags2][8])
+
+    status_initialized = property(lambda x: L_FLAGS1[x.flags1][0])
+    is_answer = property(lambda x: L_FLAGS1[x.flags1][1])
+    is_error = property(lambda x: L_FLAGS1[x.flags1][2])
+    is_valid = property(lambda x: L_FLAGS1[x.flags1][3])
+
+    @classmethod
+    def from_buffer(cls, data, offset, submessage_len):
+        """Decodes the submessage at `offset` in `data`, skipping the checks and debug output of the constructor. The
+        response keeps a copy of the submessage, not the whole buffer."""
+        response = cls.__new__(cls)
+        response.raw_response = data[offset:offset + submessage_len + 1]
+        response._decode(data, offset, submessage_len)
+        return response
+
     def _parse(self):
-        submessage_len, rf1, rf2, rf3, unknown, flags1, flags2 = struct.unpack('B3BBBB', self.data[:7])
-#        for row_num in range(0, len(self.data), 10):
-#            row_bytes = self.data[row_num:row_num+10]
-#            print("%s  %s" % (str(row_num).ljust(2), ' '.join(["%02x" % x for x in row_bytes])))
-#            print("     %s" % '  '.join([chr(x) if 32 < x < 128 else ' ' for x in row_bytes]))
-
-        self.rf_addr = RFAddr((rf1, rf2, rf3))
-
-        self.weekly_program = not (flags2 & 0x01 or flags2 & 0x02)
-        self.manual_program = bool(flags2 & 0x01 and not flags2 & 0x02)
-        self.vacation_program = bool(flags2 & 0x02 and not flags2 & 0x01)
-        self.boost_program = bool(flags2 & 0x01 and flags2 & 0x02)
-        self.dst_active = flags2 & 0x08
-
-        self.gateway_known = bool(flags2 & 0x05)
-        self.panel_locked = bool(flags2 & 0x06)
-        self.link_ok = bool(flags2 & 0x07)
-        self.battery_low = bool(not (flags2 & 0x08))
-
-        self.status_initialized = bool(flags1 & 0x02)
-        self.is_answer = bool(not (flags1 & 0x03))
-        self.is_error = bool(flags1 & 0x04)
-        self.is_valid = bool(flags1 & 0x05)
-
-        self.description = "%s: RF addr: %s, program: (weekly: %s, manual: %s, vacation: %s, boost_program: %s)" % (
+        self._decode(self.data, 0, L_SUBMESSAGE_LENGTH.unpack_from(self.data)[0])
+
+    def _decode(self, data, offset, submessage_len):
+        # differ the devices, windowshutter is special.
+        # state is coded in mode field:
+        # open = auto/weekly program (00)
+        # closed = vacation (10)
+        if submessage_len == 11:
+            _, rf_high, rf_low, self.flags1, self.flags2, self.valve_position, temperature, du1, actual_temperature, \
+                self._time_until = L_HEATER_THERMOSTAT_LAYOUT.unpack_from(data, offset)
+            self.temperature = temperature / 2.0
+            self.actual_temperature = (actual_temperature + ((du1 & 1) << 8)) / 10.0
+        elif submessage_len == 12:
+            _, rf_high, rf_low, self.flags1, self.flags2, self.valve_position, temperature, du1, du2, \
+                self._time_until, actual_temperature = L_WALL_THERMOSTAT_LAYOUT.unpack_from(data, offset)
+            # the highest bit of the temperature is the 9th bit of the actual temperature
+            self.temperature = (temperature & 127) / 2.0
+            self.actual_temperature = (actual_temperature + ((temperature & 128) << 1)) / 10.0
+        else:
+            _, rf_high, rf_low, self.flags1, self.flags2 = L_HEADER_LAYOUT.unpack_from(data, offset)
+
+        self.rf_addr = RFAddr.from_int((rf_high << 16) | rf_low)
+
+    @property
+    def time_until(self):
+        try:
+            return datetime.timedelta(minutes=self._time_until * 30)
+        except AttributeError:
+            raise AttributeError("%s has no time_until" % self.__class__.__name__)
+
+    @property
+    def description(self):
+        description = "%s: RF addr: %s, program: (weekly: %s, manual: %s, vacation: %s, boost_program: %s)" % (
             self.__class__.__name__,
             self.rf_addr, self.weekly_program, self.manual_program, self.vacation_program, self.boost_program
         )
 
-        self.description += ", gateway_known: %s, panel_locked: %s, link_ok: %s, battery_low: %s " % (
+        description += ", gateway_known: %s, panel_locked: %s, link_ok: %s, battery_low: %s " % (
             self.gateway_known, self.panel_locked, self.link_ok, self.battery_low
         )
 
-        self.description += ", status_initialized: %s, is_answer: %s, is_error: %s, is_valid: %s " % ( 
+        description += ", status_initialized: %s, is_answer: %s, is_error: %s, is_valid: %s " % (
             self.status_initialized, self.is_answer, self.is_error, self.is_valid
         )
 
-        # differ the devices, windowshutter is special.
-        # state is coded in mode field:
-        # open = auto/weekly program (00)
-        # closed = vacation (10)
-        if submessage_len == 12:
-            self._parse_wall_mounted_thermostat(self.data)
-        elif submessage_len == 11:
-            self._parse_heater_thermostat(self.data)
-
-    def _parse_heater_thermostat(self, data):
-        self.valve_position, self.temperature, du1, self.actual_temperature, time_until = struct.unpack('5B', data[7:12])
-        self.time_until = datetime.timedelta(minutes=time_until * 30)
-        self.temperature /= 2.0
-        self.actual_temperature += (du1 & 1) << 8
-        self.actual_temperature /= 10.0
-        self.description += ", time_until: %s, valve_position: %s, temperature: %s, actual_temperature: %s" % (
-            self.time_until, self.valve_position, self.temperature, self.actual_temperature
-        )
-
-    def _parse_wall_mounted_thermostat(self, data):
-        self.valve_position, self.temperature, du1, du2, time_until, self.actual_temperature = struct.unpack('6B', data[7:13])
-        self.time_until = datetime.timedelta(minutes=time_until * 30)
-        x = self.temperature	# the highest bit encodes the 9th bit of the actual temperature
-        x &= 128			        # so extract it and shift it up.
-        x = x << 1
-        self.temperature &= 127
-        self.temperature /= 2.0
-        self.actual_temperature += x
-        self.actual_temperature /= 10.0
-        self.description += ", time_until: %s, valve_position: %s, temperature: %s, actual_temperature: %s" % (
-            self.time_until, self.valve_position, self.temperature, self.actual_temperature
-        )
+        if hasattr(self, 'valve_position'):
+            description += ", time_until: %s, valve_position: %s, temperature: %s, actual_temperature: %s" % (
+                self.time_until, self.valve_position, self.temperature, self.actual_temperature
+            )
+        return description
 
     def __str__(self):
         return self.description
 
 
 class LResponse(BaseResponse):
-    def _parse(self):
-        data = bytearray(base64.b64decode(self.data))
-        self.responses = []
-        self.num_responses = 0
+    message_type = L_RESPONSE
 
-        while len(data) > 5:
-            self.num_responses += 1
-            submessage_len = struct.unpack('B', data[:1])[0]
-            self.responses.append(SingleLResponse(data[:submessage_len+1]))
-            del data[:submessage_len+1]
+    def _parse(self):
+        data = a2b_base64(self.data)
+        from_buffer = SingleLResponse.from_buffer
+        responses = self.responses = []
+        length = len(data)
+        pos = 0
+        while length - pos > 5:
+            submessage_len = data[pos]
+            responses.append(from_buffer(data, pos, submessage_len))
+            pos += submessage_len + 1
+        self.num_responses = len(responses)
 
     def __str__(self):
         return "LResponse: size %s" % (self.num_responses)
 
 
 class FResponse(BaseResponse):
+    message_type = F_RESPONSE
+
     def _parse(self):
         self.ntp_servers = self.data.decode('utf-8').split(',')
 
@@ -504,6 +703,7 @@ class FResponse(BaseResponse):
 
 
 class SetResponse(BaseResponse):
+    message_type = SET_RESPONSE
 
     def _parse(self):
         self.duty_cycle, self.command_result, self.free_mem_slots = self.data.decode('utf-8').split(',')
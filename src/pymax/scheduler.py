@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from pymax.protocol import find_response
+from pymax.response import SET_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class ScheduledCommand(object):
+    """A message waiting in a CommandScheduler. `wait()` blocks until the cube answered it. `error` holds the
+    exception if sending failed."""
+
+    def __init__(self, message, priority):
+        self.message = message
+        self.priority = priority
+        self.attempts = 0
+        self.response = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.response
+
+    def _complete(self, response, error=None):
+        self.response = response
+        self.error = error
+        self._done.set()
+
+    def __repr__(self):
+        return "%s(%s, priority=%s, attempts=%s)" % (self.__class__.__name__, self.message, self.priority, self.attempts)
+
+
+class CommandScheduler(object):
+    """Sends SetMessages to a cube without exceeding its radio duty cycle.
+
+    The cube reports the used part of its duty cycle budget (0-100%) and the number of free memory slots of its
+    send queue with every H: and S: response. The budget recovers over one hour. Before each command the scheduler
+    estimates the current duty cycle and waits until `command_cost` more fits below `max_duty_cycle`. When the free
+    memory slots drop to `min_free_mem_slots`, it waits `mem_slot_wait` seconds to let the cube drain its queue.
+
+    Commands with a lower priority value are sent first; commands the cube rejected are retried up to
+    `max_retries` times.
+    """
+
+    def __init__(self, cube, max_duty_cycle=90, command_cost=1.0, recovery_rate=100 / 3600.0, min_free_mem_slots=1,
+                 mem_slot_wait=5, max_retries=3, clock=time.time, sleep=time.sleep):
+        self.cube = cube
+        self.max_duty_cycle = max_duty_cycle
+        self.command_cost = command_cost
+        self.recovery_rate = recovery_rate
+        self.min_free_mem_slots = min_free_mem_slots
+        self.mem_slot_wait = mem_slot_wait
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+
+        self.duty_cycle = 0
+        self.free_mem_slots = None
+        self._reported_at = clock()
+
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = True
+
+        if getattr(cube, 'info', None) is not None:
+            self.update(cube.info)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def update(self, response):
+        """Takes the duty cycle and free memory slots from a HelloResponse or SetResponse."""
+        with self._condition:
+            self.duty_cycle = response.duty_cycle
+            self.free_mem_slots = response.free_mem_slots
+            self._reported_at = self._clock()
+            self._condition.notify_all()
+
+    def submit(self, message, priority=PRIORITY_BULK):
+        command = ScheduledCommand(message, priority)
+        with self._condition:
+            self._push(command, next(self._counter))
+            self._condition.notify_all()
+        return command
+
+    def _push(self, command, seq):
+        heapq.heappush(self._queue, (command.priority, seq, command))
+
+    def estimated_duty_cycle(self):
+        return max(0.0, self.duty_cycle - (self._clock() - self._reported_at) * self.recovery_rate)
+
+    def delay(self):
+        """Seconds to wait until the next command can be sent."""
+        now = self._clock()
+        delay = 0.0
+
+        if self.free_mem_slots is not None and self.free_mem_slots <= self.min_free_mem_slots:
+            delay = max(delay, self._reported_at + self.mem_slot_wait - now)
+
+        excess = self.estimated_duty_cycle() + self.command_cost - self.max_duty_cycle
+        if excess > 0:
+            delay = max(delay, excess / self.recovery_rate)
+
+        return delay
+
+    def eta(self, command):
+        """Expected number of seconds until `command` is sent, or None if it is not queued."""
+        with self._condition:
+            elapsed = self.delay()
+            duty_cycle = self.estimated_duty_cycle() - elapsed * self.recovery_rate
+
+            for _, _, queued in sorted(self._queue):
+                duty_cycle = max(0.0, duty_cycle)
+                excess = duty_cycle + self.command_cost - self.max_duty_cycle
+                if excess > 0:
+                    wait = excess / self.recovery_rate
+                    elapsed += wait
+                    duty_cycle -= wait * self.recovery_rate
+
+                if queued is command:
+                    return elapsed
+                duty_cycle += self.command_cost
+
+        return None
+
+    def _next(self):
+        """Returns the next command if it may be sent now, otherwise the number of seconds to wait."""
+        if not self._queue:
+            return None, None
+
+        delay = self.delay()
+        if delay > 0:
+            return None, delay
+
+        return heapq.heappop(self._queue), 0
+
+    def _send(self, entry):
+        priority, seq, command = entry
+        command.attempts += 1
+
+        response = find_response(self.cube.send_message(command.message), SET_RESPONSE)
+
+        if response is not None:
+            self.update(response)
+
+        if response is not None and response.command_success:
+            command._complete(response)
+        elif command.attempts <= self.max_retries:
+            logger.info("Command %s failed (duty cycle: %s%%), retrying", command.message, self.duty_cycle)
+            with self._condition:
+                # the cube has no budget left, whatever it reported
+                self.duty_cycle = max(self.duty_cycle, self.max_duty_cycle)
+                # keep the position in the queue
+                heapq.heappush(self._queue, entry)
+        else:
+            logger.warning("Giving up on %s after %s attempts", command.message, command.attempts)
+            command._complete(response)
+
+    def run_pending(self):
+        """Sends all queued commands, waiting whenever the duty cycle requires it.
+
+        If sending a command raises, the command is completed with the error and the exception is propagated; the
+        other commands stay queued.
+        """
+        while True:
+            with self._condition:
+                entry, delay = self._next()
+
+            if entry is not None:
+                try:
+                    self._send(entry)
+                except Exception as ex:
+                    entry[2]._complete(None, ex)
+                    raise
+            elif delay:
+                logger.debug("Waiting %.1f seconds for duty cycle budget", delay)
+                self._sleep(delay)
+            else:
+                return
+
+    def start(self):
+        """Sends queued commands from a background thread until `stop()` is called."""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="pymax scheduler")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                entry, delay = None, None
+                while not self._stopped:
+                    entry, delay = self._next()
+                    if entry is not None:
+                        break
+                    # woken up early by new (possibly more urgent) commands or fresh duty cycle reports
+                    self._condition.wait(delay)
+
+                if self._stopped:
+                    return
+
+            try:
+                self._send(entry)
+            except Exception as ex:
+                logger.error("Sending %s failed: %s", entry[2].message, ex)
+                entry[2]._complete(None, ex)
@@ -8,13 +8,22 @@ import struct
 
 import base64
 
+import binascii
+
+import socket
+
 logger = logging.getLogger(__name__)
 
 class Debugger(object): # pragma: nocover
+    __slots__ = ()
+
     def dump_bytes(self, barray, message=None, level=logging.DEBUG):
         if not logger.isEnabledFor(level):
             return
 
+        if isinstance(barray, memoryview):
+            barray = bytearray(barray)
+
         if isinstance(barray, bytearray):
             logger.log(level, "%s (%s bytes)", (message or 'Data'), len(barray))
             for row_num in range(0, len(barray), 10):
@@ -25,6 +34,31 @@ class Debugger(object): # pragma: nocover
             #logger.log(level, ', '.join(["0x%02X" % x for x in barray]))
 
 
+class cached_property(object):
+    """Like property, but the value is computed on first access only and then stored in the instance's __dict__."""
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.__name__] = self.func(instance)
+        return value
+
+
+def a2b_base64(data):
+    """Decodes base64 data from any buffer (bytes, bytearray, memoryview) without copying the input. Indexing the
+    result returns ints on all Python versions."""
+    decoded = binascii.a2b_base64(data)
+    if isinstance(decoded, str):
+        # Python 2
+        return bytearray(decoded)
+    return decoded
+
+
 # hex:  9d 0b
 #              +-++++--------------- day: 1 1101 -> 29
 #            | ||||
@@ -98,3 +132,27 @@ def py_day_to_cube_day(day):
     if d >= 7:
         return d - 7
     return d
+
+
+def network_hosts(network):
+    """Yields the host addresses of an IPv4 network in CIDR notation (e.g. '10.1.0.0/16'). The network and
+    broadcast addresses are left out, except for /31 and /32 networks."""
+    address, _, prefix = network.partition('/')
+    try:
+        prefix = int(prefix) if prefix else 32
+        start, = struct.unpack('>I', socket.inet_aton(address))
+    except (ValueError, socket.error):
+        raise ValueError("Invalid network: %s" % network)
+    if address.count('.') != 3 or not 0 <= prefix <= 32:
+        raise ValueError("Invalid network: %s" % network)
+
+    size = 1 << (32 - prefix)
+    start &= ~(size - 1) & 0xffffffff
+    end = start + size - 1
+    if prefix < 31:
+        start += 1
+        end -= 1
+
+    while start <= end:
+        yield socket.inet_ntoa(struct.pack('>I', start))
+        start += 1
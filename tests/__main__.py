@@ -5,11 +5,22 @@ try:
 except ImportError:
     import unittest
 
+import sys
+
 from response import *
 from messages import *
 from cube import *
 from util import *
 from objects import *
+from protocol import *
+from pool import *
+from scheduler import *
+from coalesce import *
+from poller import *
+from layout import *
+
+if sys.version_info >= (3, 5):
+    from aio import *
 
 import logging
 logging.basicConfig(
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from fakecube import FakeCubeState, DiscoveryResponder, discovery_response
+from pymax.aio import AsyncCube, AsyncDiscovery, DiscoveryListener
+from pymax.cube import CubeConnectionException, Discovery, DiscoveryCache
+from pymax.messages import SetTemperatureAndModeMessage
+from pymax.response import HELLO_RESPONSE, M_RESPONSE, L_RESPONSE, DiscoveryIdentifyResponse, \
+    DiscoveryNetworkConfigurationResponse
+from response import HelloResponseBytes, MResponseBytes, DiscoveryIdentifyResponseBytes, \
+    DiscoveryIdentifyRequestBytes
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class FakeCubeServer(object):
+
+    def __init__(self, close_on=None):
+        self.requests = []
+        self.server = None
+        self.close_on = close_on
+        self.handlers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()
+
+    async def handle(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        writer.write(bytearray(b'H:') + HelloResponseBytes + bytearray(b'\r\nM:') + MResponseBytes +
+                     bytearray(b'\r\nL:BhIrZfcSGWQ8AOsA\r\n'))
+        while True:
+            line = await reader.readline()
+            if not line or line.startswith(b'q:'):
+                break
+            self.requests.append(line)
+            if self.close_on and line.startswith(self.close_on):
+                break
+            if line.startswith(b's:'):
+                writer.write(b'S:00,0,31\r\n')
+            elif line.startswith(b'l:'):
+                writer.write(b'L:BhIrZfcSGWQ8AOsA\r\n')
+        writer.close()
+        await writer.wait_closed()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # the connections are closed by the clients
+        await asyncio.wait_for(asyncio.gather(*self.handlers), 5)
+
+
+class AsyncCubeTest(unittest.TestCase):
+
+    def test_connect_and_commands(self):
+        async def scenario():
+            server = FakeCubeServer()
+            address = await server.start()
+            try:
+                async with AsyncCube(*address) as cube:
+                    self.assertTrue(cube.connected)
+                    self.assertEqual(cube.info.serial, 'KEQ0523864')
+                    self.assertEqual(len(cube.devices), 1)
+                    for message_type in (HELLO_RESPONSE, M_RESPONSE, L_RESPONSE):
+                        self.assertIn(message_type, cube.received_messages)
+
+                    devices = await cube.get_device_list()
+                    self.assertEqual(devices[0].settings.rf_addr, '122b65')
+
+                    responses = await asyncio.gather(
+                        cube.set_mode_auto(1, '122b65'),
+                        cube.set_mode_manual(1, '122b65', 21),
+                    )
+                    self.assertTrue(all(r.command_success for r in responses))
+
+                    responses = await cube.send_messages([
+                        SetTemperatureAndModeMessage('122b65', 1, SetTemperatureAndModeMessage.ModeAuto),
+                        SetTemperatureAndModeMessage('122b66', 1, SetTemperatureAndModeMessage.ModeBoost),
+                    ])
+                    self.assertEqual(len(responses), 2)
+                    self.assertTrue(all(r.command_success for r in responses))
+                self.assertFalse(cube.connected)
+            finally:
+                await server.close()
+            return server.requests
+
+        requests = run(scenario())
+        self.assertEqual(len(requests), 5)
+        self.assertEqual(requests[0], b'l:\r\n')
+        self.assertEqual(requests[1],
+                         bytes(SetTemperatureAndModeMessage('122b65', 1, SetTemperatureAndModeMessage.ModeAuto).to_bytes()))
+
+    def test_not_connected(self):
+        cube = AsyncCube('127.0.0.1', 62910)
+        self.assertRaises(CubeConnectionException, run, cube.get_device_list())
+        run(cube.disconnect())
+
+    def test_connection_closed_by_cube(self):
+        async def scenario():
+            server = FakeCubeServer(close_on=b'l:')
+            address = await server.start()
+            try:
+                cube = AsyncCube(*address)
+                await cube.connect()
+                with self.assertRaises(CubeConnectionException):
+                    await cube.get_device_list()
+                self.assertFalse(cube.connected)
+                await cube.disconnect()
+            finally:
+                await server.close()
+
+        run(scenario())
+
+    def test_disconnect_error(self):
+        async def scenario():
+            server = FakeCubeServer()
+            address = await server.start()
+            try:
+                cube = AsyncCube(*address)
+                await cube.connect()
+                cube.send_message = mock.Mock(side_effect=ConnectionResetError("just a test"))
+                with self.assertRaises(ConnectionResetError):
+                    await cube.disconnect()
+                self.assertFalse(cube.connected)
+            finally:
+                await server.close()
+
+        run(scenario())
+
+
+def network_config(ip_address):
+    return DiscoveryNetworkConfigurationResponse(discovery_response(FakeCubeState(), Discovery.create_payload(
+        'KEQ0523864', Discovery.DISCOVERY_TYPE_NETWORK_CONFIG), ip_address))
+
+
+class AsyncCubeSerialTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = DiscoveryCache(os.path.join(self.tmp_dir, 'discovery.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _connect(self, discovered):
+        async def discover(self, cube_serial=None, discovery_type=None):
+            if isinstance(discovered, Exception):
+                raise discovered
+            return discovered
+
+        async def scenario():
+            server = FakeCubeServer()
+            address = await server.start()
+            try:
+                cube = AsyncCube(port=address[1], serial='KEQ0523864', discovery_cache=self.cache)
+                with mock.patch.object(AsyncDiscovery, 'discover', discover):
+                    await cube.connect()
+                try:
+                    return cube.addr_port, cube.info.serial
+                finally:
+                    await cube.disconnect()
+            finally:
+                await server.close()
+
+        return run(scenario())
+
+    def test_cached(self):
+        self.cache.put(network_config('127.0.0.1'))
+        self.assertEqual(self._connect(asyncio.TimeoutError())[0][0], '127.0.0.1')
+
+    def test_discovered(self):
+        addr_port, serial = self._connect(network_config('127.0.0.1'))
+        self.assertEqual(addr_port[0], '127.0.0.1')
+        self.assertEqual(serial, 'KEQ0523864')
+        self.assertEqual(self.cache.get('KEQ0523864').ip_address, '127.0.0.1')
+
+    def test_moved(self):
+        # nothing listens on 127.0.0.2
+        self.cache.put(network_config('127.0.0.2'))
+        self.assertEqual(self._connect(network_config('127.0.0.1'))[0][0], '127.0.0.1')
+        self.assertEqual(self.cache.get('KEQ0523864').ip_address, '127.0.0.1')
+
+    def test_gone(self):
+        self.cache.put(network_config('127.0.0.2'))
+        self.assertRaises(asyncio.TimeoutError, self._connect, asyncio.TimeoutError())
+        self.assertIsNone(self.cache.get('KEQ0523864'))
+
+
+class FakeTransport(object):
+
+    def __init__(self, protocol, answers):
+        self.protocol = protocol
+        self.answers = answers
+        self.sent = []
+        self.closed = False
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+        # the probe is received by ourselves, too
+        self.protocol.datagram_received(bytes(data), ('10.10.10.10', 23272))
+        for answer in self.answers:
+            self.protocol.datagram_received(bytes(answer), ('10.10.10.153', 23272))
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncDiscoveryTest(unittest.TestCase):
+
+    def _discovery(self, answers, timeout=10):
+        from pymax.aio import _DiscoveryProtocol
+        discovery = AsyncDiscovery(timeout=timeout)
+
+        async def create_endpoint():
+            protocol = _DiscoveryProtocol()
+            discovery.transport = FakeTransport(protocol, answers)
+            return discovery.transport, protocol
+
+        discovery._create_endpoint = create_endpoint
+        return discovery
+
+    def test_discover(self):
+        discovery = self._discovery([DiscoveryIdentifyResponseBytes])
+        response = run(discovery.discover())
+
+        self.assertEqual(response, DiscoveryIdentifyResponse(DiscoveryIdentifyResponseBytes))
+        self.assertEqual(discovery.transport.sent, [(DiscoveryIdentifyRequestBytes, ("255.255.255.255", 23272))])
+        self.assertTrue(discovery.transport.closed)
+
+    def test_discover_timeout(self):
+        discovery = self._discovery([], timeout=0.01)
+        self.assertRaises(asyncio.TimeoutError, run, discovery.discover(discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG))
+        self.assertTrue(discovery.transport.closed)
+
+
+class DiscoveryListenerTest(unittest.TestCase):
+
+    def _listener(self, **kwargs):
+        events = []
+        listener = DiscoveryListener(
+            on_appear=lambda cube: events.append(('appear', cube.serial, cube.ip_address)),
+            on_disappear=lambda cube: events.append(('disappear', cube.serial, cube.ip_address)),
+            on_address_change=lambda cube, old: events.append(('address_change', cube.serial, old, cube.ip_address)),
+            **kwargs
+        )
+        return listener, events
+
+    def test_registry(self):
+        listener, events = self._listener(interval=60)
+
+        listener.datagram_received(DiscoveryIdentifyRequestBytes, ('10.10.10.10', 23272))
+        self.assertEqual(listener.cubes, {})
+
+        listener.datagram_received(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))
+        listener.datagram_received(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))
+        cube = listener.cubes['KEQ0523864']
+        self.assertEqual(cube.rf_address, '097f2c')
+        self.assertEqual(cube.fw_version, '0113')
+        self.assertEqual(cube.ip_address, '10.10.10.153')
+        self.assertAlmostEqual(cube.last_seen, time.time(), delta=5)
+
+        listener.datagram_received(DiscoveryIdentifyResponseBytes, ('10.10.10.154', 23272))
+        self.assertEqual(listener.cubes['KEQ0523864'].ip_address, '10.10.10.154')
+
+        listener.expire()
+        self.assertEqual(len(listener.cubes), 1)
+        listener.expiry = -1
+        listener.expire()
+        self.assertEqual(listener.cubes, {})
+
+        self.assertEqual(events, [
+            ('appear', 'KEQ0523864', '10.10.10.153'),
+            ('address_change', 'KEQ0523864', '10.10.10.153', '10.10.10.154'),
+            ('disappear', 'KEQ0523864', '10.10.10.154'),
+        ])
+
+    def test_callback_errors(self):
+        def fail(cube):
+            raise Exception("just a test")
+
+        listener = DiscoveryListener(on_appear=fail)
+        listener.datagram_received(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))
+        self.assertIn('KEQ0523864', listener.cubes)
+
+    def test_coroutine_callback_errors(self):
+        async def fail(cube):
+            raise Exception("just a test")
+
+        async def scenario():
+            listener = DiscoveryListener(on_appear=fail)
+            with self.assertLogs('pymax.aio', 'ERROR') as logs:
+                listener.datagram_received(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))
+                self.assertEqual(len(listener._tasks), 1)
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+            self.assertEqual(listener._tasks, set())
+            self.assertIn("just a test", logs.output[0])
+
+        run(scenario())
+
+    def test_expiry_between_probes(self):
+        async def scenario(responder):
+            appeared = asyncio.Event()
+            disappeared = asyncio.Event()
+
+            listener = DiscoveryListener(interval=60, expiry=0.2, on_appear=lambda cube: appeared.set(),
+                                         on_disappear=lambda cube: disappeared.set(), address=responder.address)
+            listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            listen_socket.bind(('127.0.0.1', 0))
+            listener._create_socket = lambda: listen_socket
+
+            async with listener:
+                await asyncio.wait_for(appeared.wait(), 5)
+                responder.stop()
+                # long before the next probe
+                await asyncio.wait_for(disappeared.wait(), 5)
+                self.assertEqual(listener.cubes, {})
+
+        with DiscoveryResponder(FakeCubeState(), address='127.0.0.1', port=0, reply_port=None) as responder:
+            run(scenario(responder))
+
+    def test_listen(self):
+        async def scenario(responder):
+            appeared = asyncio.Event()
+            disappeared = asyncio.Event()
+
+            async def on_appear(cube):
+                appeared.set()
+
+            listener = DiscoveryListener(interval=0.05, expiry=0.2, on_appear=on_appear,
+                                         on_disappear=lambda cube: disappeared.set(), address=responder.address)
+            listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            listen_socket.bind(('127.0.0.1', 0))
+            listener._create_socket = lambda: listen_socket
+
+            async with listener:
+                await asyncio.wait_for(appeared.wait(), 5)
+                self.assertEqual(listener.cubes['KEQ0523864'].ip_address, '127.0.0.1')
+
+                responder.stop()
+                await asyncio.wait_for(disappeared.wait(), 5)
+                self.assertEqual(listener.cubes, {})
+            self.assertIsNone(listener.transport)
+
+        with DiscoveryResponder(FakeCubeState(), address='127.0.0.1', port=0, reply_port=None) as responder:
+            run(scenario(responder))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pymax.coalesce import CoalescingSender
+from pymax.messages import SetTemperatureAndModeMessage, SetProgramMessage, SetTemperaturesMessage
+from pymax.objects import RFAddr
+from pymax.response import SetResponse
+
+
+class RecordingCube(object):
+
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    def send_message(self, msg):
+        if self.fail:
+            raise IOError("connection lost")
+        self.sent.append(msg)
+        return [SetResponse(bytearray(("%02x,0,31" % len(self.sent)).encode('utf-8')))]
+
+
+def manual(rf_addr, temperature, room=1):
+    return SetTemperatureAndModeMessage(rf_addr, room, SetTemperatureAndModeMessage.ModeManual, temperature=temperature)
+
+
+class CoalescingSenderTest(unittest.TestCase):
+
+    def test_coalesce_same_device(self):
+        cube = RecordingCube()
+        sender = CoalescingSender(cube, window=60)
+
+        commands = [sender.submit(manual('122b65', t)) for t in (20, 20.5, 21)]
+        other = sender.submit(manual(RFAddr('122B66'), 18))
+        same_addr = sender.submit(manual(RFAddr('122B65'), 22))
+        self.assertFalse(any(c.done for c in commands))
+
+        sender.flush()
+
+        self.assertEqual(len(cube.sent), 2)
+        self.assertIn(manual('122b65', 22), cube.sent)
+        self.assertIn(manual('122b66', 18), cube.sent)
+        self.assertEqual(sender.sent, 2)
+        self.assertEqual(sender.coalesced, 3)
+
+        # everybody gets the response of the command that was actually sent
+        for c in commands:
+            self.assertIs(c.wait(), same_addr.response)
+            self.assertTrue(c.superseded)
+        self.assertFalse(same_addr.superseded)
+        self.assertFalse(other.superseded)
+        self.assertIsNot(other.response, same_addr.response)
+
+    def test_different_rooms_and_types(self):
+        cube = RecordingCube()
+        sender = CoalescingSender(cube, window=60)
+
+        sender.submit(manual('122b65', 20, room=1))
+        sender.submit(manual('122b65', 20, room=2))
+        sender.submit(SetTemperaturesMessage('122b65', 1, 21, 17, 4.5, 30.5, 0, 12, 15))
+        sender.flush()
+        self.assertEqual(len(cube.sent), 3)
+
+    def test_window(self):
+        cube = RecordingCube()
+        sender = CoalescingSender(cube, window=0.01)
+
+        first = sender.submit(manual('122b65', 20))
+        last = sender.submit(manual('122b65', 21))
+        self.assertTrue(last.wait(5).command_success)
+        self.assertTrue(first.done)
+        self.assertEqual(cube.sent, [manual('122b65', 21)])
+
+    def test_not_coalescable(self):
+        cube = RecordingCube()
+        sender = CoalescingSender(cube, window=60)
+
+        command = sender.submit(SetProgramMessage('122b65', 1, 0, []))
+        self.assertTrue(command.done)
+        self.assertTrue(command.response.command_success)
+        self.assertEqual(len(cube.sent), 1)
+
+    def test_error(self):
+        sender = CoalescingSender(RecordingCube(fail=True), window=60)
+        commands = [sender.submit(manual('122b65', 20)), sender.submit(manual('122b65', 21))]
+        sender.flush()
+
+        for c in commands:
+            self.assertIsNone(c.response)
+            self.assertIsInstance(c.error, IOError)
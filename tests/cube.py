@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
+import json
+import os
+import shutil
 import socket
+import tempfile
 import unittest
 import sys
 import datetime
+import time
 
+from fakecube import FakeCubeState, DiscoveryResponder
 from pymax.objects import DeviceList, RFAddr
 
 if sys.version_info.major == 2 or (sys.version_info.major == 3 and sys.version_info.minor <= 2):
@@ -13,13 +19,15 @@ else:
 
 from pymax.messages import SetTemperatureAndModeMessage, FMessage, SetProgramMessage, SetTemperaturesMessage, \
     SetValveConfigMessage
-from pymax.cube import Cube, Room, Device, CubeConnectionException, Discovery
+from pymax.cube import Cube, Room, Device, CubeConnectionException, Discovery, CONNECT_RESPONSES, PersistentCube, \
+    DiscoveryCache
+from pymax.protocol import ResponseCache
 from pymax.response import HELLO_RESPONSE, HelloResponse, M_RESPONSE, MResponse, SetResponse, CONFIGURATION_RESPONSE, \
     ConfigurationResponse, L_RESPONSE, LResponse, F_RESPONSE, FResponse, SET_RESPONSE, \
     DiscoveryNetworkConfigurationResponse, DiscoveryIdentifyResponse
 from response import HelloResponseBytes, MResponseBytes, CubeConfigurationBytes, DiscoveryNetworkConfigResponseBytes, \
     DiscoveryIdentifyResponseBytes, DiscoveryIdentifyRequestBytes, DiscoveryNetworkConfigRequestBytes, \
-    ThermostatConfigurationBytes
+    ThermostatConfigurationBytes, WallThermostatConfigurationBytes
 
 
 class StaticResponseSocket(object):
@@ -38,6 +46,53 @@ class StaticResponseSocket(object):
         return x
 
 
+class NoTimeoutResponseSocket(StaticResponseSocket):
+    # fails the test instead of timing out if a reader asks for more data than the cube sent
+    def recv(self, size):
+        if self.pos >= len(self.response):
+            raise AssertionError("recv() called after all responses were read")
+        return super(NoTimeoutResponseSocket, self).recv(size)
+
+
+class FakeCubeSocket(object):
+    # answers l: and s: requests like a cube, can be broken to simulate a dropped connection
+    def __init__(self):
+        self.incoming = bytearray(b'H:') + HelloResponseBytes + bytearray(b'\r\nM:') + MResponseBytes + \
+            bytearray(b'\r\nL:BhIrZfcSGWQ8AOsA\r\n')
+        self.sent = []
+        self.commands = 0
+        self.broken = False
+        self.closed = False
+
+    def send(self, data):
+        if self.broken:
+            raise socket.error("Broken pipe")
+        self.sent.append(bytes(data))
+        for line in bytes(data).split(b'\r\n'):
+            if line.startswith(b'l:'):
+                self.incoming += bytearray(b'L:BhIrZfcSGWQ8AOsA\r\n')
+            elif line.startswith(b's:'):
+                # the duty cycle goes up with every command
+                self.commands += 1
+                self.incoming += bytearray(('S:%02x,0,31\r\n' % self.commands).encode('utf-8'))
+
+    sendall = send
+
+    def recv(self, size):
+        if self.broken:
+            return bytearray()
+        if not self.incoming:
+            raise socket.timeout
+        data, self.incoming = self.incoming[:size], self.incoming[size:]
+        return data
+
+    def setsockopt(self, *args):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
 class DiscoveryTest(unittest.TestCase):
 
     def _create_fake_send_socket(self):
@@ -81,6 +136,285 @@ class DiscoveryTest(unittest.TestCase):
         self.assertTrue(send_socket.close.called)
         self.assertTrue(recv_socket.close.called)
 
+    def _with_serial(self, data, serial):
+        return data[:8] + bytearray(serial, 'utf-8') + data[18:]
+
+    def test_discover_all(self):
+        identify2 = self._with_serial(DiscoveryIdentifyResponseBytes, 'KEQ0000002')
+        network_config2 = self._with_serial(DiscoveryNetworkConfigResponseBytes, 'KEQ0000002')
+
+        send_socket = self._create_fake_send_socket()
+        recv_socket = self._create_fake_receive_socket(None)
+        recv_socket.recvfrom = Mock(side_effect=[
+            (DiscoveryIdentifyRequestBytes, ('10.10.10.1', 23272)),
+            (DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272)),
+            (DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272)),
+            (identify2, ('10.10.10.154', 23272)),
+            socket.timeout(),
+            (network_config2, ('10.10.10.154', 23272)),
+            (DiscoveryNetworkConfigResponseBytes, ('10.10.10.153', 23272)),
+        ])
+
+        d = Discovery()
+        d._create_send_socket = Mock(return_value=send_socket)
+        d._create_receive_socket = Mock(return_value=recv_socket)
+
+        cubes = d.discover_all(timeout=5)
+        self.assertEqual([c.serial for c in cubes], ['KEQ0523864', 'KEQ0000002'])
+        self.assertEqual(cubes[0].identify, DiscoveryIdentifyResponse(DiscoveryIdentifyResponseBytes))
+        self.assertEqual(cubes[0].network_config, DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes))
+        self.assertEqual(cubes[1].network_config, DiscoveryNetworkConfigurationResponse(network_config2))
+
+        self.assertEqual(send_socket.sendto.call_args_list[0][0], (DiscoveryIdentifyRequestBytes, ("255.255.255.255", 23272)))
+        # the network configuration is requested from each cube directly
+        self.assertEqual(send_socket.sendto.call_args_list[1][0], (DiscoveryNetworkConfigRequestBytes, ("10.10.10.153", 23272)))
+        self.assertEqual(send_socket.sendto.call_count, 3)
+
+        self.assertTrue(send_socket.close.called)
+        self.assertTrue(recv_socket.close.called)
+
+    def test_discover_all_max_cubes(self):
+        send_socket = self._create_fake_send_socket()
+        recv_socket = self._create_fake_receive_socket(None)
+        recv_socket.recvfrom = Mock(side_effect=[(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))])
+
+        d = Discovery()
+        d._create_send_socket = Mock(return_value=send_socket)
+        d._create_receive_socket = Mock(return_value=recv_socket)
+
+        cubes = d.discover_all(timeout=5, max_cubes=1, network_config=False)
+        self.assertEqual(cubes, [(u'KEQ0523864', DiscoveryIdentifyResponse(DiscoveryIdentifyResponseBytes), None)])
+        self.assertEqual(send_socket.sendto.call_count, 1)
+
+    def test_discover_all_timeout(self):
+        send_socket = self._create_fake_send_socket()
+        recv_socket = self._create_fake_receive_socket(None)
+        recv_socket.recvfrom = Mock(side_effect=[(DiscoveryIdentifyResponseBytes, ('10.10.10.153', 23272))] +
+                                    [socket.timeout()] * 2)
+
+        d = Discovery()
+        d._create_send_socket = Mock(return_value=send_socket)
+        d._create_receive_socket = Mock(return_value=recv_socket)
+
+        start = time.time()
+        cubes = d.discover_all(timeout=0.2)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(len(cubes), 1)
+        self.assertIsNone(cubes[0].network_config)
+
+    def _local_discovery(self, responder):
+        # instead of broadcasting on the discovery port, the requests go to the responder on an ephemeral port of
+        # the loopback interface and the answers come back to another one
+        recv_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        recv_socket.settimeout(5)
+        recv_socket.bind(('127.0.0.1', 0))
+        responder.reply_port = recv_socket.getsockname()[1]
+
+        send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        fake_send_socket = Mock(socket.socket)
+        fake_send_socket.sendto.side_effect = lambda payload, addr: send_socket.sendto(payload, responder.address)
+        fake_send_socket.close.side_effect = send_socket.close
+
+        d = Discovery()
+        d._create_send_socket = Mock(return_value=fake_send_socket)
+        d._create_receive_socket = Mock(return_value=recv_socket)
+        return d
+
+    def test_discover_fake_cube(self):
+        with DiscoveryResponder(FakeCubeState(), address='127.0.0.1', port=0) as responder:
+            identify = self._local_discovery(responder).discover()
+            network_config = self._local_discovery(responder).discover('KEQ0523864',
+                                                                       Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+            cubes = self._local_discovery(responder).discover_all(timeout=0.2)
+
+        self.assertEqual(identify.serial, 'KEQ0523864')
+        self.assertEqual(identify.rf_address, '10b199')
+        self.assertEqual(network_config.ip_address, '127.0.0.1')
+        self.assertEqual([c.serial for c in cubes], ['KEQ0523864'])
+        self.assertEqual(cubes[0].network_config.ip_address, '127.0.0.1')
+
+    def test_discover_own_broadcast(self):
+        send_socket = self._create_fake_send_socket()
+        recv_socket = self._create_fake_receive_socket(None)
+        recv_socket.recv.side_effect = [DiscoveryIdentifyRequestBytes, DiscoveryIdentifyResponseBytes]
+
+        d = Discovery()
+        d._create_send_socket = Mock(return_value=send_socket)
+        d._create_receive_socket = Mock(return_value=recv_socket)
+
+        self.assertEqual(d.discover(), DiscoveryIdentifyResponse(DiscoveryIdentifyResponseBytes))
+
+    def _sweep(self, networks, **kwargs):
+        # the sweep socket is not on the discovery port, answer to the port of the request
+        with DiscoveryResponder(FakeCubeState(), address='127.0.0.1', port=0, reply_port=None) as responder:
+            sweep_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sweep_socket.bind(('127.0.0.1', 0))
+
+            d = Discovery()
+            d._create_sweep_socket = Mock(return_value=sweep_socket)
+            return d.sweep(networks, port=responder.address[1], **kwargs)
+
+    def test_sweep(self):
+        cubes = self._sweep(['127.0.0.0/29', '127.0.0.1'], timeout=0.2)
+
+        self.assertEqual([c.serial for c in cubes], ['KEQ0523864'])
+        self.assertEqual(cubes[0].identify.rf_address, '10b199')
+        self.assertEqual(cubes[0].network_config.ip_address, '127.0.0.1')
+
+    def test_sweep_rate(self):
+        start = time.time()
+        cubes = self._sweep(['127.0.0.0/29'], timeout=5, rate=50, max_cubes=1, network_config=False)
+
+        self.assertEqual(len(cubes), 1)
+        self.assertIsNone(cubes[0].network_config)
+        # stops at the first cube, 127.0.0.1 is the first host
+        self.assertLess(time.time() - start, 1)
+
+    def test_sweep_invalid_network(self):
+        d = Discovery()
+        d._create_sweep_socket = Mock(return_value=Mock(socket.socket))
+        self.assertRaises(ValueError, d.sweep, ['10.10.10.0/33'])
+
+
+def moved_cube_response():
+    # the cube of DiscoveryNetworkConfigResponseBytes with the IP address 10.10.10.154
+    data = bytearray(DiscoveryNetworkConfigResponseBytes)
+    data[23] = 154
+    return DiscoveryNetworkConfigurationResponse(data)
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'pymax', 'discovery.json')
+        self.discovery = Mock(Discovery)
+        self.discovery.discover = Mock(return_value=DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _cache(self, ttl=3600):
+        return DiscoveryCache(self.path, ttl=ttl, discovery=self.discovery)
+
+    def _cube(self, cache, *args):
+        c = Cube(*args, serial='KEQ0523864', discovery_cache=cache)
+        c.connected_to = []
+
+        def create_socket():
+            c.connected_to.append(c.addr_port)
+            if c.addr_port[0] != '10.10.10.153':
+                raise socket.timeout("timed out")
+            return FakeCubeSocket()
+        c._create_socket = create_socket
+        return c
+
+    def test_default_path(self):
+        self.assertTrue(DiscoveryCache().path.endswith(os.path.join('pymax', 'discovery.json')))
+
+    def test_put_and_get(self):
+        cache = self._cache()
+        self.assertIsNone(cache.get('KEQ0523864'))
+        self.assertEqual(cache.responses(), [])
+
+        response = DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes)
+        cache.put(response)
+        self.assertEqual(cache.get('KEQ0523864'), response)
+        self.assertEqual(cache.responses(), [response])
+
+        # persisted for other instances
+        self.assertEqual(self._cache().get('KEQ0523864'), response)
+
+        cache.invalidate('KEQ0523864')
+        self.assertIsNone(self._cache().get('KEQ0523864'))
+
+    def test_ttl(self):
+        self._cache().put(DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes))
+        with open(self.path) as f:
+            entries = json.load(f)
+        entries['KEQ0523864']['timestamp'] -= 120
+        with open(self.path, 'w') as f:
+            json.dump(entries, f)
+
+        self.assertIsNotNone(self._cache(ttl=180).get('KEQ0523864'))
+        self.assertIsNone(self._cache(ttl=60).get('KEQ0523864'))
+        self.assertEqual(self._cache(ttl=60).responses(), [])
+
+    def test_corrupt_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"KEQ0523864": {"response": "abc')
+        cache = self._cache()
+        self.assertIsNone(cache.get('KEQ0523864'))
+
+        with open(self.path, 'w') as f:
+            json.dump({'KEQ0523864': {'response': 'abcd', 'timestamp': time.time()}}, f)
+        self.assertIsNone(cache.get('KEQ0523864'))
+        self.assertEqual(cache.responses(), [])
+
+        # overwritten by the next change
+        cache.put(DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes))
+        self.assertIsNotNone(cache.get('KEQ0523864'))
+
+    def test_resolve(self):
+        cache = self._cache()
+        self.assertEqual(cache.resolve('KEQ0523864').ip_address, '10.10.10.153')
+        self.discovery.discover.assert_called_once_with(cube_serial='KEQ0523864',
+                                                        discovery_type=Discovery.DISCOVERY_TYPE_NETWORK_CONFIG)
+
+        self.assertEqual(self._cache().resolve('KEQ0523864').ip_address, '10.10.10.153')
+        self.assertEqual(self.discovery.discover.call_count, 1)
+
+        self._cache().resolve('KEQ0523864', refresh=True)
+        self.assertEqual(self.discovery.discover.call_count, 2)
+
+    def test_cube_with_serial(self):
+        c = self._cube(self._cache())
+        self.assertEqual(c.addr_port, (None, 62910))
+        c.connect()
+        self.assertEqual(c.connected_to, [('10.10.10.153', 62910)])
+        self.assertEqual(self.discovery.discover.call_count, 1)
+
+        c = self._cube(self._cache())
+        c.connect()
+        self.assertEqual(c.connected_to, [('10.10.10.153', 62910)])
+        self.assertEqual(self.discovery.discover.call_count, 1)
+
+    def test_cube_rediscovered_on_connect_failure(self):
+        cache = self._cache()
+        cache.put(moved_cube_response())
+
+        c = self._cube(cache)
+        c.connect()
+        self.assertEqual(c.connected_to, [('10.10.10.154', 62910), ('10.10.10.153', 62910)])
+        self.assertEqual(cache.get('KEQ0523864').ip_address, '10.10.10.153')
+
+        c = self._cube(cache, moved_cube_response())
+        c.connect()
+        self.assertEqual(c.connected_to, [('10.10.10.154', 62910), ('10.10.10.153', 62910)])
+
+    def test_cube_gone_on_connect_failure(self):
+        cache = self._cache()
+        cache.put(moved_cube_response())
+        self.discovery.discover.side_effect = socket.timeout("timed out")
+
+        c = self._cube(cache)
+        self.assertRaises(socket.timeout, c.connect)
+        self.assertEqual(c.connected_to, [('10.10.10.154', 62910)])
+        self.assertIsNone(self._cache().get('KEQ0523864'))
+
+    def test_cube_not_moved(self):
+        self.discovery.discover.return_value = moved_cube_response()
+        c = self._cube(self._cache())
+        self.assertRaises(socket.timeout, c.connect)
+        self.assertEqual(c.connected_to, [('10.10.10.154', 62910)])
+
+    def test_cube_without_serial(self):
+        c = self._cube(self._cache(), '10.10.10.154')
+        c.serial = None
+        self.assertRaises(socket.timeout, c.connect)
+        self.assertFalse(self.discovery.discover.called)
+
 
 class ConnectionTest(unittest.TestCase):
 
@@ -131,6 +465,42 @@ class ConnectionTest(unittest.TestCase):
         c.read()
         self.assertEqual(len(c.received_messages), 2)
 
+    def test_read_until(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = NoTimeoutResponseSocket([
+            bytearray('H:', encoding='utf-8') + HelloResponseBytes,
+            bytearray('M:', encoding='utf-8') + MResponseBytes,
+            bytearray(b'L:BhIrZfcSGWQ8AOsA'),
+        ])
+        c.read(until=(HELLO_RESPONSE, L_RESPONSE))
+        self.assertEqual(sorted(c.received_messages.keys()), [HELLO_RESPONSE, L_RESPONSE, M_RESPONSE])
+
+    def test_read_until_keeps_partial_frame(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = NoTimeoutResponseSocket([bytearray(b'S:00,0,31')])
+        c._socket.response += bytearray(b'F:ntp.home')
+        c.read(until=(SET_RESPONSE, ))
+        self.assertEqual(list(c.received_messages.keys()), [SET_RESPONSE])
+        self.assertEqual(c._parser.pending_bytes, len(b'F:ntp.home'))
+
+        c._socket = NoTimeoutResponseSocket([bytearray(b'matic.com')])
+        c.read(until=(F_RESPONSE, ))
+        self.assertEqual(c.get_message(F_RESPONSE).ntp_servers, ['ntp.homematic.com'])
+
+    def test_read_until_nothing(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = NoTimeoutResponseSocket([])
+        c.read(until=())
+        self.assertEqual(len(c.received_messages), 0)
+
+    def test_send_message_reads_expected_response(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = NoTimeoutResponseSocket([bytearray(b'S:00,0,31')])
+        c._socket.send = Mock()
+        c.send_message(SetTemperatureAndModeMessage('122b65', 1, SetTemperatureAndModeMessage.ModeAuto))
+        self.assertTrue(c._socket.send.called)
+        self.assertTrue(c.get_message(SET_RESPONSE).command_success)
+
     def test_read_unknown_response(self):
         c = Cube('127.0.0.1', 62910)
         c._socket = StaticResponseSocket([
@@ -158,7 +528,162 @@ class ConnectionTest(unittest.TestCase):
         c.read = Mock()
         c._create_socket = Mock(return_value=Mock(socket.socket))
         c.connect()
-        self.assertTrue(c.read.called)
+        c.read.assert_called_with(until=CONNECT_RESPONSES)
+
+    def test_send_messages(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = FakeCubeSocket()
+        c._socket.incoming = bytearray()
+
+        messages = [SetProgramMessage('122b65', 1, weekday, []) for weekday in range(0, 7)]
+        responses = c.send_messages(messages)
+
+        self.assertEqual(len(c._socket.sent), 1)
+        self.assertEqual(c._socket.sent[0], b''.join(bytes(m.to_bytes()) for m in messages))
+        self.assertEqual(len(responses), 7)
+        self.assertTrue(all(isinstance(r, SetResponse) and r.command_success for r in responses))
+        self.assertEqual([r.duty_cycle for r in responses], list(range(1, 8)))
+
+    def test_send_messages_missing_responses(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = StaticResponseSocket([bytearray(b'S:00,0,31')])
+        c._socket.sendall = Mock()
+
+        responses = c.send_messages([SetProgramMessage('122b65', 1, 0, []), SetProgramMessage('122b65', 1, 1, [])])
+        self.assertIsInstance(responses[0], SetResponse)
+        self.assertIsNone(responses[1])
+
+    def test_send_messages_stale_response(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = StaticResponseSocket([bytearray(b'S:05,0,31'), bytearray(b'S:01,0,31'), bytearray(b'S:02,0,31')])
+        c._socket.sendall = Mock()
+
+        responses = c.send_messages([SetProgramMessage('122b65', 1, 0, []), SetProgramMessage('122b65', 1, 1, [])])
+        self.assertEqual([r.duty_cycle for r in responses], [1, 2])
+
+    def test_send_messages_only_set_messages(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = FakeCubeSocket()
+        self.assertRaises(ValueError, c.send_messages, [FMessage()])
+        self.assertEqual(c._socket.sent, [])
+
+    def test_connection_closed_while_reading(self):
+        c = Cube('127.0.0.1', 62910)
+        c._socket = FakeCubeSocket()
+        c._socket.broken = True
+        self.assertRaises(CubeConnectionException, c.read, until=(L_RESPONSE, ))
+        self.assertFalse(c.connected)
+
+
+class DroppingCubeSocket(FakeCubeSocket):
+    # answers the first `answered` s: requests, then the cube closes the connection
+    def __init__(self, answered):
+        super(DroppingCubeSocket, self).__init__()
+        self.incoming = bytearray()
+        self.answered = answered
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+        for line in bytes(data).split(b'\r\n'):
+            if line.startswith(b's:') and self.commands < self.answered:
+                self.commands += 1
+                self.incoming += bytearray(('S:%02x,0,31\r\n' % self.commands).encode('utf-8'))
+
+    sendall = send
+
+    def recv(self, size):
+        if not self.incoming:
+            return bytearray()
+        return super(DroppingCubeSocket, self).recv(size)
+
+
+class PersistentCubeTest(unittest.TestCase):
+
+    def _cube(self, **kwargs):
+        c = PersistentCube('127.0.0.1', 62910, **kwargs)
+        c.sockets = []
+
+        def create_socket():
+            c.sockets.append(FakeCubeSocket())
+            return c.sockets[-1]
+        c._create_socket = create_socket
+        return c
+
+    def test_reconnect_on_send(self):
+        c = self._cube()
+        c.connect()
+        try:
+            self.assertEqual(len(c.devices), 1)
+            devices = list(c.devices)
+
+            c.sockets[0].broken = True
+            response = c.set_mode_auto(1, '122b65')
+
+            self.assertTrue(response.command_success)
+            self.assertEqual(len(c.sockets), 2)
+            self.assertEqual(c.reconnects, 1)
+            self.assertTrue(c.sockets[0].closed)
+            self.assertTrue(c.sockets[1].sent[0].startswith(b's:'))
+            self.assertEqual(list(c.devices), devices)
+        finally:
+            c.disconnect()
+
+    def test_reconnect_on_send_messages(self):
+        c = self._cube()
+        c.connect()
+        try:
+            c.sockets[0] = dropping = DroppingCubeSocket(answered=2)
+            c._socket = dropping
+            messages = [SetProgramMessage('122b65', 1, weekday, []) for weekday in range(0, 5)]
+            responses = c.send_messages(messages)
+
+            self.assertEqual(len(responses), 5)
+            self.assertTrue(all(r.command_success for r in responses))
+            self.assertEqual(c.reconnects, 1)
+            # only the unanswered messages are sent again
+            self.assertEqual(c.sockets[1].sent, [b''.join(bytes(m.to_bytes()) for m in messages[2:])])
+        finally:
+            c.disconnect()
+
+    def test_keepalive(self):
+        c = self._cube(keepalive_interval=0.01)
+        c.connect()
+        try:
+            deadline = time.time() + 5
+            while not c.sockets[0].sent and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(c.sockets[0].sent[0], b'l:\r\n')
+        finally:
+            c.disconnect()
+
+    def test_background_reconnect(self):
+        c = self._cube(keepalive_interval=0.01, reconnect_delay=0.01)
+        c.connect()
+        try:
+            c.sockets[0].broken = True
+            deadline = time.time() + 5
+            while c.reconnects == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(c.reconnects, 1)
+            self.assertTrue(c.connected)
+        finally:
+            c.disconnect()
+
+    def test_no_reconnect_after_disconnect(self):
+        c = self._cube()
+        c.connect()
+        c.disconnect()
+        self.assertEqual(c.sockets[0].sent, [b'q:\r\n'])
+        self.assertRaises(CubeConnectionException, c.get_device_list)
+        self.assertEqual(len(c.sockets), 1)
+
+    def test_disconnect_broken_connection(self):
+        c = self._cube()
+        c.connect()
+        c.sockets[0].broken = True
+        c.disconnect()
+        self.assertFalse(c.connected)
+
 
 class CubeTest(unittest.TestCase):
 
@@ -273,6 +798,52 @@ class CubeTest(unittest.TestCase):
             ])
         ])
 
+    def test_rooms_cached_with_live_devices(self):
+        c = Cube()
+        c.parse_message(M_RESPONSE, [MResponseBytes])
+        c.handle_message(c.get_message(M_RESPONSE))
+        lresp = LResponse("BhIrZfcSGWQ8AOsA")
+        c.handle_message(lresp)
+
+        rooms = c.rooms
+        self.assertIs(rooms, c.rooms)
+        self.assertEqual(len(rooms), 1)
+        self.assertIs(rooms[0].devices[0], c.devices[0])
+        self.assertIs(rooms[0].devices[0].settings, lresp.responses[0])
+
+        # a new M: response replaces the cached rooms
+        c.parse_message(M_RESPONSE, [MResponseBytes])
+        c.handle_message(c.get_message(M_RESPONSE))
+        self.assertIsNot(rooms, c.rooms)
+        self.assertEqual(rooms, c.rooms)
+
+    def test_response_cache(self):
+        c = Cube(response_cache=ResponseCache())
+        c.devices.update = Mock(wraps=c.devices.update)
+
+        for _ in range(2):
+            c.handle_message(c.parse_message(M_RESPONSE, [MResponseBytes]))
+            c.handle_message(c.parse_message(CONFIGURATION_RESPONSE, ThermostatConfigurationBytes))
+
+        # the second M: and C: responses are the cached objects and need no update
+        self.assertEqual(c.devices.update.call_count, 2)
+        self.assertEqual(c.response_cache.hits, 2)
+        self.assertIs(c.devices[0].configuration, c.get_message(CONFIGURATION_RESPONSE))
+
+    def test_unchanged_responses(self):
+        c = Cube()
+        c.devices.update = Mock(wraps=c.devices.update)
+
+        for _ in range(2):
+            c.handle_message(c.parse_message(M_RESPONSE, [MResponseBytes]))
+            c.handle_message(c.parse_message(CONFIGURATION_RESPONSE, ThermostatConfigurationBytes))
+
+        # equal responses need no update, even if they are not the same objects
+        self.assertEqual(c.devices.update.call_count, 2)
+
+        c.handle_message(c.parse_message(CONFIGURATION_RESPONSE, WallThermostatConfigurationBytes))
+        self.assertEqual(c.devices.update.call_count, 3)
+
     def test_set_program(self):
         c = self._mocked_cube()
         response = c.set_program(1, '122b56', 1, [])
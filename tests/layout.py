@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import struct
+import unittest
+
+from pymax.layout import Field, Layout
+from pymax.objects import RFAddr
+
+
+class Record(object):
+    pass
+
+
+class LayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = Layout(
+            Field('length', 'B'),
+            Field('rf_address', '3B', RFAddr),
+            Field(None, 'x'),
+            Field('name', '4s', lambda x: x.decode('utf-8')),
+            Field('value', 'H'),
+        )
+        self.data = bytearray([0x0b, 0x12, 0x2b, 0x65, 0xff]) + bytearray(b'Bath') + bytearray([0x01, 0x02])
+
+    def test_size(self):
+        self.assertEqual(self.layout.size, 11)
+        self.assertEqual(self.layout.names, ('length', 'rf_address', 'name', 'value'))
+
+    def test_unpack_from(self):
+        self.assertEqual(self.layout.unpack_from(self.data), (11, RFAddr('122b65'), 'Bath', 0x0102))
+
+    def test_unpack_from_offset(self):
+        self.assertEqual(self.layout.unpack_from(bytearray(3) + self.data, 3), (11, RFAddr('122b65'), 'Bath', 0x0102))
+
+    def test_plain(self):
+        layout = Layout(Field('a', 'B'), Field(None, 'x'), Field('b', 'b'))
+        self.assertEqual(layout.unpack_from(bytearray([1, 2, 0xff])), (1, -1))
+
+    def test_unnamed_values_skipped(self):
+        layout = Layout(Field('a', 'B'), Field(None, 'B'), Field('b', 'B'))
+        self.assertEqual(layout.unpack_from(bytearray([1, 2, 3])), (1, 3))
+
+    def test_decode(self):
+        self.assertEqual(self.layout.decode(self.data), {
+            'length': 11, 'rf_address': RFAddr('122b65'), 'name': 'Bath', 'value': 0x0102
+        })
+
+    def test_decode_into(self):
+        record = Record()
+        self.assertEqual(self.layout.decode_into(record, self.data), 11)
+        self.assertEqual(record.length, 11)
+        self.assertEqual(record.rf_address, '122b65')
+        self.assertEqual(record.name, 'Bath')
+        self.assertEqual(record.value, 0x0102)
+
+    def test_too_short(self):
+        self.assertRaises(struct.error, self.layout.unpack_from, self.data[:5])
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import copy
+import pickle
 import unittest
 import datetime
 
@@ -13,6 +15,14 @@ class ProgramScheduleTest(unittest.TestCase):
         self.assertEqual(ps.begin_minutes, 60)
         self.assertEqual(ps.end_minutes, 60)
 
+    def test_slots(self):
+        self.assertFalse(hasattr(ProgramSchedule(10, 0, 60), '__dict__'))
+
+    def test_pickle(self):
+        ps = ProgramSchedule(10, 60, 120)
+        self.assertEqual(pickle.loads(pickle.dumps(ps)), ps)
+        self.assertEqual(copy.copy(ps), ps)
+
     def test_constructor2(self):
         ps = ProgramSchedule(10, datetime.time(1), 60)
         self.assertEqual(ps.temperature, 10)
@@ -88,6 +98,112 @@ class DeviceListTest(unittest.TestCase):
         self.assertIsNone(dl.get(rf_address='foo'))
 
 
+    def test_update_keeps_index(self):
+        dl = DeviceList()
+        dl.update(rf_address=RFAddr('122b65'), serial='123', name='foobar', room_id=1)
+        dl.update(rf_address=RFAddr('122b66'), serial='124', name='other', room_id=1)
+
+        dl.update(rf_address='122B65', room_id=2)
+
+        self.assertEqual(len(dl), 2)
+        self.assertEqual(dl.get(room_id=2)['serial'], '123')
+        self.assertIsNone(dl.get(name='foobar', room_id=1))
+        self.assertEqual([d['serial'] for d in dl.for_room(1)], ['124'])
+        self.assertEqual([d['serial'] for d in dl.for_room(2)], ['123'])
+
+    def test_duplicates_in_list_order(self):
+        dl = DeviceList()
+        dl.update(rf_address='000001', serial='1', name='x', room_id=1)
+        dl.update(rf_address='000002', serial='2', name='x', room_id=1)
+
+        dl.update(rf_address='000001', serial='1', name='x', room_id=1)
+        self.assertEqual(dl.get(name='x')['serial'], '1')
+        self.assertEqual([d['serial'] for d in dl.for_room(1)], ['1', '2'])
+
+        # moved to another room and back
+        dl.update(rf_address='000001', room_id=2)
+        dl.update(rf_address='000001', room_id=1)
+        self.assertEqual([d['serial'] for d in dl.for_room(1)], ['1', '2'])
+
+        dl.insert(0, Device(rf_address='000003', serial='3', name='x', room_id=1))
+        self.assertEqual(dl.get(name='x', room_id=1)['serial'], '3')
+        self.assertEqual([d['serial'] for d in dl.for_room(1)], ['3', '1', '2'])
+
+    def test_list_operations_keep_index(self):
+        dev1 = Device(rf_address=RFAddr('122b65'), serial='123', name='foobar')
+        dev2 = Device(rf_address=RFAddr('122b66'), serial='124', name='other')
+
+        dl = DeviceList([dev1])
+        dl.insert(0, dev2)
+        self.assertIs(dl.get(serial='124'), dev2)
+
+        dl.remove(dev2)
+        self.assertIsNone(dl.get(serial='124'))
+
+        dl += [dev2]
+        self.assertIs(dl.get(rf_address=bytearray([0x12, 0x2b, 0x66])), dev2)
+
+        del dl[0]
+        self.assertIsNone(dl.get(rf_address='122b65'))
+        self.assertFalse(RFAddr('122b65') in dl)
+
+        dl[0] = dev1
+        self.assertIs(dl.get(name='foobar'), dev1)
+        self.assertIsNone(dl.get(name='other'))
+
+        self.assertIs(dl.pop(), dev1)
+        self.assertIsNone(dl.get(name='foobar'))
+
+    def test_remove_equal_device(self):
+        dev1 = Device(name='foobar', room_id=1)
+        dev2 = Device(name='foobar', room_id=1)
+        dl = DeviceList([dev1, dev2])
+
+        dl.remove(Device(name='foobar', room_id=1))
+        self.assertEqual(len(dl), 1)
+        self.assertIs(dl.get(name='foobar'), dev2)
+        self.assertEqual(len(dl.for_room(1)), 1)
+
+    def test_slices_keep_index(self):
+        dev1 = Device(name='foobar', room_id=1)
+        dev2 = Device(name='other', room_id=1)
+        dl = DeviceList([dev1])
+
+        dl[:] = [dev2]
+        self.assertIsNone(dl.get(name='foobar'))
+        self.assertIs(dl.get(name='other'), dev2)
+
+        del dl[:]
+        self.assertEqual(dl.for_room(1), [])
+
+    def test_copy(self):
+        dev = Device(rf_address=RFAddr('122b65'), name='foobar', room_id=1)
+        dl = DeviceList([dev])
+
+        for copied in (copy.copy(dl), copy.deepcopy(dl), pickle.loads(pickle.dumps(dl))):
+            self.assertIsInstance(copied, DeviceList)
+            self.assertIsNot(copied._index, dl._index)
+            self.assertEqual(copied, dl)
+            self.assertEqual(len(copied.for_room(1)), 1)
+
+            copied.append(Device(rf_address=RFAddr('122b66'), name='other', room_id=1))
+            copied.pop(0)
+            self.assertIsNone(copied.get(name='foobar'))
+            self.assertEqual(len(copied.for_room(1)), 1)
+
+        self.assertIs(dl.get(name='foobar'), dev)
+        self.assertIsNone(dl.get(name='other'))
+        self.assertEqual(dl.for_room(1), [dev])
+
+    def test_get_not_indexed(self):
+        dev = Device(rf_address=RFAddr('122b65'), serial='123', name='foobar', battery_low=False)
+        dl = DeviceList([dev])
+
+        self.assertIs(dl.get(battery_low=False), dev)
+        self.assertIsNone(dl.get(battery_low=True))
+        self.assertIsNone(dl.get(name=['unhashable']))
+
+
 class RFAddrTest(unittest.TestCase):
 
     def test_constructor_invalid_values(self):
@@ -120,6 +236,53 @@ class RFAddrTest(unittest.TestCase):
         addr = RFAddr('122b65')
         self.assertEqual(str(addr), repr(addr))
 
+    def test_interned(self):
+        addr = RFAddr('122b65')
+        self.assertIs(addr, RFAddr('122B65'))
+        self.assertIs(addr, RFAddr(bytearray([0x12, 0x2b, 0x65])))
+        self.assertIs(addr, RFAddr(memoryview(bytearray([0x00, 0x12, 0x2b, 0x65]))[1:]))
+        self.assertIs(addr, RFAddr((0x12, 0x2b, 0x65)))
+        self.assertIs(addr, RFAddr(0x122b65))
+        self.assertIs(addr, RFAddr.from_int(0x122b65))
+        self.assertIs(addr, RFAddr(addr))
+        self.assertIs(addr, copy.deepcopy(addr))
+        self.assertIs(addr, pickle.loads(pickle.dumps(addr)))
+
+    def test_hashable(self):
+        d = {RFAddr('122b65'): 1}
+        self.assertEqual(d[RFAddr(bytearray([0x12, 0x2b, 0x65]))], 1)
+        self.assertEqual(int(RFAddr('122b65')), 0x122b65)
+
+    def test_immutable(self):
+        addr = RFAddr('122b65')
+        self.assertRaises(AttributeError, setattr, addr, '_value', 1)
+        self.assertRaises(AttributeError, setattr, addr, 'foo', 1)
+
+    def test_not_equals(self):
+        self.assertNotEqual(RFAddr('122b65'), '122b66')
+        self.assertNotEqual(RFAddr('122b65'), RFAddr('122b66'))
+        self.assertNotEqual(RFAddr('122b65'), None)
+        self.assertNotEqual(RFAddr('122b65'), 'foo')
+        self.assertRaises(ValueError, RFAddr, 0x1000000)
+        self.assertRaises(ValueError, RFAddr, 'zzzzzz')
+        for invalid in ('0x2b65', '+12b65', ' 12b65', '12_b65', '-12b65'):
+            self.assertRaises(ValueError, RFAddr, invalid)
+
+    def test_hash_consistent_with_equals(self):
+        d = {RFAddr('122b65'): 1}
+        self.assertEqual(d.get('122b65'), 1)
+        self.assertEqual(hash(RFAddr('122b65')), hash('122b65'))
+        self.assertEqual({'122b65': 1}[RFAddr('122b65')], 1)
+
+        # not comparable with hashable values that hash differently
+        self.assertNotEqual(RFAddr('122b65'), 0x122b65)
+        self.assertNotEqual(RFAddr('122b65'), b'\x12\x2b\x65')
+
+    def test_getitem(self):
+        addr = RFAddr('122b65')
+        self.assertEqual(addr[0:2], bytearray([0x12, 0x2b]))
+        self.assertEqual(addr[2], 0x65)
+
 
 class DeviceTest(unittest.TestCase):
     def test_getattr(self):
@@ -144,4 +307,4 @@ class DeviceTest(unittest.TestCase):
 
     def test_misc(self):
         d = Device(foo='bar')
-        self.assertEqual(repr(d), str(d))
\ No newline at end of file
+        self.assertEqual(repr(d), str(d))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+from fakecube import FakeCube
+from pymax.cube import Cube
+from pymax.poller import Poller, SETTINGS_FIELDS
+
+
+class PollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake_cube = FakeCube(port=0, rooms=2, devices=1)
+        self.fake_cube.start()
+        self.cube = Cube(*self.fake_cube.address)
+        self.cube.connect()
+
+    def tearDown(self):
+        self.cube.disconnect()
+        self.fake_cube.stop()
+
+    def test_constructor(self):
+        self.assertRaises(ValueError, Poller, self.cube, min_interval=0)
+        self.assertRaises(ValueError, Poller, self.cube, min_interval=10, max_interval=5)
+
+    def test_changes(self):
+        poller = Poller(self.cube, min_interval=1, max_interval=3)
+        notified = []
+        poller.subscribe(lambda device, changed: notified.append((str(device.rf_address), changed)))
+
+        # every device on the first poll
+        changes = poller.poll()
+        self.assertEqual([str(device.rf_address) for device, _ in changes], ['100001', '100002'])
+        self.assertEqual(changes[0][1], SETTINGS_FIELDS)
+        self.assertEqual(notified, [(str(device.rf_address), changed) for device, changed in changes])
+
+        del notified[:]
+        self.assertEqual(poller.poll(), [])
+        self.assertEqual(notified, [])
+
+        self.cube.set_mode_manual(2, '100002', 25)
+        changes = poller.poll()
+        self.assertEqual(len(changes), 1)
+        device, changed = changes[0]
+        self.assertEqual(device.rf_address, '100002')
+        self.assertEqual(device.settings.temperature, 25)
+        self.assertIn('temperature', changed)
+        self.assertNotIn('actual_temperature', changed)
+        self.assertEqual(notified, [('100002', changed)])
+        self.assertEqual(poller.polls, 3)
+
+    def test_adaptive_interval(self):
+        poller = Poller(self.cube, min_interval=1, max_interval=5, backoff=2)
+        poller.poll()
+        self.assertEqual(poller.interval, 2)
+        poller.poll()
+        poller.poll()
+        self.assertEqual(poller.interval, 5)
+
+        self.cube.set_mode_boost(1, '100001')
+        poller.poll()
+        self.assertEqual(poller.interval, 1)
+
+    def test_wake_interval(self):
+        poller = Poller(self.cube, min_interval=1, max_interval=5, backoff=2)
+        poller.poll()
+        poller.poll()
+        self.assertEqual(poller.interval, 4)
+
+        poller.wake()
+        self.assertEqual(poller.interval, 1)
+        # the woken poll saw no change, the next one still follows at min_interval
+        poller.poll()
+        self.assertEqual(poller.interval, 1)
+        poller.poll()
+        self.assertEqual(poller.interval, 2)
+
+    def test_subscriber_errors(self):
+        def fail(device, changed):
+            raise Exception("just a test")
+        notified = []
+
+        poller = Poller(self.cube)
+        poller.subscribe(fail)
+        poller.subscribe(lambda device, changed: notified.append(device))
+        self.assertEqual(len(poller.poll()), 2)
+        self.assertEqual(len(notified), 2)
+
+        poller.unsubscribe(fail)
+        self.assertRaises(ValueError, poller.unsubscribe, fail)
+
+    def test_background_thread(self):
+        changed = threading.Event()
+        poller = Poller(self.cube, min_interval=60, max_interval=60)
+
+        with poller:
+            poller.subscribe(lambda device, fields: fields != SETTINGS_FIELDS and changed.set())
+            while poller.polls == 0:
+                changed.wait(0.01)
+
+            # the cube is not used by the poller thread until it is woken up
+            self.cube.set_mode_manual(1, '100001', 19)
+            poller.wake()
+            self.assertTrue(changed.wait(5))
+        self.assertEqual(poller.polls, 2)
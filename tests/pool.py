@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from pymax.cube import Cube
+from pymax.pool import CubePool, CubeResult
+from pymax.response import DiscoveryNetworkConfigurationResponse
+from response import DiscoveryNetworkConfigResponseBytes
+
+
+class SlowCube(Cube):
+    delay = 0.1
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def get_device_list(self):
+        with SlowCube.lock:
+            SlowCube.running += 1
+            SlowCube.max_running = max(SlowCube.running, SlowCube.max_running)
+        time.sleep(self.delay)
+        with SlowCube.lock:
+            SlowCube.running -= 1
+        if self.addr_port[0] == 'broken':
+            raise IOError("broken cube")
+        return self.addr_port[0]
+
+
+class CubePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        SlowCube.running = SlowCube.max_running = 0
+
+    def test_constructor(self):
+        pool = CubePool(['1.2.3.4', ('1.2.3.5', 1234),
+                         DiscoveryNetworkConfigurationResponse(DiscoveryNetworkConfigResponseBytes)])
+        self.assertEqual([c.addr_port for c in pool.cubes], [
+            ('1.2.3.4', 62910), ('1.2.3.5', 1234), ('10.10.10.153', 62910)
+        ])
+        self.assertEqual(len(pool), 3)
+        self.assertRaises(ValueError, CubePool, [], concurrency=0)
+
+    def test_refresh_in_parallel(self):
+        pool = CubePool(['cube%s' % i for i in range(8)], concurrency=8, cube_class=SlowCube)
+
+        start = time.time()
+        results = pool.refresh()
+        elapsed = time.time() - start
+
+        self.assertEqual([r.result for r in results], ['cube%s' % i for i in range(8)])
+        self.assertTrue(all(r.error is None for r in results))
+        self.assertTrue(elapsed < 8 * SlowCube.delay / 2, elapsed)
+
+    def test_concurrency_limit(self):
+        pool = CubePool(['cube%s' % i for i in range(6)], concurrency=2, cube_class=SlowCube)
+        pool.refresh()
+        self.assertEqual(SlowCube.max_running, 2)
+
+    def test_errors(self):
+        pool = CubePool(['cube', 'broken'], cube_class=SlowCube)
+        results = pool.call('get_device_list')
+
+        self.assertEqual(results[0], CubeResult(pool.cubes[0], 'cube', None))
+        self.assertIsNone(results[1].result)
+        self.assertIsInstance(results[1].error, IOError)
+
+    def test_connect_and_disconnect(self):
+        pool = CubePool(['1.2.3.4', '1.2.3.5'])
+        connected = []
+        for cube in pool.cubes:
+            cube.connect = lambda cube=cube: connected.append(cube)
+            cube.disconnect = lambda cube=cube: connected.remove(cube)
+
+        with pool:
+            self.assertEqual(sorted(c.addr_port for c in connected), sorted(c.addr_port for c in pool.cubes))
+        self.assertEqual(connected, [])
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import copy
+import pickle
+import unittest
+
+from pymax.protocol import ResponseParser, ProtocolException, ResponseCache, parse_response, find_response
+from pymax.response import HelloResponse, MResponse, SetResponse, LResponse, FResponse, ConfigurationResponse, \
+    M_RESPONSE, CONFIGURATION_RESPONSE, L_RESPONSE
+from response import HelloResponseBytes, MResponseBytes, ThermostatConfigurationBytes, WallThermostatConfigurationBytes
+
+
+class ResponseParserTest(unittest.TestCase):
+
+    def test_feed_complete_lines(self):
+        parser = ResponseParser()
+        responses = parser.feed(bytearray(b'H:') + HelloResponseBytes + bytearray(b'\r\nS:00,0,31\r\n'))
+
+        self.assertEqual([type(r) for r in responses], [HelloResponse, SetResponse])
+        self.assertEqual(parser.pending_bytes, 0)
+
+    def test_feed_byte_by_byte(self):
+        parser = ResponseParser()
+        data = bytearray(b'L:BhIrZfcSGWQ8AOsA\r\nF:ntp.homematic.com\r\n')
+
+        responses = []
+        for i in range(len(data)):
+            responses.extend(parser.feed(data[i:i + 1]))
+
+        self.assertEqual([type(r) for r in responses], [LResponse, FResponse])
+        self.assertEqual(responses[1].ntp_servers, ['ntp.homematic.com'])
+
+    def test_multi_part(self):
+        parser = ResponseParser()
+
+        self.assertEqual(parser.feed(bytearray(b'M:00,02,VgIBAQpXb2huemltbWVyEitl\r\n')), [])
+        responses = parser.feed(bytearray(b'M:01,02,AQISK2VNRVExNDcyOTk3B0hlaXp1bmcBAQ==\r\n'))
+
+        self.assertEqual(len(responses), 1)
+        self.assertIsInstance(responses[0], MResponse)
+        self.assertEqual(responses[0].devices, [
+            (0, 2, '122B65', 'MEQ1472997', 'Heizung', 1)
+        ])
+
+    def test_single_part(self):
+        parser = ResponseParser()
+        responses = parser.feed(bytearray(b'M:') + MResponseBytes + bytearray(b'\r\n'))
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0].num_devices, 1)
+
+    def test_multi_part_restart(self):
+        parser = ResponseParser()
+        parser.feed(bytearray(b'M:00,02,VgIBAQpXb2huemltbWVyEitl\r\n'))
+        responses = parser.feed(bytearray(b'M:') + MResponseBytes + bytearray(b'\r\n'))
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0].num_devices, 1)
+
+    def test_invalid_multi_part_header(self):
+        parser = ResponseParser()
+        self.assertEqual(parser.feed(bytearray(b'M:xx,yy,VgIB\r\n')), [])
+        self.assertEqual(parser.pending_bytes, 0)
+
+    def test_invalid_line(self):
+        parser = ResponseParser()
+        responses = parser.feed(bytearray(b'S:00,0,31\r\nS:garbage\r\n'))
+        self.assertEqual([r.message_type for r in responses], ['S'])
+        self.assertEqual(parser.pending_bytes, 0)
+
+        responses = parser.feed(bytearray(b'S:01,0,31\r\n'))
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0].duty_cycle, 1)
+
+    def test_unknown_and_empty_lines(self):
+        parser = ResponseParser()
+        self.assertEqual(parser.feed(bytearray(b'\r\nX:foo\r\n\r\n')), [])
+
+    def test_line_too_long(self):
+        parser = ResponseParser()
+        parser.max_line_length = 10
+        self.assertRaises(ProtocolException, parser.feed, bytearray(b'L:' + b'A' * 20))
+        self.assertEqual(parser.pending_bytes, 0)
+
+    def test_parse_response(self):
+        self.assertIsInstance(parse_response(M_RESPONSE, [MResponseBytes]), MResponse)
+        self.assertIsNone(parse_response('X', bytearray(b'foo')))
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_hit(self):
+        cache = ResponseCache()
+        response = cache.parse(CONFIGURATION_RESPONSE, bytearray(ThermostatConfigurationBytes))
+
+        self.assertIsInstance(response, ConfigurationResponse)
+        self.assertIs(cache.parse(CONFIGURATION_RESPONSE, bytearray(ThermostatConfigurationBytes)), response)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+
+    def test_frozen(self):
+        cache = ResponseCache()
+        configuration = cache.parse(CONFIGURATION_RESPONSE, bytearray(ThermostatConfigurationBytes))
+        metadata = cache.parse(M_RESPONSE, [MResponseBytes])
+
+        self.assertRaises(AttributeError, setattr, configuration, 'room_id', 2)
+        self.assertRaises(AttributeError, delattr, configuration, 'room_id')
+        self.assertRaises(AttributeError, setattr, metadata, 'raw_response', None)
+        self.assertIsInstance(metadata.devices, tuple)
+        self.assertIsInstance(metadata.rooms, tuple)
+        self.assertEqual(configuration.comfort_temperature, 29.5)
+
+        # copies are writable
+        for restored in (copy.copy(configuration), copy.deepcopy(configuration),
+                         pickle.loads(pickle.dumps(configuration))):
+            self.assertIs(type(restored), ConfigurationResponse)
+            self.assertEqual(restored.comfort_temperature, 29.5)
+            restored.room_id = 2
+        self.assertEqual(configuration.room_id, 1)
+
+        self.assertIsInstance(configuration.week_program[0], tuple)
+
+        # responses parsed without a cache stay writable
+        uncached = parse_response(CONFIGURATION_RESPONSE, bytearray(ThermostatConfigurationBytes))
+        uncached.room_id = 2
+        self.assertIsInstance(uncached.week_program[0], list)
+
+    def test_multi_part(self):
+        cache = ResponseCache()
+        response = cache.parse(M_RESPONSE, [MResponseBytes])
+        self.assertIs(cache.parse(M_RESPONSE, [bytearray(MResponseBytes)]), response)
+
+    def test_uncached_types(self):
+        cache = ResponseCache()
+        self.assertIsNot(cache.parse(L_RESPONSE, b'BhIrZfcSGWQ8AOsA'), cache.parse(L_RESPONSE, b'BhIrZfcSGWQ8AOsA'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hit_rate, 0.0)
+
+    def test_lru(self):
+        cache = ResponseCache(maxsize=1)
+        thermostat = cache.parse(CONFIGURATION_RESPONSE, ThermostatConfigurationBytes)
+        cache.parse(CONFIGURATION_RESPONSE, WallThermostatConfigurationBytes)
+
+        self.assertEqual(len(cache), 1)
+        self.assertIsNot(cache.parse(CONFIGURATION_RESPONSE, ThermostatConfigurationBytes), thermostat)
+        self.assertEqual(cache.hits, 0)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_parser(self):
+        cache = ResponseCache()
+        line = b'C:' + bytes(ThermostatConfigurationBytes) + b'\r\n'
+        first, = ResponseParser(cache).feed(bytearray(line))
+        second, = ResponseParser(cache).feed(bytearray(line))
+
+        self.assertIs(first, second)
+        self.assertEqual(cache.hits, 1)
+
+
+class FindResponseTest(unittest.TestCase):
+
+    def test_find_response(self):
+        s1, s2 = SetResponse(bytearray(b'00,0,31')), SetResponse(bytearray(b'01,0,30'))
+        f = FResponse(bytearray(b'ntp.homematic.com'))
+
+        self.assertIs(find_response([s1, f, s2], 'S'), s2)
+        self.assertIs(find_response([s1, f], 'F'), f)
+        self.assertIsNone(find_response([f], 'S'))
+        self.assertIsNone(find_response(None, 'S'))
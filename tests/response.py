@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
+import copy
+import pickle
 import unittest
 import datetime
 
+from fakecube import Payloads, DEFAULT_DAY_PROGRAM
 from pymax.objects import ProgramSchedule
 from pymax.response import DiscoveryIdentifyResponse, BaseResponse, DiscoveryNetworkConfigurationResponse, \
     HelloResponse, \
     MResponse, ConfigurationResponse, DeviceCube, DeviceRadiatorThermostatPlus, LResponse, FResponse, SetResponse, \
-    DeviceWallThermostat
+    DeviceWallThermostat, DeviceRadiatorThermostat, DeviceShutterContact
 
 DiscoveryIdentifyRequestBytes = bytearray([
     0x65, 0x51, 0x33, 0x4D, 0x61, 0x78, 0x2A, 0x00, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x2A, 0x49
@@ -134,6 +137,13 @@ class DiscoveryIdentifyResponseTest(unittest.TestCase):
         self.assertEqual(response.rf_address, '097f2c')
         self.assertEqual(response.fw_version, '0113')
 
+    def test_non_ascii_request_id(self):
+        data = bytearray(DiscoveryIdentifyResponseBytes)
+        data[18] = 0xe4
+        response = DiscoveryIdentifyResponse(data)
+        self.assertEqual(response.request_id, chr(0xe4))
+        self.assertEqual(response.request_type, 'I')
+
     def test_str(self):
         response = DiscoveryIdentifyResponse(DiscoveryIdentifyResponseBytes)
         self.assertEqual(str(response), "KEQ0523864: RF addr: 097f2c, FW version: 0113")
@@ -161,6 +171,8 @@ class HelloResponseTest(unittest.TestCase):
         self.assertEqual(response.rf_address, '10b199')
         self.assertEqual(response.fw_version, '0113')
         self.assertEqual(response.datetime, datetime.datetime(2015, 12, 13, 8, 18, 0))
+        self.assertEqual(response.duty_cycle, 0)
+        self.assertEqual(response.free_mem_slots, 50)
 
     def test_str(self):
         response = HelloResponse(HelloResponseBytes)
@@ -296,6 +308,19 @@ class ConfigurationResponseTest(unittest.TestCase):
             ],
         ])
 
+    def test_week_program_lazy(self):
+        response = ConfigurationResponse(ThermostatConfigurationBytes)
+        self.assertNotIn('week_program', response.__dict__)
+
+        week_program = response.week_program
+        self.assertEqual(len(week_program), 7)
+        self.assertIs(response.week_program, week_program)
+        self.assertEqual(response.raw_response, ThermostatConfigurationBytes)
+
+    def test_cube_config_without_week_program(self):
+        response = ConfigurationResponse(CubeConfigurationBytes)
+        self.assertFalse(hasattr(response, 'week_program'))
+
     def test_wallthermostat_config(self):
         response = ConfigurationResponse(WallThermostatConfigurationBytes)
         self.assertEqual(response.device_type, DeviceWallThermostat)
@@ -306,6 +331,23 @@ class ConfigurationResponseTest(unittest.TestCase):
         self.assertEqual(response.max_set_point_temperature, 30.5)
         self.assertEqual(response.min_set_point_temperature, 4.5)
 
+    def test_wallthermostat_week_program(self):
+        # the week program starts directly after the four temperatures
+        response = ConfigurationResponse(WallThermostatConfigurationBytes)
+        weekend = [
+            ProgramSchedule(17.0, datetime.time(0, 0), datetime.time(6, 0)),
+            ProgramSchedule(21.0, datetime.time(6, 0), datetime.time(22, 0)),
+            ProgramSchedule(17.0, datetime.time(22, 0), 1440),
+        ]
+        workday = [
+            ProgramSchedule(17.0, datetime.time(0, 0), datetime.time(6, 0)),
+            ProgramSchedule(21.0, datetime.time(6, 0), datetime.time(9, 0)),
+            ProgramSchedule(17.0, datetime.time(9, 0), datetime.time(17, 0)),
+            ProgramSchedule(21.0, datetime.time(17, 0), datetime.time(23, 0)),
+            ProgramSchedule(17.0, datetime.time(23, 0), 1440),
+        ]
+        self.assertEqual(response.week_program, [weekend, weekend] + [workday] * 5)
+
 
 class LResponseTest(unittest.TestCase):
     def test_parsing(self):
@@ -351,6 +393,50 @@ class LResponseTest(unittest.TestCase):
         self.assertFalse(response.is_error)
         self.assertFalse(response.is_valid)
 
+    def test_compact(self):
+        response = LResponse("BhIrZfcSGWQ8AOsA").responses[0]
+
+        self.assertFalse(hasattr(response, '__dict__'))
+        self.assertFalse(hasattr(response, 'valve_position'))
+        self.assertEqual(str(response), response.description)
+        self.assertIn("RF addr: 122b65", response.description)
+
+    def test_multiple_submessages(self):
+        # heater thermostat, wall thermostat, shutter contact
+        response = LResponse(b"CxIrZfcSGWQ8AOsFDBIXBwkSEBgpAAAAxAYSK2X3EhI=")
+
+        self.assertEqual(response.num_responses, 3)
+        self.assertEqual([r.rf_addr for r in response.responses], ['122b65', '121707', '122b65'])
+        self.assertEqual(response.responses[0].actual_temperature, 23.5)
+        self.assertEqual(response.responses[1].temperature, 20.5)
+        self.assertEqual(response.responses[1].actual_temperature, 19.6)
+        self.assertTrue(response.responses[2].vacation_program)
+        self.assertEqual(bytearray(response.responses[2].raw_response), bytearray(b'\x06\x12\x2b\x65\xf7\x12\x12'))
+        self.assertFalse(hasattr(response.responses[2], 'time_until'))
+
+    def test_pickle_and_copy(self):
+        response = LResponse(b"CxIrZfcSGWQ8AOsFDBIXBwkSEBgpAAAAxAYSK2X3EhI=")
+
+        for restored in (pickle.loads(pickle.dumps(response)), copy.deepcopy(response)):
+            self.assertEqual(restored.num_responses, 3)
+            self.assertEqual([r.rf_addr for r in restored.responses], ['122b65', '121707', '122b65'])
+            self.assertEqual(restored.responses[1].actual_temperature, 19.6)
+            self.assertEqual(restored.responses[2].raw_response, bytearray(b'\x06\x12\x2b\x65\xf7\x12\x12'))
+
+        settings = pickle.loads(pickle.dumps(response.responses[0]))
+        self.assertEqual(settings.rf_addr, '122b65')
+        self.assertEqual(settings.time_until, response.responses[0].time_until)
+        self.assertEqual(copy.copy(settings).temperature, settings.temperature)
+
+    def test_flag_tables(self):
+        response = LResponse("BhIrZfcSGWQ8AOsA").responses[0]
+        for flags in range(256):
+            response.flags1 = response.flags2 = flags
+            self.assertEqual(response.manual_program, bool(flags & 0x01 and not flags & 0x02))
+            self.assertEqual(response.boost_program, bool(flags & 0x01 and flags & 0x02))
+            self.assertEqual(response.battery_low, not flags & 0x08)
+            self.assertEqual(response.is_error, bool(flags & 0x04))
+
 
 class FResponseTest(unittest.TestCase):
     def test_parsing(self):
@@ -369,3 +455,42 @@ class SetResponseTest(unittest.TestCase):
         self.assertEqual(response.command_result, 0)
         self.assertTrue(response.command_success)
         self.assertEqual(response.free_mem_slots, 49)
+
+
+class SyntheticPayloadTest(unittest.TestCase):
+    def test_metadata(self):
+        payloads = Payloads(200, rooms=50, m_part_size=500)
+        parts = payloads.metadata()
+        self.assertEqual(len(parts), 16)
+
+        # the parts are ordered by their index
+        response = MResponse(parts[::-1])
+        self.assertEqual(response.num_rooms, 50)
+        self.assertEqual(response.rooms[49], (50, 'Room 50', '200032'))
+        self.assertEqual(response.num_devices, 200)
+        self.assertEqual(response.devices[199], (199, DeviceShutterContact, '1000c8', 'MEQ0000200', 'Device 200', 50))
+
+    def test_configurations(self):
+        configurations = [ConfigurationResponse(c) for c in Payloads(3).configurations()]
+
+        self.assertEqual([c.device_type for c in configurations], [DeviceCube, DeviceRadiatorThermostat,
+                                                                   DeviceRadiatorThermostat, DeviceWallThermostat])
+        self.assertEqual(configurations[0].portal_url, 'http://www.max-portal.elv.de:80')
+        self.assertEqual(configurations[1].comfort_temperature, 21.0)
+        self.assertEqual(configurations[3].eco_temperature, 17.0)
+
+        day_program = [ProgramSchedule(temperature, 0, end) for temperature, end in DEFAULT_DAY_PROGRAM]
+        for schedule, begin in zip(day_program, (0, 360, 1320)):
+            schedule.begin_minutes = begin
+        for configuration in configurations[1:]:
+            self.assertEqual(configuration.week_program, [day_program] * 7)
+
+    def test_device_list(self):
+        response = LResponse(Payloads(1000).device_list())
+
+        self.assertEqual(response.num_responses, 1000)
+        self.assertEqual(response.responses[-1].rf_addr, '1003e8')
+        for submessage in response.responses[:3]:
+            self.assertEqual(submessage.temperature, 21.0)
+            self.assertEqual(submessage.actual_temperature, 20.5)
+        self.assertFalse(hasattr(response.responses[3], 'temperature'))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import socket
+import unittest
+
+from pymax.messages import SetTemperatureAndModeMessage
+from pymax.response import SetResponse, HelloResponse
+from pymax.scheduler import CommandScheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from response import HelloResponseBytes
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class DutyCycleCube(object):
+    """Uses one percent of the duty cycle per command and rejects commands above 100%."""
+
+    def __init__(self, clock, duty_cycle=0):
+        self.clock = clock
+        self.duty_cycle = duty_cycle
+        self.updated = clock()
+        self.sent = []
+        self.info = None
+
+    def send_message(self, msg):
+        # the budget recovers within one hour
+        self.duty_cycle = max(0, self.duty_cycle - int((self.clock() - self.updated) * 100 / 3600.0))
+        self.updated = self.clock()
+
+        success = self.duty_cycle + 1 <= 100
+        if success:
+            self.duty_cycle += 1
+            self.sent.append((self.clock(), msg))
+        return [SetResponse(bytearray(("%02x,%s,31" % (self.duty_cycle, 0 if success else 1)).encode('utf-8')))]
+
+
+def message(temperature):
+    return SetTemperatureAndModeMessage('122b65', 1, SetTemperatureAndModeMessage.ModeManual, temperature=temperature)
+
+
+class CommandSchedulerTest(unittest.TestCase):
+
+    def _scheduler(self, duty_cycle=0, **kwargs):
+        clock = FakeClock()
+        cube = DutyCycleCube(clock, duty_cycle)
+        scheduler = CommandScheduler(cube, clock=clock, sleep=clock.sleep, **kwargs)
+        scheduler.duty_cycle = duty_cycle
+        return scheduler, cube, clock
+
+    def test_send_within_budget(self):
+        scheduler, cube, clock = self._scheduler()
+        commands = [scheduler.submit(message(t)) for t in (20, 21, 22)]
+        scheduler.run_pending()
+
+        self.assertEqual([msg for _, msg in cube.sent], [c.message for c in commands])
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual([c.response.duty_cycle for c in commands], [1, 2, 3])
+        self.assertTrue(all(c.done and c.wait().command_success for c in commands))
+        self.assertEqual(len(scheduler), 0)
+
+    def test_pacing(self):
+        scheduler, cube, clock = self._scheduler(duty_cycle=89, max_duty_cycle=90)
+        commands = [scheduler.submit(message(20)), scheduler.submit(message(21))]
+
+        self.assertEqual(scheduler.eta(commands[0]), 0)
+        self.assertAlmostEqual(scheduler.eta(commands[1]), 36.0)
+
+        scheduler.run_pending()
+        self.assertEqual(len(cube.sent), 2)
+        self.assertAlmostEqual(sum(clock.sleeps), 36.0)
+        self.assertTrue(all(c.response.command_success for c in commands))
+
+    def test_priority(self):
+        scheduler, cube, clock = self._scheduler()
+        bulk = scheduler.submit(message(20), priority=PRIORITY_BULK)
+        interactive = scheduler.submit(message(21), priority=PRIORITY_INTERACTIVE)
+
+        self.assertEqual(scheduler.eta(interactive), 0)
+        scheduler.run_pending()
+        self.assertEqual([msg for _, msg in cube.sent], [interactive.message, bulk.message])
+
+    def test_retry_rejected(self):
+        scheduler, cube, clock = self._scheduler(duty_cycle=100, max_duty_cycle=101)
+        command = scheduler.submit(message(20))
+        scheduler.run_pending()
+
+        self.assertEqual(command.attempts, 2)
+        self.assertTrue(command.response.command_success)
+        self.assertEqual(len(cube.sent), 1)
+
+    def test_give_up(self):
+        scheduler, cube, clock = self._scheduler(duty_cycle=100, max_duty_cycle=101, max_retries=0, recovery_rate=0.0001)
+        cube.send_message = lambda msg: [SetResponse(bytearray(b"64,1,31"))]
+        command = scheduler.submit(message(20))
+        scheduler.run_pending()
+
+        self.assertEqual(command.attempts, 1)
+        self.assertFalse(command.response.command_success)
+
+    def test_send_error(self):
+        scheduler, cube, clock = self._scheduler()
+        first = scheduler.submit(message(20))
+        second = scheduler.submit(message(21))
+
+        def fail(msg):
+            raise socket.error("Broken pipe")
+        send_message, cube.send_message = cube.send_message, fail
+        self.assertRaises(socket.error, scheduler.run_pending)
+
+        self.assertTrue(first.done)
+        self.assertIsNone(first.response)
+        self.assertIsInstance(first.error, socket.error)
+        self.assertFalse(second.done)
+        self.assertEqual(len(scheduler), 1)
+
+        cube.send_message = send_message
+        scheduler.run_pending()
+        self.assertTrue(second.response.command_success)
+        self.assertIsNone(second.error)
+
+    def test_mem_slots(self):
+        scheduler, cube, clock = self._scheduler(mem_slot_wait=5)
+        scheduler.update(SetResponse(bytearray(b"00,0,01")))
+        command = scheduler.submit(message(20))
+
+        self.assertEqual(scheduler.eta(command), 5)
+        scheduler.run_pending()
+        self.assertEqual(clock.sleeps, [5])
+
+    def test_update_from_hello(self):
+        scheduler, cube, clock = self._scheduler()
+        scheduler.update(HelloResponse(HelloResponseBytes))
+        self.assertEqual(scheduler.duty_cycle, 0)
+        self.assertEqual(scheduler.free_mem_slots, 0x32)
+
+    def test_background_thread(self):
+        scheduler = CommandScheduler(DutyCycleCube(FakeClock()))
+        scheduler.start()
+        try:
+            command = scheduler.submit(message(20))
+            self.assertTrue(command.wait(5).command_success)
+        finally:
+            scheduler.stop()
@@ -3,8 +3,8 @@ import unittest
 
 import datetime
 
-from pymax.util import dateuntil_to_date, date_to_dateuntil, unpack_temp_and_time, pack_temp_and_time, \
-    cube_day_to_py_day, py_day_to_cube_day
+from pymax.util import a2b_base64, dateuntil_to_date, date_to_dateuntil, unpack_temp_and_time, pack_temp_and_time, \
+    cube_day_to_py_day, py_day_to_cube_day, network_hosts
 
 
 class UtilsTest(unittest.TestCase):
@@ -34,6 +34,12 @@ class UtilsTest(unittest.TestCase):
         self.assertEqual(temperature, 16)
         self.assertEqual(minutes, 365)
 
+    def test_a2b_base64(self):
+        for data in (b'QUJD', bytearray(b'QUJD'), memoryview(bytearray(b'xxQUJD'))[2:]):
+            decoded = a2b_base64(data)
+            self.assertEqual(decoded[0], 0x41)
+            self.assertEqual(bytearray(decoded), bytearray(b'ABC'))
+
     def test_pack_temp_and_time(self):
         self.assertEqual(pack_temp_and_time(16, datetime.time(6, 5)), bytearray([0x40, 0x49]))
         self.assertEqual(pack_temp_and_time(24, datetime.time(22, 0)), bytearray([0x61, 0x08]))
@@ -61,3 +67,17 @@ class UtilsTest(unittest.TestCase):
             (6, 1),
         ):
             self.assertEqual(py_day_to_cube_day(py_day), cube_day)
+
+    def test_network_hosts(self):
+        self.assertEqual(list(network_hosts('10.10.10.0/30')), ['10.10.10.1', '10.10.10.2'])
+        # host bits are ignored
+        self.assertEqual(list(network_hosts('10.10.10.5/30')), ['10.10.10.5', '10.10.10.6'])
+        self.assertEqual(list(network_hosts('10.10.10.4/31')), ['10.10.10.4', '10.10.10.5'])
+        self.assertEqual(list(network_hosts('10.10.10.153')), ['10.10.10.153'])
+
+        hosts = list(network_hosts('10.1.0.0/16'))
+        self.assertEqual(len(hosts), 65534)
+        self.assertEqual((hosts[0], hosts[-1]), ('10.1.0.1', '10.1.255.254'))
+
+        for network in ('10.10.10.0/33', '10.10.10/24', 'cube/24', '10.10.10.0/x'):
+            self.assertRaises(ValueError, list, network_hosts(network))